@@ -0,0 +1 @@
+"""Ad-hoc performance benchmarks; run the modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,74 @@
+"""Vectorized status analytics versus a per-user ``evaluate_status`` loop.
+
+The loop is timed on a sample and extrapolated to the full population::
+
+    python -m benchmarks.analytics --users 10000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+from capitalia import analytics
+from capitalia.adapters.status_index import HEADER_SIZE, StatusIndex
+from capitalia.domain.models import Plan, Status, User
+from capitalia.domain.user_states import get_user_state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vectorized analytics benchmark.")
+    parser.add_argument("--users", type=int, default=10_000_000)
+    parser.add_argument("--loop-sample", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    today = date(2024, 6, 1)
+    plan = rng.integers(1, 4, args.users, dtype=np.uint8)
+    status = np.where((plan == Plan.PREMIUM.code) & (rng.random(args.users) < 0.1), Status.SUSPENDED.code, Status.ACTIVE.code).astype(np.uint8)
+    start = (today.toordinal() - rng.integers(0, 90, args.users)).astype(np.int32)
+    cols = analytics.StatusColumns(plan, status, start)
+
+    started = time.perf_counter()
+    analytics.report(cols, today, 30)
+    vectorized = time.perf_counter() - started
+    print(f"vectorized report     {args.users:>11,} users  {vectorized:8.3f}s", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "status.idx")
+        StatusIndex.create(path, built_at=time.time())  # every uid is written below
+        # Write the records in one go, laid out exactly like the index file.
+        records = np.zeros(args.users + 1, dtype=[("ordinal", "<i4"), ("plan", "u1"), ("status", "u1"), ("pad", "V2")])
+        records["ordinal"][1:], records["plan"][1:], records["status"][1:] = start, plan, status
+        with open(path, "r+b") as fh:
+            fh.seek(HEADER_SIZE)
+            fh.write(records.tobytes())
+        started = time.perf_counter()
+        loaded = analytics.load_columns_from_index(path)
+        analytics.report(loaded, today, 30)
+        print(f"index load + report   {len(loaded):>11,} users  {time.perf_counter() - started:8.3f}s", file=sys.stderr)
+
+    sample = min(args.loop_sample, args.users)
+    plans = {p.code: p for p in Plan}
+    statuses = {s.code: s for s in Status}
+    users = [
+        User(i, "n", "e", "h", "s", plans[int(plan[i])], date.fromordinal(int(start[i])), statuses[int(status[i])])
+        for i in range(sample)
+    ]
+    started = time.perf_counter()
+    mix: dict = {}
+    for user in users:
+        key = (user.plan, get_user_state(user.status).evaluate(user, today))
+        mix[key] = mix.get(key, 0) + 1
+    loop = (time.perf_counter() - started) * args.users / sample
+    print(f"python loop (extrap.) {args.users:>11,} users  {loop:8.3f}s  ({loop / vectorized:,.0f}x slower)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-entity memory and row -> entity mapping throughput for ``User``.
+
+Compares the slotted, enum-coded ``User`` against the previous layout (a
+plain ``@dataclass`` with string fields, built through an intermediate dict)::
+
+    python -m benchmarks.entity_memory --users 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, List, Optional, Sequence
+
+from capitalia.domain.models import User
+
+
+COLUMNS = ["id", "name", "email", "password_hash", "salt", "plan", "start_date", "status"]
+PLANS = ("basic", "trial", "premium")
+
+
+@dataclass
+class LegacyUser:
+    id: Optional[int]
+    name: str
+    email: str
+    password_hash: str
+    salt: str
+    plan: str
+    start_date: date
+    status: str
+
+
+def legacy_to_entity(row) -> LegacyUser:
+    d = {k: row[i] for i, k in enumerate(COLUMNS)}
+    sd = date.fromisoformat(d["start_date"]) if isinstance(d["start_date"], str) else d["start_date"]
+    return LegacyUser(
+        id=int(d["id"]) if d["id"] is not None else None,
+        name=d["name"],
+        email=d["email"],
+        password_hash=d["password_hash"],
+        salt=d["salt"],
+        plan=d["plan"],
+        start_date=sd,
+        status=d["status"],
+    )
+
+
+def _rows(n: int) -> List[tuple]:
+    # Fresh strings per row, as a database driver would return them.
+    return [
+        (uid, f"User {uid}", f"user{uid}@example.com", "%064x" % uid, "%032x" % uid,
+         "".join(PLANS[uid % 3]), f"2024-01-{uid % 28 + 1:02d}", "".join("active"))
+        for uid in range(n)
+    ]
+
+
+def _measure(label: str, mapper: Callable[[tuple], object], rows: Sequence[tuple]) -> None:
+    started = time.perf_counter()
+    for row in rows:
+        mapper(row)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entities = [mapper(row) for row in rows]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # Subtract the list itself and the field values shared with ``rows``.
+    per_entity = (retained - sys.getsizeof(entities)) / len(entities)
+    print(f"{label:<26} {len(rows) / elapsed:>12,.0f} rows/s  {per_entity:7.1f} B/entity (excl. shared strings)",
+          file=sys.stderr)
+    del entities
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="User entity memory and mapping benchmark.")
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = _rows(args.users)
+    _measure("legacy dataclass + dict", legacy_to_entity, rows)
+    _measure("slotted User.from_row", User.from_row, rows)
+
+
+if __name__ == "__main__":
+    main()
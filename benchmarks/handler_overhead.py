@@ -0,0 +1,135 @@
+"""Measure handler-chain and HTTP overhead with the database removed.
+
+Uses the ``DB_KIND=memory`` backend so every request costs only routing,
+JWT verification, the domain rules and (optionally) the socket server::
+
+    python -m benchmarks.handler_overhead --users 10000 --requests 50000
+    python -m benchmarks.handler_overhead --http --concurrency 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import http.client
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import List, Sequence
+
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.adapters.passwords import PasswordHasher
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.app.server import run_server
+from capitalia.domain.models import User
+from jwt_service.tokens import sign
+
+SECRET = "benchmark-secret"
+
+
+class _LocalTokenClient:
+    def issue_token(self, claims, ttl_seconds: int = 3600) -> str:
+        return sign(claims, SECRET, ttl_seconds)
+
+
+def _seed(users: int) -> MemoryStore:
+    store = MemoryStore()
+    plans = ("basic", "trial", "premium")
+    with MemoryUnitOfWork(store) as uow:
+        uow.users.add_many(
+            [
+                User(None, f"User {n}", f"user{n}@example.com", "h", "s", plans[n % 3], date.today() - timedelta(days=n % 60), "active")
+                for n in range(users)
+            ]
+        )
+    return store
+
+
+def _report(label: str, latencies: Sequence[float], elapsed: float) -> None:
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<10} {len(ordered) / elapsed:>10,.0f} req/s  "
+        f"p50={statistics.median(ordered) * 1e6:,.0f}us  p99={p99 * 1e6:,.0f}us",
+        file=sys.stderr,
+    )
+
+
+def _in_process(processor, tokens: List[str], requests: int) -> None:
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for n in range(requests):
+        uid = n % len(tokens) + 1
+        request = HttpRequest(
+            "GET",
+            f"/user/{uid}/status",
+            f"/user/{uid}/status",
+            "",
+            {"authorization": f"Bearer {tokens[uid - 1]}"},
+            b"",
+            ("127.0.0.1", 0),
+        )
+        t0 = time.perf_counter()
+        response = processor.handle(request)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status == 200, response.body
+    _report("handler", latencies, time.perf_counter() - started)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _over_http(processor, tokens: List[str], requests: int, concurrency: int) -> None:
+    port = _free_port()
+    threading.Thread(target=run_server, args=(processor, port, "127.0.0.1"), daemon=True).start()
+    time.sleep(0.2)
+
+    def call(n: int) -> float:
+        uid = n % len(tokens) + 1
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        t0 = time.perf_counter()
+        conn.request("GET", f"/user/{uid}/status", headers={"Authorization": f"Bearer {tokens[uid - 1]}"})
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        assert resp.status == 200
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    _report("http", latencies, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Handler/HTTP overhead over the in-memory backend.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--http", action="store_true", help="also measure through the socket server")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    store = _seed(args.users)
+    tokens = [sign({"sub": uid}, SECRET, 3600) for uid in range(1, args.users + 1)]
+    processor = build_handler(
+        lambda: MemoryUnitOfWork(store), SECRET, token_client=_LocalTokenClient(), password_hasher=PasswordHasher()
+    )
+
+    # The logging handler prints one JSON line per request; keep it out of the numbers.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _in_process(processor, tokens, args.requests)
+        if args.http:
+            _over_http(processor, tokens, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
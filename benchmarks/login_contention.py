@@ -0,0 +1,115 @@
+"""Measure status-read latency while logins hash passwords.
+
+Status reads run in one thread while ``--login-threads`` threads log in
+continuously. The comparison is PBKDF2 computed inline in every login
+thread against PBKDF2 offloaded to a process pool of ``--workers``.
+Memory backend, so only routing, JWT and hashing cost anything::
+
+    python -m benchmarks.login_contention --iterations 600000 --workers 4 --seconds 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date
+from typing import List
+
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.adapters.passwords import PasswordHasher
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.models import User
+from jwt_service.tokens import sign
+
+SECRET = "benchmark-secret"
+PASSWORD = "password123"
+
+
+class _LocalTokenClient:
+    def issue_token(self, claims, ttl_seconds: int = 3600) -> str:
+        return sign(claims, SECRET, ttl_seconds)
+
+
+def _seed(users: int, hasher: PasswordHasher) -> MemoryStore:
+    password_hash, salt = hasher.hash(PASSWORD)  # shared: seeding cost stays flat
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uow.users.add_many(
+            [User(None, f"User {n}", f"user{n}@example.com", password_hash, salt, "basic", date.today(), "active") for n in range(users)]
+        )
+    return store
+
+
+def _request(method: str, path: str, headers: dict, body: bytes = b"") -> HttpRequest:
+    return HttpRequest(method, path, path, "", headers, body, ("127.0.0.1", 0))
+
+
+def _run(label: str, hasher: PasswordHasher, args) -> None:
+    store = _seed(args.users, hasher)
+    processor = build_handler(
+        lambda: MemoryUnitOfWork(store), SECRET, token_client=_LocalTokenClient(), password_hasher=hasher
+    )
+    token = sign({"sub": 1}, SECRET, 3600)
+    status_request = _request("GET", "/user/1/status", {"authorization": f"Bearer {token}"})
+    stop = threading.Event()
+    logins: List[int] = []
+
+    def login_loop(n: int) -> None:
+        count = 0
+        while not stop.is_set():
+            body = json.dumps({"email": f"user{(n + count) % args.users}@example.com", "password": PASSWORD}).encode()
+            response = processor.handle(_request("POST", "/login", {"content-type": "application/json"}, body))
+            assert response.status in (200, 503), response.body
+            count += 1
+        logins.append(count)
+
+    threads = [threading.Thread(target=login_loop, args=(n,)) for n in range(args.login_threads)]
+    for thread in threads:
+        thread.start()
+    latencies: List[float] = []
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        assert processor.handle(status_request).status == 200
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(0.001)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<7} {sum(logins) / args.seconds:>7,.1f} logins/s  status read "
+        f"p50={statistics.median(ordered) * 1e3:,.2f}ms  p99={p99 * 1e3:,.2f}ms",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Status-read latency under login load, inline vs. pooled hashing")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=600_000, help="PBKDF2 iterations")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="hashing processes")
+    parser.add_argument("--login-threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # request logs
+        _run("inline", PasswordHasher(iterations=args.iterations), args)
+        pooled = PasswordHasher(iterations=args.iterations, workers=args.workers, max_queue=args.login_threads)
+        try:
+            _run("pool", pooled, args)
+        finally:
+            pooled.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Measure how long each login holds a database connection.
+
+Runs concurrent logins against a SQLite file with a token client that
+sleeps for ``--token-latency`` ms, standing in for the remote token
+service. Each login is timed from connect to close of its connection.
+The ``before`` row reproduces the old flow, where the token call ran
+inside the unit of work; ``after`` goes through ``build_handler``::
+
+    python -m benchmarks.login_hold --logins 2000 --concurrency 16 --token-latency 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, List, Sequence
+
+from capitalia.adapters.passwords import LEGACY, PasswordHasher
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.uow import SqlUnitOfWork
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from jwt_service.tokens import sign
+
+SECRET = "benchmark-secret"
+PASSWORD = "password123"
+SALT = "s"
+
+_holds: List[float] = []
+_holds_lock = threading.Lock()
+
+
+class _TimedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._opened = time.perf_counter()
+
+    def close(self) -> None:
+        super().close()
+        with _holds_lock:
+            _holds.append(time.perf_counter() - self._opened)
+
+
+class _SlowTokenClient:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def issue_token(self, claims, ttl_seconds: int = 3600) -> str:
+        time.sleep(self.latency)
+        return sign(claims, SECRET, ttl_seconds)
+
+
+def _seed(path: str, users: int) -> None:
+    password_hash = hashlib.sha256((SALT + PASSWORD).encode()).hexdigest()
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL,"
+            " password_hash TEXT NOT NULL, salt TEXT NOT NULL, plan TEXT NOT NULL, start_date TEXT NOT NULL,"
+            " status TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO users (name, email, password_hash, salt, plan, start_date, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (f"User {n}", f"user{n}@example.com", password_hash, SALT, "basic", date.today().isoformat(), "active")
+                for n in range(users)
+            ],
+        )
+
+
+def _legacy_login(uow_factory, token_client) -> Callable[[str], int]:
+    """The pre-staging flow: password check and token call inside the unit of work."""
+
+    def login(email: str) -> int:
+        with uow_factory() as uow:
+            user = uow.users.get_by_email(email)
+            if hashlib.sha256((user.salt + PASSWORD).encode()).hexdigest() != user.password_hash:
+                return 401
+            token_client.issue_token({"sub": user.id, "email": user.email, "plan": user.plan}, ttl_seconds=3600)
+        return 200
+
+    return login
+
+
+def _handler_login(uow_factory, token_client) -> Callable[[str], int]:
+    # The seeded rows use the legacy hash; keeping that scheme means neither flow rehashes.
+    processor = build_handler(uow_factory, SECRET, token_client=token_client, password_hasher=PasswordHasher(LEGACY))
+
+    def login(email: str) -> int:
+        body = json.dumps({"email": email, "password": PASSWORD}).encode()
+        request = HttpRequest("POST", "/login", "/login", "", {"content-type": "application/json"}, body, ("127.0.0.1", 0))
+        return processor.handle(request).status
+
+    return login
+
+
+def _report(label: str, holds: Sequence[float], logins: int, elapsed: float) -> None:
+    ordered = sorted(holds)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{label:<7} {logins / elapsed:>8,.0f} logins/s  connection held "
+        f"p50={statistics.median(ordered) * 1e3:,.2f}ms  p99={p99 * 1e3:,.2f}ms",
+        file=sys.stderr,
+    )
+
+
+def _run(label: str, login: Callable[[str], int], users: int, logins: int, concurrency: int) -> None:
+    _holds.clear()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        statuses = list(pool.map(login, (f"user{n % users}@example.com" for n in range(logins))))
+    elapsed = time.perf_counter() - started
+    assert all(status == 200 for status in statuses), set(statuses)
+    _report(label, _holds, logins, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DB connection hold time per login, before and after staging")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--token-latency", type=float, default=20.0, help="simulated token service latency (ms)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "login.db")
+        _seed(path, args.users)
+
+        def uow_factory() -> SqlUnitOfWork:
+            conn_factory = lambda: sqlite3.connect(path, timeout=30, factory=_TimedConnection, check_same_thread=False)
+            return SqlUnitOfWork(conn_factory, SqliteUserRepository)
+
+        token_client = _SlowTokenClient(args.token_latency / 1e3)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # request logs
+            _run("before", _legacy_login(uow_factory, token_client), args.users, args.logins, args.concurrency)
+            _run("after", _handler_login(uow_factory, token_client), args.users, args.logins, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
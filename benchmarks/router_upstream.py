@@ -0,0 +1,93 @@
+"""Router latency with and without pooled upstream connections.
+
+A keep-alive HTTP/1.1 backend answers a small JSON body. The router runs in
+process, once with ``max_idle=0`` (a new upstream socket per request, as
+before) and once with the default pool. The client keeps its own connection
+to the router open, so the numbers isolate the router-to-backend hop::
+
+    python -m benchmarks.router_upstream --requests 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import http.server
+import statistics
+import sys
+import threading
+import time
+
+import router.router as router_module
+from router.router import MAX_IDLE_PER_BACKEND, BackendPool, Proxy, ThreadingTCPServer
+
+BODY = b'{"status":"ativo","plan":"premium"}'
+
+
+class _Backend(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 65536  # one segment per response, as real servers send it
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        return
+
+
+def _serve(server) -> None:
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def _run(label: str, backend_port: int, max_idle: int, requests: int) -> None:
+    pool = BackendPool("127.0.0.1", [backend_port], "/", 5.0, lambda *args: True, max_idle=max_idle)
+    pool.refresh()
+    router_module.ROUTING_RULES[:] = [("", pool)]
+    proxy = ThreadingTCPServer(("127.0.0.1", 0), Proxy)
+    _serve(proxy)
+    latencies = []
+    try:
+        for _ in range(requests):
+            # The router speaks HTTP/1.0 to clients and closes after each response.
+            conn = http.client.HTTPConnection("127.0.0.1", proxy.server_address[1], timeout=5)
+            started = time.perf_counter()
+            conn.request("GET", "/user/1/status")
+            conn.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+            conn.close()
+    finally:
+        proxy.shutdown()
+        proxy.server_close()
+        pool.close()
+    latencies.sort()
+    stats = pool.stats()
+    print(
+        f"{label:<8} p50 {statistics.median(latencies) * 1e3:6.3f}ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.3f}ms  "
+        f"upstream sockets {stats['created']:>6}  reused {stats['reused']:>6}",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Router latency, per-request upstream sockets vs. pooled ones")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    backend = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Backend)
+    _serve(backend)
+    try:
+        _run("fresh", backend.server_address[1], 0, args.requests)
+        _run("pooled", backend.server_address[1], max(MAX_IDLE_PER_BACKEND, 1), args.requests)
+    finally:
+        backend.shutdown()
+        backend.server_close()
+
+
+if __name__ == "__main__":
+    main()
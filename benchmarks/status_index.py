@@ -0,0 +1,79 @@
+"""Lookup latency of the memory-mapped status index versus a SQLite point query.
+
+    python -m benchmarks.status_index --users 1000000 --lookups 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.status_index import StatusIndex
+from capitalia.domain.user_states import get_user_state
+
+
+PLANS = ("basic", "trial", "premium")
+
+
+def _report(label: str, lookups: int, elapsed: float) -> None:
+    print(f"{label:<22} {lookups / elapsed:>12,.0f} lookups/s  {elapsed / lookups * 1e6:8.2f} us/lookup", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Status index vs. SQLite point lookups.")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--sqlite-users", type=int, default=100_000, help="rows seeded for the SQLite baseline")
+    args = parser.parse_args()
+
+    base = date(2024, 1, 1)
+    today = base + timedelta(days=45)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "status.idx")
+        started = time.perf_counter()
+        StatusIndex.build(
+            path,
+            ((uid, PLANS[uid % 3], "active", base + timedelta(days=uid % 60)) for uid in range(1, args.users + 1)),
+        )
+        print(f"built {args.users:,} entries in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(path) / 1e6:.1f} MB)", file=sys.stderr)
+
+        index = StatusIndex(path, writable=False)
+        ids = [random.randint(1, args.users) for _ in range(args.lookups)]
+        started = time.perf_counter()
+        for uid in ids:
+            plan, status, start = index.get(uid)
+            get_user_state(status).evaluate_fields(plan, start, today)
+        _report("status index", args.lookups, time.perf_counter() - started)
+
+        conn = sqlite3.connect(os.path.join(tmp, "baseline.db"))
+        apply_migrations(conn, "sqlite")
+        repo = SqliteUserRepository(conn)
+        conn.executemany(
+            "INSERT INTO users (name, email, password_hash, salt, plan, start_date, status) VALUES (?, ?, ?, ?, ?, ?, 'active')",
+            (
+                (f"User {n}", f"user{n}@example.com", "h" * 64, "s" * 32, PLANS[n % 3], (base + timedelta(days=n % 60)).isoformat())
+                for n in range(args.sqlite_users)
+            ),
+        )
+        conn.commit()
+        ids = [random.randint(1, args.sqlite_users) for _ in range(args.lookups)]
+        started = time.perf_counter()
+        for uid in ids:
+            user = repo.get_by_id(uid)
+            get_user_state(user.status).evaluate(user, today)
+        _report("sqlite get_by_id", args.lookups, time.perf_counter() - started)
+        conn.close()
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Sign/verify throughput of :class:`jwt_service.tokens.TokenCodec`.
+
+The ``baseline`` rows run the previous per-call implementation: header
+re-encoded and HMAC keyed from scratch on every call. ``bad sig`` feeds
+tokens signed with another secret::
+
+    python -m benchmarks.token_codec --tokens 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hmac
+import json
+import sys
+import time
+from hashlib import sha256
+from typing import Callable, Dict, List
+
+from jwt_service.tokens import TokenCodec
+
+SECRET = "benchmark-secret"
+CLAIMS = {"sub": 123456, "email": "user123456@example.com", "plan": "premium"}
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _baseline_sign(payload: Dict, secret: str, ttl_seconds: int = 3600) -> str:
+    now = int(time.time())
+    body = dict(payload)
+    body.setdefault("iat", now)
+    body.setdefault("exp", now + ttl_seconds)
+    header_b64 = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+    payload_b64 = _b64url(json.dumps(body, separators=(",", ":")).encode())
+    signing_input = f"{header_b64}.{payload_b64}".encode()
+    return f"{header_b64}.{payload_b64}.{_b64url(hmac.new(secret.encode(), signing_input, sha256).digest())}"
+
+
+def _baseline_verify(token: str, secret: str) -> Dict:
+    header_b64, payload_b64, sig_b64 = token.split(".")
+    signing_input = f"{header_b64}.{payload_b64}".encode()
+    if not hmac.compare_digest(hmac.new(secret.encode(), signing_input, sha256).digest(), _b64url_decode(sig_b64)):
+        raise ValueError("invalid signature")
+    payload = json.loads(_b64url_decode(payload_b64))
+    if int(time.time()) > int(payload.get("exp", 0)):
+        raise ValueError("token expired")
+    return payload
+
+
+def _rate(label: str, op: Callable[[int], object], n: int) -> None:
+    started = time.perf_counter()
+    for i in range(n):
+        op(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {n / elapsed:>12,.0f} ops/s  {elapsed / n * 1e6:6.2f}us/op", file=sys.stderr)
+
+
+def _rejecting(verify: Callable[[str], object]) -> Callable[[str], None]:
+    def op(token: str) -> None:
+        try:
+            verify(token)
+        except ValueError:
+            pass
+
+    return op
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HS256 sign/verify throughput, TokenCodec vs. per-call baseline")
+    parser.add_argument("--tokens", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.tokens
+
+    codec = TokenCodec(SECRET)
+    good: List[str] = [codec.sign(CLAIMS) for _ in range(min(n, 1000))]
+    forged = [TokenCodec("other").sign(CLAIMS) for _ in range(min(n, 1000))]
+    reject_baseline = _rejecting(lambda t: _baseline_verify(t, SECRET))
+    reject_codec = _rejecting(codec.verify)
+
+    _rate("sign    baseline", lambda i: _baseline_sign(CLAIMS, SECRET), n)
+    _rate("sign    codec", lambda i: codec.sign(CLAIMS), n)
+    _rate("verify  baseline", lambda i: _baseline_verify(good[i % len(good)], SECRET), n)
+    _rate("verify  codec", lambda i: codec.verify(good[i % len(good)]), n)
+    _rate("bad sig baseline", lambda i: reject_baseline(forged[i % len(forged)]), n)
+    _rate("bad sig codec", lambda i: reject_codec(forged[i % len(forged)]), n)
+
+
+if __name__ == "__main__":
+    main()
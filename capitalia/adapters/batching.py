@@ -0,0 +1,234 @@
+"""Dataloader-style batching of concurrent ``get_by_id`` lookups.
+
+Concurrent read-only units of work wrapped by :class:`BatchingLoader` queue
+their lookups instead of querying one row each. The first caller of a batch
+becomes its leader: it waits up to ``max_wait`` seconds (or until
+``max_batch`` lookups are queued), runs one ``get_many`` on its own
+connection and hands every row to the caller waiting for it. Leftover
+lookups promote the next queued caller to leader, so no background thread
+is involved.
+
+Lookups are only batched with others bound for the same target (``route``,
+e.g. primary vs. replica), so a read pinned to the primary is never answered
+from a replica. Wrapped units of work open their inner one lazily: a
+follower that only calls ``get_by_id`` never takes a connection.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set
+
+from ..domain.models import User
+from ..metrics import Histogram
+from ..ports.repositories import UserRepository
+from ..ports.unit_of_work import UnitOfWork
+
+
+FetchMany = Callable[[Sequence[int]], Dict[int, User]]
+Route = Callable[[Optional[int]], Hashable]
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+WAIT_MS_BOUNDS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class _Pending:
+    __slots__ = ("user_id", "key", "enqueued", "ready", "leading", "done", "result", "error")
+
+    def __init__(self, user_id: int, key: Hashable, enqueued: float) -> None:
+        self.user_id = user_id
+        self.key = key
+        self.enqueued = enqueued
+        self.ready = threading.Event()
+        self.leading = False
+        self.done = False
+        self.result: Optional[User] = None
+        self.error: Optional[BaseException] = None
+
+
+class BatchingLoader:
+    def __init__(
+        self,
+        *,
+        max_batch: int = 100,
+        max_wait: float = 0.002,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, List[_Pending]] = {}
+        self._leading: Set[Hashable] = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.wait_ms = Histogram(WAIT_MS_BOUNDS)
+
+    def load(self, user_id: int, fetch_many: FetchMany, key: Hashable = None) -> Optional[User]:
+        """Return the user for ``user_id``; ``fetch_many`` runs if this caller leads the batch.
+
+        Only lookups with the same ``key`` share a batch.
+        """
+
+        item = _Pending(user_id, key, self._clock())
+        with self._cond:
+            pending = self._pending.setdefault(key, [])
+            pending.append(item)
+            if key not in self._leading:
+                self._leading.add(key)
+                item.leading = True
+            elif len(pending) >= self.max_batch:
+                self._cond.notify_all()
+        if not item.leading:
+            item.ready.wait()
+        if not item.done:
+            # First caller of the batch, or promoted from a previous overflow.
+            self._lead(item, fetch_many)
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _lead(self, leader: _Pending, fetch_many: FetchMany) -> None:
+        key = leader.key
+        with self._cond:
+            pending = self._pending[key]
+            deadline = leader.enqueued + self.max_wait
+            while len(pending) < self.max_batch:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = pending[: self.max_batch]
+            del pending[: self.max_batch]
+            if pending:
+                successor = pending[0]
+                successor.leading = True
+                successor.ready.set()
+            else:
+                del self._pending[key]
+                self._leading.discard(key)
+
+        dispatched = self._clock()
+        self.batch_sizes.observe(len(batch))
+        for item in batch:
+            self.wait_ms.observe((dispatched - item.enqueued) * 1000)
+        try:
+            found = fetch_many(list(dict.fromkeys(item.user_id for item in batch)))
+            error = None
+        except BaseException as exc:  # noqa: BLE001 - re-raised in every waiting caller
+            found, error = {}, exc
+        for item in batch:
+            item.result = found.get(item.user_id)
+            item.error = error
+            item.done = True
+            item.ready.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
+
+    def wrap(
+        self,
+        read_uow_factory: Callable[[Optional[int]], UnitOfWork],
+        *,
+        route: Optional[Route] = None,
+        open_route: Optional[Callable[[Hashable], UnitOfWork]] = None,
+    ) -> Callable[[Optional[int]], UnitOfWork]:
+        """Wrap a read-only UoW factory so its ``get_by_id`` calls are batched.
+
+        ``route(user_id)`` names the target a user's reads must go to and
+        ``open_route(target)`` opens a UoW on it (see ``ReplicaRouter``).
+        Without them every read goes to ``read_uow_factory``.
+        """
+
+        def factory(user_id: Optional[int] = None) -> UnitOfWork:
+            if route is None or open_route is None:
+                return BatchedReadUnitOfWork(lambda: read_uow_factory(user_id), self)
+            key = route(user_id)
+            return BatchedReadUnitOfWork(lambda: open_route(key), self, key)
+
+        return factory
+
+
+class BatchingUserRepository(UserRepository):
+    """Read-only view that sends ``get_by_id`` through a :class:`BatchingLoader`."""
+
+    def __init__(self, uow: "BatchedReadUnitOfWork", loader: BatchingLoader) -> None:
+        self._uow = uow
+        self._loader = loader
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        return self._loader.load(user_id, self._uow.fetch_many, self._uow.key)
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        return self._uow.inner_users().get_by_email(email)
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        return self._uow.inner_users().get_many(user_ids)
+
+    def add(self, user: User) -> int:
+        raise TypeError("batched units of work are read-only")
+
+    def save(self, user: User) -> None:
+        raise TypeError("batched units of work are read-only")
+
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        raise TypeError("batched units of work are read-only")
+
+    def save_many(self, users: Sequence[User]) -> None:
+        raise TypeError("batched units of work are read-only")
+
+
+class BatchedReadUnitOfWork(UnitOfWork):
+    """Opens the inner UoW on first use, i.e. only when leading a batch or reading by email."""
+
+    def __init__(self, open_inner: Callable[[], UnitOfWork], loader: BatchingLoader, key: Hashable = None) -> None:
+        self._open_inner = open_inner
+        self._loader = loader
+        self.key = key
+        self._inner: Optional[UnitOfWork] = None
+        self.users = None
+
+    def __enter__(self):
+        self.users = BatchingUserRepository(self, self._loader)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        inner, self._inner = self._inner, None
+        try:
+            if inner is not None:
+                return inner.__exit__(exc_type, exc, tb)
+            return None
+        finally:
+            self.users = None
+
+    def inner_users(self) -> UserRepository:
+        if self._inner is None:
+            inner = self._open_inner()
+            inner.__enter__()
+            self._inner = inner
+        return self._inner.users
+
+    def fetch_many(self, user_ids: Sequence[int]) -> Dict[int, User]:
+        return self.inner_users().get_many(user_ids)
+
+    def begin(self) -> None:
+        if self._inner is not None:
+            self._inner.begin()
+
+    def commit(self) -> None:
+        if self._inner is not None:
+            self._inner.commit()
+
+    def rollback(self) -> None:
+        if self._inner is not None:
+            self._inner.rollback()
+
+
+__all__ = ["BatchedReadUnitOfWork", "BatchingLoader", "BatchingUserRepository"]
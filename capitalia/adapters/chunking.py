@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield lists of at most ``size`` items, consuming ``items`` lazily."""
+
+    if size <= 0:
+        raise ValueError("chunk size must be positive")
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+__all__ = ["chunked"]
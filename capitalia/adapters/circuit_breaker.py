@@ -0,0 +1,131 @@
+"""Circuit breaker for calls to a remote dependency.
+
+The breaker keeps the outcome of the last ``window`` calls. Once at least
+``min_calls`` are recorded, it trips **open** when the share of failures
+reaches ``failure_rate``. It also trips when the share of calls slower than
+``slow_call_threshold`` reaches ``slow_call_rate``. While open,
+:meth:`CircuitBreaker.allow` refuses calls for ``open_duration`` seconds, so
+callers fail fast instead of waiting out a timeout. After that the breaker
+goes **half-open** and lets ``half_open_calls`` probes through. If they all
+succeed quickly the circuit closes; any failure opens it again.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        *,
+        window: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_threshold: float = 1.0,
+        slow_call_rate: float = 0.8,
+        open_duration: float = 5.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate = slow_call_rate
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._calls = 0
+        self._failures = 0
+        self._slow = 0
+        self._rejected = 0
+        self._trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; every allowed call must be followed by :meth:`record` or :meth:`cancel`."""
+
+        with self._lock:
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.open_duration:
+                    self._rejected += 1
+                    return False
+                self._state = HALF_OPEN
+                self._probes = self._probe_successes = 0
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self._rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def cancel(self) -> None:
+        """Give back a call :meth:`allow` let through that never went out."""
+
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, ok: bool, latency: float) -> None:
+        slow = latency >= self.slow_call_threshold
+        with self._lock:
+            self._calls += 1
+            self._failures += not ok
+            self._slow += slow
+            if self._state == HALF_OPEN:
+                if not ok or slow:
+                    self._trip()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._state = CLOSED
+                        self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                return  # started before the circuit opened
+            self._outcomes.append((not ok, slow))
+            n = len(self._outcomes)
+            if n < self.min_calls:
+                return
+            failed = sum(f for f, _ in self._outcomes)
+            slow_calls = sum(s for _, s in self._outcomes)
+            if failed / n >= self.failure_rate or slow_calls / n >= self.slow_call_rate:
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self._trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "calls": self._calls,
+                "failures": self._failures,
+                "slow_calls": self._slow,
+                "rejected": self._rejected,
+                "trips": self._trips,
+            }
+
+
+__all__ = ["CLOSED", "HALF_OPEN", "OPEN", "CircuitBreaker"]
@@ -0,0 +1,159 @@
+"""Materialized per-(plan, status) user counts.
+
+``user_counters`` holds ``COUNT(*) FROM users GROUP BY plan, status``. Every
+mutation bumps it by deltas inside its own transaction (premium/active -1,
+premium/suspended +1), so the totals commit or roll back with the users.
+Each pair is spread over ``SLOTS`` rows and a transaction picks one at
+random, so concurrent transitions rarely queue on the same row lock;
+readers ``SUM`` the slots.
+
+:class:`CounterMirror` keeps an in-process copy for ``GET /admin/stats`` and
+re-reads the (tiny) table at most every ``ttl`` seconds.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from ..domain.models import Plan, Status
+
+
+SLOTS = 8
+
+CounterKey = Tuple[str, str]
+
+_UPSERT = {
+    "sqlite": (
+        "INSERT INTO user_counters (plan, status, slot, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(plan, status, slot) DO UPDATE SET count = count + excluded.count"
+    ),
+    "mysql": (
+        "INSERT INTO user_counters (plan, status, slot, count) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+    ),
+}
+_TOTALS = "SELECT plan, status, SUM(count) FROM user_counters GROUP BY plan, status"
+
+
+def _rows(cur: Any) -> Sequence[Sequence[Any]]:
+    rows = cur.fetchall()
+    # DictCursor (pymysql default in Config) returns mappings.
+    return [tuple(r.values()) if isinstance(r, dict) else r for r in rows]
+
+
+def read_totals(conn: Any) -> Dict[CounterKey, int]:
+    cur = conn.cursor()
+    try:
+        cur.execute(_TOTALS)
+        return {(str(plan), str(status)): int(total) for plan, status, total in _rows(cur) if total}
+    finally:
+        cur.close()
+
+
+class SqlCounters:
+    """Applies counter deltas on the connection of the surrounding unit of work."""
+
+    def __init__(self, conn: Any, kind: str, *, slots: int = SLOTS) -> None:
+        self._conn = conn
+        self._sql = _UPSERT[kind]
+        self._slots = slots
+
+    def apply(self, deltas: Mapping[CounterKey, int]) -> None:
+        if not deltas:
+            return
+        slot = random.randrange(self._slots)
+        # Sorted so two transactions always lock counter rows in the same order.
+        rows = [(str(plan), str(status), slot, delta) for (plan, status), delta in sorted(deltas.items()) if delta]
+        cur = self._conn.cursor()
+        try:
+            cur.executemany(self._sql, rows)
+        finally:
+            cur.close()
+
+    def totals(self) -> Dict[CounterKey, int]:
+        return read_totals(self._conn)
+
+
+def reconcile(conn: Any) -> Tuple[Dict[CounterKey, int], Dict[CounterKey, int]]:
+    """Rebuild ``user_counters`` from ``users`` in one transaction.
+
+    Returns the totals before and after. Deleting the counter rows first
+    locks out concurrent deltas until the recount commits.
+    """
+
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN")
+        before = read_totals(conn)
+        cur.execute("DELETE FROM user_counters")
+        cur.execute(
+            "INSERT INTO user_counters (plan, status, slot, count) "
+            "SELECT plan, status, 0, COUNT(*) FROM users GROUP BY plan, status"
+        )
+        after = read_totals(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return before, after
+
+
+def sum_totals(parts: Iterable[Mapping[CounterKey, int]]) -> Dict[CounterKey, int]:
+    merged: Dict[CounterKey, int] = {}
+    for part in parts:
+        for key, count in part.items():
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def stats_payload(totals: Mapping[CounterKey, int]) -> Dict[str, Any]:
+    """``{"users": n, "by_plan": {plan: {status: n}}}`` with every pair present."""
+
+    by_plan = {plan.value: {status.value: int(totals.get((plan.value, status.value), 0)) for status in Status} for plan in Plan}
+    return {"users": sum(sum(counts.values()) for counts in by_plan.values()), "by_plan": by_plan}
+
+
+class CounterMirror:
+    """In-process copy of the counter totals, reloaded at most every ``ttl`` seconds."""
+
+    def __init__(
+        self,
+        load: Callable[[], Mapping[CounterKey, int]],
+        *,
+        ttl: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._load = load
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._totals: Dict[CounterKey, int] = {}
+        self._loaded_at: Optional[float] = None
+
+    def totals(self) -> Dict[CounterKey, int]:
+        now = self._clock()
+        if self._loaded_at is None or now - self._loaded_at >= self._ttl:
+            with self._lock:
+                if self._loaded_at is None or now - self._loaded_at >= self._ttl:
+                    self._totals = dict(self._load())
+                    self._loaded_at = now
+        return self._totals
+
+    def report(self) -> Dict[str, Any]:
+        return stats_payload(self.totals())
+
+
+__all__ = [
+    "CounterMirror",
+    "SLOTS",
+    "SqlCounters",
+    "read_totals",
+    "reconcile",
+    "stats_payload",
+    "sum_totals",
+]
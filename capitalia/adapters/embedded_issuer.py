@@ -0,0 +1,55 @@
+"""In-process token issuer (``JWT_ISSUER=embedded``).
+
+It signs with :class:`jwt_service.tokens.TokenCodec` and validates claims and
+TTL with the same :func:`~jwt_service.tokens.parse_token_request` as the token
+service. The tokens and the errors match what ``POST /token`` would return,
+without the network hop and without a second process to keep up.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Sequence
+
+from jwt_service.tokens import TokenCodec, parse_token_request
+
+from ..ports.auth_issuer import AuthIssuer, TokenIssueError, TokenRequest
+
+
+class EmbeddedTokenIssuer(AuthIssuer):
+    def __init__(self, secret: str, *, default_ttl: int = 3600, max_batch: int = 256) -> None:
+        self._codec = TokenCodec(secret)
+        self.default_ttl = default_ttl
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._issued = 0
+        self._rejected = 0
+
+    def issue_token(self, claims: Dict[str, Any], ttl_seconds: int = 3600) -> str:
+        return self.issue_tokens([(claims, ttl_seconds)])[0]
+
+    def issue_tokens(self, requests: Sequence[TokenRequest]) -> List[str]:
+        if len(requests) > self.max_batch:
+            self._reject(f"at most {self.max_batch} requests per batch")
+        parsed = []
+        for claims, ttl in requests:
+            try:
+                parsed.append(parse_token_request({"claims": claims, "ttl": ttl}, self.default_ttl))
+            except ValueError as exc:
+                self._reject(str(exc))
+        tokens = [self._codec.sign(claims, ttl) for claims, ttl in parsed]
+        with self._lock:
+            self._issued += len(tokens)
+        return tokens
+
+    def _reject(self, message: str) -> None:
+        with self._lock:
+            self._rejected += 1
+        raise TokenIssueError(f"invalid token request: {message}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": "embedded", "issued": self._issued, "rejected": self._rejected}
+
+
+__all__ = ["EmbeddedTokenIssuer"]
@@ -0,0 +1,260 @@
+"""Result cache behind the ``Idempotency-Key`` request header.
+
+:class:`IdempotencyCache` remembers the first response produced for a key
+and replays it for retries, so a client or router retry does not run the
+mutation again. Entries live in an in-process LRU for ``ttl`` seconds. With
+a :class:`SqlIdempotencyStore` they are also written to ``idempotency_keys``
+and survive restarts and reach the other nodes behind the router.
+
+A duplicate that arrives while the first request is still running waits
+for it instead of executing in parallel. This coordination is per
+process; across nodes only finished results are shared. Responses the
+caller does not want stored (5xx) release the key, so the next retry runs
+again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True, slots=True)
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    created_at: float
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+class IdempotencyInFlight(Exception):
+    """The first request with this key did not finish within the wait limit."""
+
+
+def scoped_key(*parts: str) -> str:
+    """sha256 of the key and what it is scoped to (subject, method, path)."""
+
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def fingerprint(method: str, path: str, body: bytes) -> str:
+    return hashlib.sha256(method.encode() + b"\0" + path.encode() + b"\0" + body).hexdigest()
+
+
+class SqlIdempotencyStore:
+    """``idempotency_keys`` on the main database; opens a connection per call."""
+
+    def __init__(self, conn_factory: Callable[[], Any], kind: str) -> None:
+        self._conn_factory = conn_factory
+        ph = "%s" if kind == "mysql" else "?"
+        self._select = (
+            f"SELECT fingerprint, status, headers, body, created_at FROM idempotency_keys WHERE key_hash = {ph}"
+        )
+        self._insert = (
+            "REPLACE INTO idempotency_keys (key_hash, fingerprint, status, headers, body, created_at) "
+            f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
+        )
+        self._purge = f"DELETE FROM idempotency_keys WHERE created_at < {ph}"
+
+    def _execute(self, sql: str, params: Tuple[Any, ...], *, fetch: bool = False) -> Any:
+        conn = self._conn_factory()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                row = cur.fetchone() if fetch else None
+            finally:
+                cur.close()
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        row = self._execute(self._select, (key,), fetch=True)
+        if row is None:
+            return None
+        if isinstance(row, dict):
+            row = tuple(row.values())
+        fp, status, headers, body, created_at = row
+        return StoredResponse(fp, int(status), json.loads(headers), bytes(body), float(created_at))
+
+    def put(self, key: str, entry: StoredResponse) -> None:
+        # REPLACE: an expired row for the same key may not be purged yet.
+        self._execute(
+            self._insert,
+            (key, entry.fingerprint, entry.status, json.dumps(entry.headers), entry.body, entry.created_at),
+        )
+
+    def purge(self, before: float) -> None:
+        self._execute(self._purge, (before,))
+
+
+class _InFlight:
+    __slots__ = ("fingerprint", "done")
+
+    def __init__(self, fp: str) -> None:
+        self.fingerprint = fp
+        self.done = threading.Event()
+
+
+class IdempotencyCache:
+    def __init__(
+        self,
+        *,
+        ttl: float = 86_400.0,
+        max_entries: int = 100_000,
+        store: Optional[SqlIdempotencyStore] = None,
+        wait_timeout: float = 30.0,
+        purge_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._store = store
+        self._purge_interval = purge_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._last_purge = clock()
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._conflicts = 0
+
+    def execute(
+        self,
+        key: str,
+        fp: str,
+        run: Callable[[], StoredResponse],
+        *,
+        cacheable: Callable[[StoredResponse], bool] = lambda entry: entry.status < 500,
+    ) -> Tuple[StoredResponse, bool]:
+        """Return ``(response, replayed)``; ``run`` executes at most once per key."""
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._lock:
+                entry = self._lookup_local(key)
+                flight = self._in_flight.get(key) if entry is None else None
+                if entry is None and flight is None:
+                    flight = self._in_flight[key] = _InFlight(fp)
+                    break
+            if entry is not None:
+                return self._replay(entry, fp), True
+            if flight.fingerprint != fp:
+                self._count_conflict()
+                raise IdempotencyConflict("key reused for a different request")
+            with self._lock:
+                self._waits += 1
+            if not flight.done.wait(max(deadline - time.monotonic(), 0.0)):
+                raise IdempotencyInFlight("first request with this key still running")
+            # Finished: replay its result, or take over if it was not stored.
+
+        try:
+            stored = self._load(key) if self._store is not None else None
+            if stored is None:
+                with self._lock:
+                    self._misses += 1
+                result = run()
+        except BaseException:
+            self._finish(key, flight, None)
+            raise
+        if stored is not None:
+            self._finish(key, flight, stored)
+            return self._replay(stored, fp), True
+        self._finish(key, flight, result if cacheable(result) else None)
+        return result, False
+
+    def _lookup_local(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry.created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _load(self, key: str) -> Optional[StoredResponse]:
+        entry = self._store.get(key)
+        if entry is None or self._clock() - entry.created_at > self.ttl:
+            return None
+        return entry
+
+    def _replay(self, entry: StoredResponse, fp: str) -> StoredResponse:
+        if entry.fingerprint != fp:
+            self._count_conflict()
+            raise IdempotencyConflict("key reused for a different request")
+        with self._lock:
+            self._hits += 1
+        return entry
+
+    def _count_conflict(self) -> None:
+        with self._lock:
+            self._conflicts += 1
+
+    def _finish(self, key: str, flight: _InFlight, entry: Optional[StoredResponse]) -> None:
+        try:
+            if entry is not None and self._store is not None:
+                try:
+                    self._store.put(key, entry)
+                    self._maybe_purge()
+                except Exception as exc:  # noqa: BLE001
+                    # The response is already produced; keep serving it from memory.
+                    print(f"[idempotency] could not persist key: {exc!r}", file=sys.stderr)
+        finally:
+            with self._lock:
+                if entry is not None:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                self._in_flight.pop(key, None)
+            flight.done.set()
+
+    def _maybe_purge(self) -> None:
+        now = self._clock()
+        with self._lock:
+            if now - self._last_purge < self._purge_interval:
+                return
+            self._last_purge = now
+        self._store.purge(now - self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "conflicts": self._conflicts,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._store is not None,
+            }
+
+
+__all__ = [
+    "IdempotencyCache",
+    "IdempotencyConflict",
+    "IdempotencyInFlight",
+    "SqlIdempotencyStore",
+    "StoredResponse",
+    "fingerprint",
+    "scoped_key",
+]
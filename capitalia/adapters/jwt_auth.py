@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict
 
+from jwt_service.tokens import TokenCodec
 from jwt_service.tokens import verify as _verify
 
 
@@ -10,4 +11,4 @@ def verify(token: str, secret: str) -> Dict[str, Any]:
     return _verify(token, secret)
 
 
-__all__ = ["verify"]
+__all__ = ["TokenCodec", "verify"]
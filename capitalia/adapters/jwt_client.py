@@ -1,53 +1,344 @@
+"""Client for the token service, over a pool of keep-alive connections.
+
+Logins reuse idle ``http.client`` connections instead of paying a TCP
+handshake per token. The pool holds at most ``max_connections`` sockets.
+Callers wait up to ``connect_timeout`` for a free one. The connect and read
+timeouts are separate: an unreachable service fails fast, while a slow
+signer gets the full ``read_timeout``.
+
+A reused connection the server has already closed (idle timeout, restart)
+fails before any response byte. The request is then retried once on a
+fresh connection. Issuing a token has no side effects, so the retry is
+safe.
+
+An optional :class:`~capitalia.adapters.circuit_breaker.CircuitBreaker`
+makes logins fail fast while the service is down or slow. A
+``fallback_signer`` (local HS256 signing with the shared secret) then issues
+the token instead, and answers the calls the breaker refuses.
+
+With ``coalesce_window`` > 0, concurrent ``issue_token`` calls are gathered
+into one ``POST /tokens`` batch, the way ``adapters.batching`` groups
+reads. The first caller leads the batch: it waits up to the window (or
+until ``max_batch`` calls are queued), sends the batch and hands each
+token back to its caller.
+"""
+
 from __future__ import annotations
 
+import http.client
 import json
-import urllib.error
-import urllib.request
-from dataclasses import dataclass
-from typing import Any, Dict
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
 
+from ..metrics import Histogram
+from ..ports.auth_issuer import AuthIssuer, TokenIssueError, TokenRequest
+from .circuit_breaker import CircuitBreaker
 
-class TokenIssueError(RuntimeError):
-    """Raised when the token service cannot issue a token."""
 
+class TokenServiceUnavailable(TokenIssueError):
+    """The service could not be reached, failed (5xx) or its circuit is open."""
 
-@dataclass
-class JwtTokenClient:
-    base_url: str
-    timeout: float = 5.0
 
-    def __post_init__(self) -> None:
-        self.base_url = self.base_url.rstrip("/")
+class _BatchNotSupported(TokenIssueError):
+    pass
 
-    def issue_token(self, claims: Dict[str, Any], ttl_seconds: int = 3600) -> str:
-        payload = json.dumps({"claims": claims, "ttl": ttl_seconds}).encode()
-        request = urllib.request.Request(
-            f"{self.base_url}/token",
-            data=payload,
-            method="POST",
-            headers={"content-type": "application/json"},
+
+Signer = Callable[[Dict[str, Any], int], str]
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Errors of a kept-alive socket the server closed while it sat in the pool.
+_STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class _Pending:
+    __slots__ = ("request", "enqueued", "ready", "leading", "done", "result", "error")
+
+    def __init__(self, request: TokenRequest, enqueued: float) -> None:
+        self.request = request
+        self.enqueued = enqueued
+        self.ready = threading.Event()
+        self.leading = False
+        self.done = False
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class _Coalescer:
+    def __init__(
+        self,
+        issue_many: Callable[[Sequence[TokenRequest]], List[str]],
+        *,
+        max_batch: int,
+        max_wait: float,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self._issue_many = issue_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._pending: List[_Pending] = []
+        self._has_leader = False
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+
+    def submit(self, request: TokenRequest) -> str:
+        item = _Pending(request, self._clock())
+        with self._cond:
+            self._pending.append(item)
+            if not self._has_leader:
+                self._has_leader = item.leading = True
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        if not item.leading:
+            item.ready.wait()
+        if not item.done:
+            self._lead(item)
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _lead(self, leader: _Pending) -> None:
+        with self._cond:
+            deadline = leader.enqueued + self.max_wait
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            if self._pending:
+                successor = self._pending[0]
+                successor.leading = True
+                successor.ready.set()
+            else:
+                self._has_leader = False
+
+        self.batch_sizes.observe(len(batch))
+        try:
+            tokens = self._issue_many([item.request for item in batch])
+            error = None
+        except BaseException as exc:  # noqa: BLE001 - re-raised in every waiting caller
+            tokens, error = [None] * len(batch), exc
+        for item, token in zip(batch, tokens):
+            item.result = token
+            item.error = error
+            item.done = True
+            item.ready.set()
+
+
+class JwtTokenClient(AuthIssuer):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 5.0,
+        *,
+        connect_timeout: Optional[float] = None,
+        max_connections: int = 16,
+        max_idle: float = 10.0,  # below the token service keep-alive timeout
+        coalesce_window: float = 0.0,
+        max_batch: int = 64,
+        breaker: Optional[CircuitBreaker] = None,
+        fallback_signer: Optional[Signer] = None,
+    ) -> None:
+        parts = urlsplit(base_url.rstrip("/"))
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"invalid token service URL {base_url!r}")
+        self.base_url = base_url.rstrip("/")
+        self.read_timeout = timeout
+        self.connect_timeout = timeout if connect_timeout is None else connect_timeout
+        self.max_idle = max_idle
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port or (443 if self._https else 80)
+        self._prefix = parts.path
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._idle: Deque[Tuple[http.client.HTTPConnection, float]] = deque()
+        self._created = 0
+        self._reused = 0
+        self._stale = 0
+        self._in_use = 0
+        self._errors = 0
+        self._fallbacks = 0
+        self._batch_supported = True
+        self._breaker = breaker
+        self._fallback_signer = fallback_signer
+        self._coalescer = (
+            _Coalescer(self._issue_many, max_batch=max_batch, max_wait=coalesce_window)
+            if coalesce_window > 0
+            else None
         )
+
+    def issue_token(self, claims: Dict[str, Any], ttl_seconds: int = 3600) -> str:
         try:
-            with urllib.request.urlopen(request, timeout=self.timeout) as response:
-                body = response.read()
-                status = response.getcode()
-        except urllib.error.HTTPError as exc:  # pragma: no cover - network errors
-            raise TokenIssueError(f"token service returned {exc.code}") from exc
-        except urllib.error.URLError as exc:  # pragma: no cover - network errors
-            raise TokenIssueError("unable to reach token service") from exc
+            if self._coalescer is not None and self._batch_supported:
+                return self._coalescer.submit((claims, ttl_seconds))
+            return self._call_one(claims, ttl_seconds)
+        except TokenServiceUnavailable:
+            if self._fallback_signer is None:
+                raise
+            return self._sign_locally([(claims, ttl_seconds)])[0]
 
-        if status != 200:
-            raise TokenIssueError(f"unexpected status code {status}")
+    def issue_tokens(self, requests: Sequence[TokenRequest]) -> List[str]:
+        """One ``POST /tokens`` for ``(claims, ttl)`` pairs; tokens come back in order."""
 
         try:
-            data = json.loads(body.decode() or "{}")
-        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
-            raise TokenIssueError("invalid response from token service") from exc
+            return self._issue_many(requests)
+        except TokenServiceUnavailable:
+            if self._fallback_signer is None:
+                raise
+            return self._sign_locally(requests)
+
+    def _sign_locally(self, requests: Sequence[TokenRequest]) -> List[str]:
+        with self._lock:
+            self._fallbacks += len(requests)
+        return [self._fallback_signer(claims, ttl) for claims, ttl in requests]
+
+    def _issue_many(self, requests: Sequence[TokenRequest]) -> List[str]:
+        if not self._batch_supported:
+            return [self._call_one(claims, ttl) for claims, ttl in requests]
+        body = {"requests": [{"claims": claims, "ttl": ttl} for claims, ttl in requests]}
+        try:
+            data = self._call("/tokens", body)
+        except _BatchNotSupported:
+            # Older token service: fall back to one call per token from now on.
+            self._batch_supported = False
+            return [self._call_one(claims, ttl) for claims, ttl in requests]
+        tokens = data.get("tokens")
+        if not isinstance(tokens, list) or len(tokens) != len(requests) or not all(isinstance(t, str) for t in tokens):
+            raise TokenIssueError("token service response missing tokens")
+        return tokens
 
-        token = data.get("token")
+    def _call_one(self, claims: Dict[str, Any], ttl: int) -> str:
+        token = self._call("/token", {"claims": claims, "ttl": ttl}).get("token")
         if not isinstance(token, str):
             raise TokenIssueError("token service response missing token")
         return token
 
+    def _call(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        breaker = self._breaker
+        if breaker is not None and not breaker.allow():
+            raise TokenServiceUnavailable("token service circuit open")
+        if not self._slots.acquire(timeout=self.connect_timeout):
+            # Local back-pressure says nothing about the service: no outcome is recorded.
+            if breaker is not None:
+                breaker.cancel()
+            self._count_error()
+            raise TokenServiceUnavailable("token service connection pool exhausted")
+        started = time.monotonic()
+        status = 0
+        try:
+            status, raw = self._post(path, json.dumps(body).encode())
+        finally:
+            self._slots.release()
+            if breaker is not None:
+                breaker.record(0 < status < 500, time.monotonic() - started)
+        if status == 404 and path == "/tokens":
+            raise _BatchNotSupported()
+        if status >= 500:
+            raise TokenServiceUnavailable(f"token service returned {status}")
+        if status != 200:
+            raise TokenIssueError(f"token service returned {status}")
+
+        try:
+            data = json.loads(raw.decode() or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise TokenIssueError("invalid response from token service") from exc
+        if not isinstance(data, dict):
+            raise TokenIssueError("invalid response from token service")
+        return data
+
+    def _post(self, path: str, payload: bytes) -> Tuple[int, bytes]:
+        # The caller holds one of ``_slots``.
+        with self._lock:
+            self._in_use += 1
+        conn: Optional[http.client.HTTPConnection] = None
+        try:
+            conn, reused = self._checkout()
+            try:
+                status, body, keep = self._exchange(conn, path, payload)
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                with self._lock:
+                    self._stale += 1
+                conn = None
+                conn = self._connect()
+                status, body, keep = self._exchange(conn, path, payload)
+        except (OSError, http.client.HTTPException) as exc:
+            if conn is not None:
+                conn.close()
+            self._count_error()
+            raise TokenServiceUnavailable("unable to reach token service") from exc
+        finally:
+            with self._lock:
+                self._in_use -= 1
+        if keep:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            conn.close()
+        return status, body
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, idle_since = self._idle.pop()  # LIFO: the warmest socket
+                if now - idle_since <= self.max_idle:
+                    self._reused += 1
+                    return conn, True
+            conn.close()  # the server has probably dropped it already
+        return self._connect(), False
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        conn = cls(self._host, self._port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def _exchange(self, conn: http.client.HTTPConnection, path: str, payload: bytes) -> Tuple[int, bytes, bool]:
+        conn.request("POST", self._prefix + path, body=payload, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, body, not response.will_close
+
+    def _count_error(self) -> None:
+        with self._lock:
+            self._errors += 1
+
+    def close(self) -> None:
+        """Close the idle connections."""
+
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self._created,
+                "reused": self._reused,
+                "stale_retries": self._stale,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "errors": self._errors,
+                "local_fallbacks": self._fallbacks,
+                **({"breaker": self._breaker.stats()} if self._breaker else {}),
+                **({"batch_size": self._coalescer.batch_sizes.snapshot()} if self._coalescer else {}),
+            }
+
 
-__all__ = ["JwtTokenClient", "TokenIssueError"]
+__all__ = ["JwtTokenClient", "TokenIssueError", "TokenServiceUnavailable"]
@@ -0,0 +1,355 @@
+"""Dict-backed user store for ``DB_KIND=memory``.
+
+The store keeps immutable published copies of every user indexed by id and
+email. Units of work read through to it, keep private copies of what they
+touch and publish their write set atomically on commit.
+
+Durability is optional: when a log path is configured every commit appends
+full-row ``put`` records to an append-only JSON-lines log. A background
+flusher fsyncs the log in batches (group commit) and periodically writes a
+snapshot, after which the log starts over. Startup replays snapshot + log.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from dataclasses import replace
+from datetime import date
+from typing import Any, Dict, IO, Iterable, List, Optional, Sequence, Tuple
+
+from ..domain.models import User
+from ..ports.repositories import UserRepository
+from ..ports.unit_of_work import UnitOfWork
+
+
+class DuplicateEmailError(ValueError):
+    """Raised when a commit would give two users the same email."""
+
+
+def _encode(user: User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "password_hash": user.password_hash,
+        "salt": user.salt,
+        "plan": user.plan,
+        "start_date": user.start_date.isoformat(),
+        "status": user.status,
+    }
+
+
+def _decode(data: Dict[str, Any]) -> User:
+    return User(
+        id=int(data["id"]),
+        name=data["name"],
+        email=data["email"],
+        password_hash=data["password_hash"],
+        salt=data["salt"],
+        plan=data["plan"],
+        start_date=date.fromisoformat(data["start_date"]),
+        status=data["status"],
+    )
+
+
+class OperationLog:
+    """Append-only JSON-lines log with batched fsync and snapshot rotation."""
+
+    def __init__(self, path: str, *, fsync_interval: float = 0.05) -> None:
+        self.path = path
+        self.snapshot_path = f"{path}.snapshot"
+        self._rotated_path = f"{path}.old"
+        self.fsync_interval = fsync_interval
+        self._file: IO[str] = open(path, "a", encoding="utf-8")
+        self._dirty = False
+        self.entries_since_snapshot = 0
+
+    def replay(self) -> Iterable[Dict[str, Any]]:
+        """Yield the snapshot contents followed by every logged operation."""
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as fh:
+                snapshot = json.load(fh)
+            yield {"op": "next_id", "value": snapshot["next_id"]}
+            for data in snapshot["users"]:
+                yield {"op": "put", "user": data}
+        for path in (self._rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            good = 0
+            torn = False
+            with open(path, "rb") as fh:
+                for line in fh:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash: everything before it is intact.
+                        torn = True
+                        break
+                    good += len(line)
+                    yield record
+            if torn:
+                # Cut the partial line off, or the next append would be glued to it.
+                os.truncate(path, good)
+
+    def append(self, records: Sequence[Dict[str, Any]]) -> None:
+        """Write ``records``; caller holds the store lock. Fsync happens in :meth:`sync`."""
+
+        self._file.write("".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records))
+        self.entries_since_snapshot += len(records)
+        self._dirty = True
+        if self.fsync_interval <= 0:
+            self.sync()
+
+    def sync(self) -> None:
+        if not self._dirty:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def rotate(self) -> None:
+        """Start a fresh log; the previous one is kept until the snapshot lands."""
+
+        self.sync()
+        self._file.close()
+        if os.path.exists(self._rotated_path):
+            # A previous snapshot never landed: keep its operations too.
+            with open(self.path, encoding="utf-8") as src, open(self._rotated_path, "a", encoding="utf-8") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self._rotated_path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.entries_since_snapshot = 0
+
+    def write_snapshot(self, next_id: int, users: Sequence[User]) -> None:
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"next_id": next_id, "users": [_encode(u) for u in users]}, fh, separators=(",", ":"))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self._rotated_path):
+            os.remove(self._rotated_path)
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+
+class MemoryStore:
+    """Process-wide user table shared by every :class:`MemoryUnitOfWork`."""
+
+    def __init__(
+        self,
+        log_path: Optional[str] = None,
+        *,
+        fsync_interval: float = 0.05,
+        snapshot_every: int = 100_000,
+    ) -> None:
+        self._lock = threading.RLock()
+        self._users: Dict[int, User] = {}
+        self._by_email: Dict[str, int] = {}
+        # Live COUNT(*) GROUP BY plan, status, maintained by _publish.
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._next_id = 1
+        self._snapshot_every = snapshot_every
+        self._log: Optional[OperationLog] = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if log_path:
+            self._log = OperationLog(log_path, fsync_interval=fsync_interval)
+            self._replay(self._log.replay())
+            self._flusher = threading.Thread(target=self._flush_loop, name="memory-store-flusher", daemon=True)
+            self._flusher.start()
+
+    def _replay(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            if record["op"] == "put":
+                self._publish(_decode(record["user"]))
+            elif record["op"] == "next_id":
+                self._next_id = max(self._next_id, int(record["value"]))
+
+    def _publish(self, user: User) -> None:
+        previous = self._users.get(user.id)
+        if previous is not None:
+            if previous.email != user.email:
+                self._by_email.pop(previous.email, None)
+            key = (str(previous.plan), str(previous.status))
+            self._counts[key] -= 1
+        key = (str(user.plan), str(user.status))
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._users[user.id] = user
+        self._by_email[user.email] = user.id
+        self._next_id = max(self._next_id, user.id + 1)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Users per ``(plan, status)``, consistent with the last commit."""
+
+        with self._lock:
+            return {key: count for key, count in self._counts.items() if count}
+
+    def allocate_id(self) -> int:
+        with self._lock:
+            uid = self._next_id
+            self._next_id += 1
+            return uid
+
+    def get(self, user_id: int) -> Optional[User]:
+        return self._users.get(user_id)
+
+    def id_for_email(self, email: str) -> Optional[int]:
+        return self._by_email.get(email)
+
+    def commit(self, writes: Sequence[User]) -> None:
+        """Publish ``writes`` atomically, enforcing the unique email index."""
+
+        if not writes:
+            return
+        with self._lock:
+            seen: Dict[str, int] = {}
+            for user in writes:
+                owner = seen.get(user.email, self._by_email.get(user.email))
+                if owner is not None and owner != user.id:
+                    raise DuplicateEmailError(f"email already registered: {user.email}")
+                seen[user.email] = user.id
+            for user in writes:
+                self._publish(user)
+            if self._log is not None:
+                self._log.append([{"op": "put", "user": _encode(u)} for u in writes])
+
+    def snapshot(self) -> None:
+        if self._log is None:
+            return
+        with self._lock:
+            # Published users are never mutated, so a shallow copy is a consistent view.
+            users = list(self._users.values())
+            next_id = self._next_id
+            self._log.rotate()
+        self._log.write_snapshot(next_id, users)
+
+    def _flush_loop(self) -> None:
+        assert self._log is not None
+        interval = max(self._log.fsync_interval, 0.01)
+        while not self._stop.wait(interval):
+            with self._lock:
+                self._log.sync()
+                due = self._log.entries_since_snapshot >= self._snapshot_every
+            if due:
+                self.snapshot()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._log is not None:
+            with self._lock:
+                self._log.close()
+
+
+class MemoryUserRepository(UserRepository):
+    """Repository view over a :class:`MemoryStore` scoped to one unit of work."""
+
+    def __init__(self, store: MemoryStore, workspace: Dict[int, User], pending: Dict[int, User]) -> None:
+        self._store = store
+        self._workspace = workspace
+        self._pending = pending
+
+    def _checkout(self, user_id: int) -> Optional[User]:
+        user = self._workspace.get(user_id)
+        if user is None:
+            published = self._store.get(user_id)
+            if published is None:
+                return None
+            user = replace(published)
+            self._workspace[user_id] = user
+        return user
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        return self._checkout(user_id)
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        for user in self._pending.values():
+            if user.email == email:
+                return user
+        uid = self._store.id_for_email(email)
+        return self._checkout(uid) if uid is not None else None
+
+    def add(self, user: User) -> int:
+        if user.id is None:
+            user.id = self._store.allocate_id()
+        self._workspace[user.id] = user
+        self._pending[user.id] = user
+        return user.id
+
+    def save(self, user: User) -> None:
+        self._workspace[user.id] = user
+        self._pending[user.id] = user
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        found: Dict[int, User] = {}
+        for uid in user_ids:
+            user = self._checkout(uid)
+            if user is not None:
+                found[uid] = user
+        return found
+
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        return [self.add(user) for user in users]
+
+    def save_many(self, users: Sequence[User]) -> None:
+        for user in users:
+            self.save(user)
+
+
+class MemoryUnitOfWork(UnitOfWork):
+    def __init__(self, store: MemoryStore) -> None:
+        self._store = store
+        self._workspace: Dict[int, User] = {}
+        self._pending: Dict[int, User] = {}
+        self.users = None
+
+    def __enter__(self):
+        self.begin()
+        self.users = MemoryUserRepository(self._store, self._workspace, self._pending)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc:
+                self.rollback()
+            else:
+                self.commit()
+        finally:
+            self.users = None
+
+    def begin(self) -> None:
+        self._workspace.clear()
+        self._pending.clear()
+
+    def commit(self) -> None:
+        # Publish copies so later mutations by the caller cannot leak into the store.
+        self._store.commit([replace(u) for u in self._pending.values()])
+        self._pending.clear()
+
+    def rollback(self) -> None:
+        self._workspace.clear()
+        self._pending.clear()
+
+
+__all__ = [
+    "DuplicateEmailError",
+    "MemoryStore",
+    "MemoryUnitOfWork",
+    "MemoryUserRepository",
+    "OperationLog",
+]
@@ -0,0 +1,433 @@
+"""Versioned schema migrations for the SQLite and MySQL backends.
+
+Each migration carries the statements for both dialects. Applied versions are
+recorded in ``schema_migrations`` so the runner only executes what is missing.
+Never edit a migration that has shipped; append a new one instead.
+"""
+
+from __future__ import annotations
+
+import textwrap
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Set
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sqlite: Sequence[str]
+    mysql: Sequence[str]
+
+    def statements_for(self, kind: str) -> Sequence[str]:
+        if kind == "sqlite":
+            return self.sqlite
+        if kind == "mysql":
+            return self.mysql
+        raise ValueError(f"unsupported migration dialect {kind!r}")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create_users",
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                plan TEXT NOT NULL CHECK(plan IN ('basic','trial','premium')) DEFAULT 'trial',
+                start_date TEXT NOT NULL,
+                status TEXT NOT NULL CHECK(status IN ('active','suspended','expired')) DEFAULT 'active',
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS users_updated_at
+            AFTER UPDATE ON users
+            FOR EACH ROW
+            BEGIN
+              UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
+            END
+            """,
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS users (
+              id INT AUTO_INCREMENT PRIMARY KEY,
+              name VARCHAR(100) NOT NULL,
+              email VARCHAR(120) NOT NULL UNIQUE,
+              password_hash CHAR(64) NOT NULL,
+              salt CHAR(32) NOT NULL,
+              plan ENUM('basic','trial','premium') NOT NULL DEFAULT 'trial',
+              start_date DATE NOT NULL,
+              status ENUM('active','suspended','expired') NOT NULL DEFAULT 'active',
+              created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+              updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    ),
+    Migration(
+        2,
+        "users_plan_status_start_index",
+        sqlite=["CREATE INDEX IF NOT EXISTS idx_users_plan_status_start ON users (plan, status, start_date)"],
+        mysql=["CREATE INDEX idx_users_plan_status_start ON users (plan, status, start_date)"],
+    ),
+    Migration(
+        3,
+        "users_trial_expires_on",
+        # Mirrors the 30-day rule in ActiveState.evaluate. SQLite cannot ADD a
+        # STORED generated column, so it uses a VIRTUAL one whose values are
+        # persisted by the index; MySQL stores the column itself.
+        sqlite=[
+            """
+            ALTER TABLE users ADD COLUMN trial_expires_on TEXT
+            GENERATED ALWAYS AS (CASE WHEN plan = 'trial' THEN date(start_date, '+30 days') END) VIRTUAL
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_users_trial_expires_on ON users (trial_expires_on)",
+        ],
+        mysql=[
+            """
+            ALTER TABLE users
+              ADD COLUMN trial_expires_on DATE
+                GENERATED ALWAYS AS (IF(plan = 'trial', start_date + INTERVAL 30 DAY, NULL)) STORED,
+              ADD INDEX idx_users_trial_expires_on (trial_expires_on)
+            """,
+        ],
+    ),
+    Migration(
+        4,
+        "user_counters",
+        # Materialized COUNT(*) GROUP BY plan, status. Each pair is spread over
+        # a few slots so concurrent transitions do not all lock the same row;
+        # readers SUM over the slots.
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS user_counters (
+                plan TEXT NOT NULL,
+                status TEXT NOT NULL,
+                slot INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (plan, status, slot)
+            )
+            """,
+            """
+            INSERT INTO user_counters (plan, status, slot, count)
+            SELECT plan, status, 0, COUNT(*) FROM users GROUP BY plan, status
+            """,
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS user_counters (
+              plan ENUM('basic','trial','premium') NOT NULL,
+              status ENUM('active','suspended','expired') NOT NULL,
+              slot TINYINT UNSIGNED NOT NULL DEFAULT 0,
+              count BIGINT NOT NULL DEFAULT 0,
+              PRIMARY KEY (plan, status, slot)
+            )
+            """,
+            """
+            INSERT INTO user_counters (plan, status, slot, count)
+            SELECT plan, status, 0, COUNT(*) FROM users GROUP BY plan, status
+            """,
+        ],
+    ),
+    Migration(
+        5,
+        "subscription_outbox",
+        # One compact row per plan/status change (Plan/Status codes), drained by
+        # adapters.outbox.OutboxRelay.
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS subscription_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                old_plan INTEGER NOT NULL,
+                new_plan INTEGER NOT NULL,
+                old_status INTEGER NOT NULL,
+                new_status INTEGER NOT NULL,
+                occurred_at REAL NOT NULL
+            )
+            """,
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS subscription_outbox (
+              id BIGINT AUTO_INCREMENT PRIMARY KEY,
+              user_id INT NOT NULL,
+              old_plan TINYINT UNSIGNED NOT NULL,
+              new_plan TINYINT UNSIGNED NOT NULL,
+              old_status TINYINT UNSIGNED NOT NULL,
+              new_status TINYINT UNSIGNED NOT NULL,
+              occurred_at DOUBLE NOT NULL
+            )
+            """,
+        ],
+    ),
+    Migration(
+        6,
+        "idempotency_keys",
+        # First response per Idempotency-Key (sha256 of subject, route and key),
+        # replayed for retries; see adapters.idempotency.
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key_hash TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)",
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+              key_hash CHAR(64) PRIMARY KEY,
+              fingerprint CHAR(64) NOT NULL,
+              status SMALLINT UNSIGNED NOT NULL,
+              headers TEXT NOT NULL,
+              body MEDIUMBLOB NOT NULL,
+              created_at DOUBLE NOT NULL,
+              KEY idx_idempotency_keys_created_at (created_at)
+            )
+            """,
+        ],
+    ),
+    Migration(
+        7,
+        "versioned_password_hashes",
+        # password_hash now carries "<scheme>$<cost>$<digest>" (adapters.passwords);
+        # SQLite TEXT already fits it.
+        sqlite=[],
+        mysql=["ALTER TABLE users MODIFY password_hash VARCHAR(255) NOT NULL"],
+    ),
+    Migration(
+        8,
+        "token_revocations",
+        # Tokens revoked before exp, by jti or by subject issued-before; every
+        # instance tails this table by id (see adapters.revocation).
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS token_revocations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL CHECK (kind IN ('jti', 'sub')),
+                value TEXT NOT NULL,
+                since REAL,
+                expires_at REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_token_revocations_expires_at ON token_revocations (expires_at)",
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS token_revocations (
+              id BIGINT AUTO_INCREMENT PRIMARY KEY,
+              kind ENUM('jti','sub') NOT NULL,
+              value VARCHAR(255) NOT NULL,
+              since DOUBLE NULL,
+              expires_at DOUBLE NOT NULL,
+              KEY idx_token_revocations_expires_at (expires_at)
+            )
+            """,
+        ],
+    ),
+    Migration(
+        9,
+        "subscription_outbox_leases",
+        # A relay claims a batch (owner + lease deadline) in a short transaction
+        # and publishes outside it; an expired lease is claimed again.
+        sqlite=[
+            "ALTER TABLE subscription_outbox ADD COLUMN claimed_by TEXT",
+            "ALTER TABLE subscription_outbox ADD COLUMN claimed_until REAL",
+        ],
+        mysql=[
+            """
+            ALTER TABLE subscription_outbox
+              ADD COLUMN claimed_by VARCHAR(64) NULL,
+              ADD COLUMN claimed_until DOUBLE NULL
+            """,
+        ],
+    ),
+    Migration(
+        10,
+        "subscription_outbox_delivered_at",
+        # Delivered events stay for OUTBOX_RETENTION seconds so every node can
+        # tail the table (adapters.outbox.OutboxTail) before the relay purges them.
+        sqlite=[
+            "ALTER TABLE subscription_outbox ADD COLUMN delivered_at REAL",
+            "CREATE INDEX IF NOT EXISTS idx_subscription_outbox_delivered_at ON subscription_outbox (delivered_at)",
+        ],
+        mysql=[
+            """
+            ALTER TABLE subscription_outbox
+              ADD COLUMN delivered_at DOUBLE NULL,
+              ADD INDEX idx_subscription_outbox_delivered_at (delivered_at)
+            """,
+        ],
+    ),
+]
+
+
+_VERSION_TABLE = {
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "mysql": """
+        CREATE TABLE IF NOT EXISTS {table} (
+            version INT PRIMARY KEY,
+            name VARCHAR(120) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+}
+
+
+def _placeholder(kind: str) -> str:
+    return "?" if kind == "sqlite" else "%s"
+
+
+def applied_versions(conn: Any, kind: str, *, version_table: str = "schema_migrations") -> Set[int]:
+    cur = conn.cursor()
+    try:
+        cur.execute(_VERSION_TABLE[kind].replace("{table}", version_table))
+        cur.execute(f"SELECT version FROM {version_table}")
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    conn.commit()
+    return {int(row["version"] if isinstance(row, dict) else row[0]) for row in rows}
+
+
+def pending_migrations(
+    conn: Any,
+    kind: str,
+    target: Optional[int] = None,
+    *,
+    migrations: Sequence[Migration] = MIGRATIONS,
+    version_table: str = "schema_migrations",
+) -> List[Migration]:
+    done = applied_versions(conn, kind, version_table=version_table)
+    return [
+        m
+        for m in sorted(migrations, key=lambda m: m.version)
+        if m.version not in done and (target is None or m.version <= target)
+    ]
+
+
+def apply_migrations(
+    conn: Any,
+    kind: str,
+    target: Optional[int] = None,
+    *,
+    migrations: Sequence[Migration] = MIGRATIONS,
+    version_table: str = "schema_migrations",
+) -> List[Migration]:
+    """Apply every pending migration up to ``target`` and return the ones applied.
+
+    On SQLite each migration runs in its own transaction. MySQL commits DDL
+    implicitly, so there the version row is written right after the
+    statements succeed. ``migrations``/``version_table`` let other schemas
+    (e.g. the shard directory) reuse the runner with their own history.
+    """
+
+    applied: List[Migration] = []
+    ph = _placeholder(kind)
+    pending = pending_migrations(conn, kind, target, migrations=migrations, version_table=version_table)
+    for migration in pending:
+        cur = conn.cursor()
+        try:
+            if kind == "sqlite":
+                cur.execute("BEGIN")
+            for statement in migration.statements_for(kind):
+                cur.execute(statement)
+            cur.execute(
+                f"INSERT INTO {version_table} (version, name) VALUES ({ph}, {ph})",
+                (migration.version, migration.name),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        applied.append(migration)
+    return applied
+
+
+class SchemaOutdatedError(RuntimeError):
+    """The database is missing migrations this build depends on."""
+
+
+def latest_version(migrations: Sequence[Migration] = MIGRATIONS) -> int:
+    return max(m.version for m in migrations)
+
+
+def check_schema(
+    conn: Any,
+    kind: str,
+    *,
+    migrations: Sequence[Migration] = MIGRATIONS,
+    version_table: str = "schema_migrations",
+) -> None:
+    """Raise :class:`SchemaOutdatedError` unless every migration is recorded; changes nothing."""
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT version FROM {version_table}")
+        done = {int(row["version"] if isinstance(row, dict) else row[0]) for row in cur.fetchall()}
+    except Exception:  # noqa: BLE001 - no version table: nothing was ever migrated
+        done = set()
+    finally:
+        cur.close()
+    conn.rollback()
+    missing = sorted(m.version for m in migrations if m.version not in done)
+    if missing:
+        raise SchemaOutdatedError(
+            f"{kind} schema is missing migrations {', '.join(f'{v:04d}' for v in missing)}; "
+            "run python -m capitalia.scripts.migrate"
+        )
+
+
+def render_script(
+    kind: str,
+    *,
+    migrations: Sequence[Migration] = MIGRATIONS,
+    version_table: str = "schema_migrations",
+) -> str:
+    """Every migration as one SQL script, recording the versions like :func:`apply_migrations`.
+
+    ``scripts/init_mysql.sql`` is generated with it, so the plain-SQL setup
+    matches a migrated database.
+    """
+
+    statements = [_VERSION_TABLE[kind].replace("{table}", version_table)]
+    for migration in sorted(migrations, key=lambda m: m.version):
+        statements.extend(migration.statements_for(kind))
+        name = migration.name.replace("'", "''")
+        statements.append(f"INSERT INTO {version_table} (version, name) VALUES ({migration.version}, '{name}')")
+    return "\n".join(textwrap.dedent(sql).strip() + ";\n" for sql in statements)
+
+
+__all__ = [
+    "Migration",
+    "MIGRATIONS",
+    "SchemaOutdatedError",
+    "applied_versions",
+    "apply_migrations",
+    "check_schema",
+    "latest_version",
+    "pending_migrations",
+    "render_script",
+]
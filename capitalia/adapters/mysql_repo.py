@@ -1,31 +1,35 @@
 from __future__ import annotations
 
-from datetime import date
-from typing import Optional, Any
+from typing import Any, Dict, Iterable, List, Optional, Sequence
 
 from ..domain.models import User
 from ..ports.repositories import UserRepository
+from .chunking import chunked
 
 
-def _to_entity(row: Optional[dict]) -> Optional[User]:
-    if not row:
-        return None
-    sd = row["start_date"]
-    if isinstance(sd, (bytes, bytearray)):
-        sd = sd.decode()
-    if isinstance(sd, str):
-        sd = date.fromisoformat(sd)
-    # PyMySQL DictCursor returns dict with correct types (DATE -> date)
-    return User(
-        id=int(row["id"]) if row.get("id") is not None else None,
-        name=row["name"],
-        email=row["email"],
-        password_hash=row["password_hash"],
-        salt=row["salt"],
-        plan=row["plan"],
-        start_date=sd,
-        status=row["status"],
-    )
+IN_CHUNK_SIZE = 1000
+UPDATE_CHUNK_SIZE = 500  # rows per multi-row UPDATE (8 parameters each)
+
+# The derived table of new values for save_many; the first row names the columns.
+_FIRST_ROW = (
+    "SELECT %s AS id, %s AS name, %s AS email, %s AS password_hash, %s AS salt,"
+    " %s AS plan, %s AS start_date, %s AS status"
+)
+_NEXT_ROW = "SELECT %s, %s, %s, %s, %s, %s, %s, %s"
+
+
+def _to_entity(row: Optional[Sequence[Any]]) -> Optional[User]:
+    # Rows come from a tuple cursor (see _tuple_cursor); PyMySQL already
+    # converts DATE columns to datetime.date.
+    return None if row is None else User.from_row(row)
+
+
+def _tuple_cursor(conn: Any) -> Any:
+    """Plain tuple cursor, bypassing the connection's DictCursor for entity reads."""
+
+    import pymysql.cursors
+
+    return conn.cursor(pymysql.cursors.Cursor)
 
 
 class MySQLUserRepository(UserRepository):
@@ -33,7 +37,7 @@ class MySQLUserRepository(UserRepository):
         self.conn = conn
 
     def get_by_id(self, user_id: int) -> Optional[User]:
-        with self.conn.cursor() as cur:
+        with _tuple_cursor(self.conn) as cur:
             cur.execute(
                 """
                 SELECT id, name, email, password_hash, salt, plan, start_date, status
@@ -45,7 +49,7 @@ class MySQLUserRepository(UserRepository):
             return _to_entity(row)
 
     def get_by_email(self, email: str) -> Optional[User]:
-        with self.conn.cursor() as cur:
+        with _tuple_cursor(self.conn) as cur:
             cur.execute(
                 """
                 SELECT id, name, email, password_hash, salt, plan, start_date, status
@@ -59,10 +63,11 @@ class MySQLUserRepository(UserRepository):
         with self.conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO users (name, email, password_hash, salt, plan, start_date, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                INSERT INTO users (id, name, email, password_hash, salt, plan, start_date, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 """,
                 (
+                    user.id,
                     user.name,
                     user.email,
                     user.password_hash,
@@ -72,6 +77,8 @@ class MySQLUserRepository(UserRepository):
                     user.status,
                 ),
             )
+            if user.id is not None:
+                return int(user.id)
             return int(cur.lastrowid or cur.connection.insert_id())
 
     def save(self, user: User) -> None:
@@ -93,3 +100,91 @@ class MySQLUserRepository(UserRepository):
                     user.id,
                 ),
             )
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        found: Dict[int, User] = {}
+        with _tuple_cursor(self.conn) as cur:
+            for chunk in chunked(dict.fromkeys(user_ids), IN_CHUNK_SIZE):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cur.execute(
+                    f"""
+                    SELECT id, name, email, password_hash, salt, plan, start_date, status
+                    FROM users WHERE id IN ({placeholders})
+                    """,
+                    chunk,
+                )
+                for row in cur.fetchall():
+                    user = User.from_row(row)
+                    found[user.id] = user
+        return found
+
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        if not users:
+            return []
+        with self.conn.cursor() as cur:
+            # PyMySQL rewrites executemany over INSERT ... VALUES into multi-row
+            # VALUES statements (split by max_stmt_length).
+            cur.executemany(
+                """
+                INSERT INTO users (id, name, email, password_hash, salt, plan, start_date, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                [
+                    (
+                        user.id,
+                        user.name,
+                        user.email,
+                        user.password_hash,
+                        user.salt,
+                        user.plan,
+                        user.start_date,
+                        user.status,
+                    )
+                    for user in users
+                ],
+            )
+        if all(user.id is not None for user in users):
+            return [int(user.id) for user in users]
+        # AUTO_INCREMENT values are only guaranteed consecutive per statement
+        # under some innodb_autoinc_lock_mode settings; resolve by email.
+        ids_by_email: Dict[str, int] = {}
+        with _tuple_cursor(self.conn) as cur:
+            for chunk in chunked([user.email for user in users], IN_CHUNK_SIZE):
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cur.execute(f"SELECT id, email FROM users WHERE email IN ({placeholders})", chunk)
+                ids_by_email.update((email, int(uid)) for uid, email in cur.fetchall())
+        for user in users:
+            user.id = ids_by_email[user.email]
+        return [user.id for user in users]
+
+    def save_many(self, users: Sequence[User]) -> None:
+        if not users:
+            return
+        # Same semantics as save(): unknown ids are not inserted, and the last
+        # write of an id wins. One multi-row UPDATE per chunk, joining users
+        # to the new values as a derived table.
+        latest = {user.id: user for user in users}
+        with self.conn.cursor() as cur:
+            for chunk in chunked(list(latest.values()), UPDATE_CHUNK_SIZE):
+                rows = " UNION ALL ".join([_FIRST_ROW] + [_NEXT_ROW] * (len(chunk) - 1))
+                cur.execute(
+                    f"""
+                    UPDATE users AS u JOIN ({rows}) AS v ON u.id = v.id
+                    SET u.name = v.name, u.email = v.email, u.password_hash = v.password_hash,
+                        u.salt = v.salt, u.plan = v.plan, u.start_date = v.start_date, u.status = v.status
+                    """,
+                    [
+                        value
+                        for user in chunk
+                        for value in (
+                            user.id,
+                            user.name,
+                            user.email,
+                            user.password_hash,
+                            user.salt,
+                            user.plan,
+                            user.start_date,
+                            user.status,
+                        )
+                    ],
+                )
@@ -0,0 +1,481 @@
+"""Transactional outbox for subscription events.
+
+``SqlOutbox`` appends one ``subscription_outbox`` row per plan/status change
+on the connection of the unit of work, so an event exists if and only if
+the user change committed. :class:`OutboxRelay` drains the table in batches
+from a background thread and hands each batch to its sinks (file, webhook,
+in-process bus) before deleting the rows; no transaction is open while the
+sinks run.
+
+Delivery is at-least-once: a crash or a failing sink after a successful
+publish redelivers the batch, so consumers dedupe on ``event_id`` (unique
+per database; per shard when sharded).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..domain.events import SubscriptionChanged
+from ..domain.models import Plan, Status
+from .tailing import IdCursor
+
+
+Sink = Callable[[Sequence[SubscriptionChanged]], None]
+
+_INSERT = (
+    "INSERT INTO subscription_outbox (user_id, old_plan, new_plan, old_status, new_status, occurred_at) "
+    "VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph})"
+)
+_COLUMNS = "id, user_id, old_plan, new_plan, old_status, new_status, occurred_at"
+
+
+def _placeholder(kind: str) -> str:
+    return "%s" if kind == "mysql" else "?"
+
+
+def _event(row: Sequence[Any]) -> SubscriptionChanged:
+    event_id, uid, old_plan, new_plan, old_status, new_status, occurred_at = row
+    return SubscriptionChanged(
+        int(uid),
+        Plan.from_code(int(old_plan)),
+        Plan.from_code(int(new_plan)),
+        Status.from_code(int(old_status)),
+        Status.from_code(int(new_status)),
+        float(occurred_at),
+        int(event_id),
+    )
+
+
+class SqlOutbox:
+    """Appends events on the connection of the surrounding unit of work."""
+
+    def __init__(self, conn: Any, kind: str) -> None:
+        self._conn = conn
+        self._sql = _INSERT.format(ph=_placeholder(kind))
+
+    def append(self, events: Sequence[SubscriptionChanged]) -> None:
+        if not events:
+            return
+        cur = self._conn.cursor()
+        try:
+            cur.executemany(
+                self._sql,
+                [
+                    (e.user_id, e.old_plan.code, e.new_plan.code, e.old_status.code, e.new_status.code, e.occurred_at)
+                    for e in events
+                ],
+            )
+        finally:
+            cur.close()
+
+
+class FileSink:
+    """Appends events as JSON lines to ``path``."""
+
+    def __init__(self, path: str, *, fsync: bool = False) -> None:
+        self.path = path
+        self._fsync = fsync
+
+    def __call__(self, events: Sequence[SubscriptionChanged]) -> None:
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(e.to_dict(), separators=(",", ":")) + "\n" for e in events))
+            fh.flush()
+            if self._fsync:
+                os.fsync(fh.fileno())
+
+
+class WebhookSink:
+    """POSTs ``{"events": [...]}`` to ``url``; any non-2xx answer fails the batch."""
+
+    def __init__(self, url: str, *, timeout: float = 5.0) -> None:
+        self.url = url
+        self._timeout = timeout
+
+    def __call__(self, events: Sequence[SubscriptionChanged]) -> None:
+        body = json.dumps({"events": [e.to_dict() for e in events]}, separators=(",", ":")).encode()
+        request = urllib.request.Request(
+            self.url, data=body, method="POST", headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            if not 200 <= response.status < 300:
+                raise RuntimeError(f"webhook answered {response.status}")
+
+
+class EventBus:
+    """In-process fan-out; a failing subscriber does not affect the others."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: List[Sink] = []
+
+    def subscribe(self, callback: Sink) -> Callable[[], None]:
+        with self._lock:
+            self._subscribers = [*self._subscribers, callback]
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers = [s for s in self._subscribers if s is not callback]
+
+        return unsubscribe
+
+    def __call__(self, events: Sequence[SubscriptionChanged]) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(events)
+            except Exception as exc:  # noqa: BLE001
+                print(f"[outbox] bus subscriber failed: {exc!r}", file=sys.stderr)
+
+
+class OutboxRelay:
+    """Drains ``subscription_outbox`` on every database in ``conn_factories``.
+
+    A batch is claimed (``claimed_by``/``claimed_until``) in one short
+    transaction, published to every sink in order with no transaction open,
+    and deleted by id in a second short one. Slow sinks therefore hold no
+    locks. With ``retention`` the rows are marked delivered instead and
+    purged ``retention`` seconds later, so :class:`OutboxTail` readers on
+    every node get to see them. If a sink fails, the claim is released and the batch is retried
+    after ``retry_backoff``. If the relay dies, the claim expires after
+    ``lease`` seconds. With MySQL the claim reads with ``FOR UPDATE SKIP
+    LOCKED`` and SQLite takes the write lock up front, so several relays can
+    share a table. :meth:`notify` (usable as a ``SubscriptionService``
+    listener) wakes the relay right after a local commit; ``poll_interval``
+    bounds the delay for writes from other nodes.
+    """
+
+    def __init__(
+        self,
+        conn_factories: Sequence[Callable[[], Any]],
+        kind: str,
+        sinks: Sequence[Sink],
+        *,
+        batch_size: int = 500,
+        poll_interval: float = 0.5,
+        retry_backoff: float = 2.0,
+        lease: float = 60.0,
+        retention: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._factories = list(conn_factories)
+        self._kind = kind
+        self._sinks = list(sinks)
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._retry_backoff = retry_backoff
+        self._lease = lease
+        self._retention = retention
+        self._purged_at = float("-inf")
+        self._clock = clock
+        self.owner = f"{socket.gethostname()[:40]}:{os.getpid()}:{secrets.token_hex(4)}"
+        ph = _placeholder(kind)
+        lock = " FOR UPDATE SKIP LOCKED" if kind == "mysql" else ""
+        self._begin = "BEGIN" if kind == "mysql" else "BEGIN IMMEDIATE"
+        self._select = (
+            f"SELECT {_COLUMNS} FROM subscription_outbox "
+            f"WHERE delivered_at IS NULL AND (claimed_until IS NULL OR claimed_until < {ph}) "
+            f"ORDER BY id LIMIT {ph}{lock}"
+        )
+        self._claim = (
+            f"UPDATE subscription_outbox SET claimed_by = {ph}, claimed_until = {ph} WHERE id IN ({{ids}})"
+        )
+        self._release = (
+            "UPDATE subscription_outbox SET claimed_by = NULL, claimed_until = NULL "
+            f"WHERE claimed_by = {ph} AND id IN ({{ids}})"
+        )
+        self._delete = f"DELETE FROM subscription_outbox WHERE claimed_by = {ph} AND id IN ({{ids}})"
+        self._mark_delivered = (
+            f"UPDATE subscription_outbox SET delivered_at = {ph} WHERE claimed_by = {ph} AND id IN ({{ids}})"
+        )
+        self._purge = f"DELETE FROM subscription_outbox WHERE delivered_at < {ph}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._published = 0
+        self._batches = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    def _execute(self, conn: Any, sql: str, ids: Sequence[int], params: Sequence[Any] = ()) -> None:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql.format(ids=", ".join([_placeholder(self._kind)] * len(ids))), [*params, *ids])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def _claim_batch(self, conn: Any) -> List[SubscriptionChanged]:
+        now = self._clock()
+        cur = conn.cursor()
+        try:
+            cur.execute(self._begin)
+            cur.execute(self._select, (now, self._batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                conn.rollback()
+                return []
+            events = [_event(tuple(r.values()) if isinstance(r, dict) else r) for r in rows]
+            ids = [e.event_id for e in events]
+            cur.execute(
+                self._claim.format(ids=", ".join([_placeholder(self._kind)] * len(ids))),
+                [self.owner, now + self._lease, *ids],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        return events
+
+    def _drain_batch(self, conn: Any) -> int:
+        events = self._claim_batch(conn)
+        if not events:
+            return 0
+        ids = [e.event_id for e in events]
+        try:
+            for sink in self._sinks:
+                sink(events)
+        except Exception:
+            try:
+                self._execute(conn, self._release, ids, (self.owner,))
+            except Exception as exc:  # noqa: BLE001
+                print(f"[outbox] could not release claimed batch, it expires with the lease: {exc!r}", file=sys.stderr)
+            raise
+        if self._retention > 0:
+            # Kept for OutboxTail readers on other nodes; purged after the retention.
+            self._execute(conn, self._mark_delivered, ids, (self._clock(), self.owner))
+        else:
+            self._execute(conn, self._delete, ids, (self.owner,))
+        self._published += len(events)
+        self._batches += 1
+        return len(events)
+
+    def drain_once(self) -> int:
+        """Publish everything currently in the outbox(es); returns the event count."""
+
+        total = 0
+        now = self._clock()
+        purge = self._retention > 0 and now - self._purged_at >= self._retention / 2
+        for factory in self._factories:
+            conn = factory()
+            try:
+                while True:
+                    published = self._drain_batch(conn)
+                    total += published
+                    if published < self._batch_size:
+                        break
+                if purge:
+                    self._execute(conn, self._purge, (), (now - self._retention,))
+            finally:
+                conn.close()
+        if purge:
+            self._purged_at = now
+        return total
+
+    def notify(self, _users: Any = None) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.drain_once()
+            except Exception as exc:  # noqa: BLE001
+                self._failures += 1
+                self._last_error = repr(exc)
+                print(f"[outbox] relay failed, retrying in {self._retry_backoff}s: {exc!r}", file=sys.stderr)
+                self._stop.wait(self._retry_backoff)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published": self._published,
+            "batches": self._batches,
+            "failures": self._failures,
+            "last_error": self._last_error,
+        }
+
+
+class OutboxTail:
+    """Every node's own reader of ``subscription_outbox``.
+
+    The relay hands each event to exactly one node, so node-local consumers
+    (the stream hub) tail the table instead: each tail keeps its own
+    :class:`~.tailing.IdCursor` per database, starts at the current end and
+    passes new events to ``sink`` in id order. It relies on the relay's
+    ``retention`` to read rows before they are purged. :meth:`notify` reads
+    right away (e.g. after a local commit); ``poll_interval`` bounds the
+    delay for other nodes' writes.
+    """
+
+    def __init__(
+        self,
+        conn_factories: Sequence[Callable[[], Any]],
+        kind: str,
+        sink: Sink,
+        *,
+        batch_size: int = 500,
+        poll_interval: float = 0.5,
+        gap_timeout: float = 10.0,
+    ) -> None:
+        self._factories = list(conn_factories)
+        self._sink = sink
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._cursors = [IdCursor(gap_timeout=gap_timeout) for _ in self._factories]
+        ph = _placeholder(kind)
+        self._select = f"SELECT {_COLUMNS} FROM subscription_outbox WHERE id > {ph} ORDER BY id LIMIT {ph}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._delivered = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    def seek_to_end(self) -> None:
+        """Skip the events already in the table; only later changes are delivered."""
+
+        for factory, cursor in zip(self._factories, self._cursors):
+            conn = factory()
+            try:
+                cur = conn.cursor()
+                try:
+                    cur.execute("SELECT MAX(id) FROM subscription_outbox")
+                    row = cur.fetchone()
+                finally:
+                    cur.close()
+                conn.rollback()
+            finally:
+                conn.close()
+            value = next(iter(row.values())) if isinstance(row, dict) else row[0]
+            cursor.last_id = int(value or 0)
+
+    def _read(self, conn: Any, cursor: IdCursor) -> List[SubscriptionChanged]:
+        cur = conn.cursor()
+        try:
+            cur.execute(self._select, (cursor.floor(), self._batch_size))
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        conn.rollback()  # end the read snapshot so the next poll sees new commits
+        events = {e.event_id: e for e in (_event(tuple(r.values()) if isinstance(r, dict) else r) for r in rows)}
+        return [events[i] for i in cursor.accept(events)]
+
+    def poll_once(self) -> int:
+        """Deliver every event committed since the last poll; returns the event count."""
+
+        # One poll at a time, whether from the thread or a caller.
+        with self._lock:
+            total = 0
+            for factory, cursor in zip(self._factories, self._cursors):
+                conn = factory()
+                try:
+                    while True:
+                        events = self._read(conn, cursor)
+                        if events:
+                            self._sink(events)
+                            total += len(events)
+                        if len(events) < self._batch_size:
+                            break
+                finally:
+                    conn.close()
+            self._delivered += total
+            return total
+
+    def notify(self, _users: Any = None) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.poll_once()
+            except Exception as exc:  # noqa: BLE001
+                self._failures += 1
+                self._last_error = repr(exc)
+                print(f"[outbox] tail failed: {exc!r}", file=sys.stderr)
+                self._stop.wait(self._poll_interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            try:
+                self.seek_to_end()
+            except Exception as exc:  # noqa: BLE001 - the first poll starts from the beginning
+                print(f"[outbox] tail could not find the end of the outbox: {exc!r}", file=sys.stderr)
+            self._thread = threading.Thread(target=self._run, name="outbox-tail", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "delivered": self._delivered,
+            "open_gaps": sum(c.open_gaps for c in self._cursors),
+            "failures": self._failures,
+            "last_error": self._last_error,
+        }
+
+
+def build_sinks(specs: Sequence[str], bus: Optional[EventBus] = None, *, timeout: float = 5.0) -> List[Sink]:
+    """``file:<path>``, ``http(s)://...`` or ``bus`` (the given :class:`EventBus`)."""
+
+    sinks: List[Sink] = []
+    for spec in specs:
+        if spec == "bus":
+            if bus is None:
+                raise ValueError("outbox sink 'bus' needs an EventBus")
+            sinks.append(bus)
+        elif spec.startswith("file:"):
+            sinks.append(FileSink(spec[len("file:"):]))
+        elif spec.startswith(("http://", "https://")):
+            sinks.append(WebhookSink(spec, timeout=timeout))
+        else:
+            raise ValueError(f"unknown outbox sink {spec!r}")
+    return sinks
+
+
+__all__ = [
+    "EventBus",
+    "FileSink",
+    "OutboxRelay",
+    "OutboxTail",
+    "Sink",
+    "SqlOutbox",
+    "WebhookSink",
+    "build_sinks",
+]
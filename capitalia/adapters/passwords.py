@@ -0,0 +1,177 @@
+"""Versioned password hashes, verified off the request threads.
+
+``users.password_hash`` holds either a legacy bare sha256 hex digest of
+``salt + password`` or a ``$``-separated record naming its scheme and cost::
+
+    pbkdf2_sha256$600000$<hex digest>
+    scrypt$16384$8$1$<hex digest>
+
+The salt stays in ``users.salt``. :meth:`PasswordHasher.needs_rehash` flags
+hashes made with another scheme or a lower cost, so login can upgrade them
+while it still has the plain password.
+
+PBKDF2 and scrypt cost tens to hundreds of milliseconds of CPU each. Run
+inline, every concurrent login burns a core from a request thread, and a
+burst starves the threads serving status reads. With ``workers`` > 0 the
+derivations run in a ``ProcessPoolExecutor`` that uses at most ``workers``
+cores. At most ``workers + max_queue`` derivations wait for the pool. Past
+that, :class:`PasswordHasherBusy` is raised instead of queueing without
+bound. Legacy sha256 checks are cheap and stay inline.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import multiprocessing
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+LEGACY = "sha256"
+PBKDF2 = "pbkdf2_sha256"
+SCRYPT = "scrypt"
+SCHEMES = (LEGACY, PBKDF2, SCRYPT)
+
+Params = Tuple[int, ...]
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Too many derivations are already waiting for the pool."""
+
+
+def _derive(scheme: str, params: Params, password: str, salt: str) -> str:
+    """Hex digest for ``scheme``; module-level so the process pool can run it."""
+
+    if scheme == LEGACY:
+        return hashlib.sha256((salt + password).encode()).hexdigest()
+    if scheme == PBKDF2:
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+    if scheme == SCRYPT:
+        n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=256 * n * r).hex()
+    raise ValueError(f"unknown password hash scheme {scheme!r}")
+
+
+def parse(password_hash: str) -> Tuple[str, Params, str]:
+    """``(scheme, params, hex digest)``; a value without ``$`` is a legacy sha256 digest."""
+
+    if "$" not in password_hash:
+        return LEGACY, (), password_hash
+    scheme, *fields = password_hash.split("$")
+    try:
+        params = tuple(int(field) for field in fields[:-1])
+    except ValueError:
+        raise ValueError("malformed password hash") from None
+    if scheme not in SCHEMES or len(params) != {LEGACY: 0, PBKDF2: 1, SCRYPT: 3}[scheme]:
+        raise ValueError(f"unknown password hash scheme {scheme!r}")
+    return scheme, params, fields[-1]
+
+
+def encode(scheme: str, params: Params, digest: str) -> str:
+    return digest if scheme == LEGACY else "$".join([scheme, *map(str, params), digest])
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        scheme: str = PBKDF2,
+        *,
+        iterations: int = 600_000,
+        scrypt_n: int = 2**14,
+        scrypt_r: int = 8,
+        scrypt_p: int = 1,
+        workers: int = 0,
+        max_queue: int = 64,
+    ) -> None:
+        if scheme not in SCHEMES:
+            raise ValueError(f"unknown password hash scheme {scheme!r}")
+        self.scheme = scheme
+        self.params: Params = {LEGACY: (), PBKDF2: (iterations,), SCRYPT: (scrypt_n, scrypt_r, scrypt_p)}[scheme]
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers > 0 else None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._derived = 0
+        self._offloaded = 0
+        self._rejected = 0
+        self._in_flight = 0
+
+    def hash(self, password: str) -> Tuple[str, str]:
+        """``(password_hash, salt)`` for a new password with the current scheme."""
+
+        salt = secrets.token_hex(16)
+        return encode(self.scheme, self.params, self._run(self.scheme, self.params, password, salt)), salt
+
+    def verify(self, password: str, password_hash: str, salt: str) -> bool:
+        try:
+            scheme, params, digest = parse(password_hash)
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._run(scheme, params, password, salt), digest)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        try:
+            scheme, params, _ = parse(password_hash)
+        except ValueError:
+            return True
+        return scheme != self.scheme or params != self.params
+
+    def _run(self, scheme: str, params: Params, password: str, salt: str) -> str:
+        with self._lock:
+            self._derived += 1
+        if scheme == LEGACY or self._slots is None:
+            return _derive(scheme, params, password, salt)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy("password hashing queue is full")
+        with self._lock:
+            self._in_flight += 1
+            self._offloaded += 1
+        try:
+            return self._pool().submit(_derive, scheme, params, password, salt).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pickled for another process (the bulk importer's pool): an inline
+        # hasher with the same scheme and cost.
+        state = self.__dict__.copy()
+        state.update(workers=0, _slots=None, _executor=None, _lock=None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process full of server threads is unsafe.
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "scheme": self.scheme,
+                "workers": self.workers,
+                "derived": self._derived,
+                "offloaded": self._offloaded,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected,
+            }
+
+
+__all__ = ["LEGACY", "PBKDF2", "SCRYPT", "PasswordHasher", "PasswordHasherBusy", "encode", "parse"]
@@ -0,0 +1,190 @@
+"""Read/write splitting: route read-only units of work to replicas.
+
+:class:`ReplicaPool` hands out replica connections round-robin, re-checking
+each replica's health (reachability and replication lag) at most every
+``health_interval`` seconds. :class:`ReplicaRouter` is the read-side UoW
+factory: it falls back to the primary when no replica qualifies, and keeps a
+user on the primary for ``sticky_window`` seconds after that user's own write
+so clients always read what they just wrote.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from ..domain.models import User
+from .uow import SqlUnitOfWork
+
+
+LagProbe = Callable[[Any], Optional[float]]
+
+
+def mysql_replica_lag(conn: Any) -> Optional[float]:
+    """Seconds behind the source as reported by MySQL; ``None`` if replication is broken."""
+
+    cur = conn.cursor()
+    try:
+        try:
+            cur.execute("SHOW REPLICA STATUS")
+        except Exception:  # noqa: BLE001 - MySQL < 8.0.22
+            cur.execute("SHOW SLAVE STATUS")
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    if not row:
+        return 0.0  # not configured as a replica (e.g. a read-only copy)
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+def ping(conn: Any) -> Optional[float]:
+    """Health probe for backends without a replication lag notion."""
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1")
+        cur.fetchone()
+    finally:
+        cur.close()
+    return 0.0
+
+
+@dataclass
+class _Replica:
+    factory: Callable[[], Any]
+    healthy: bool = True
+    lag: Optional[float] = 0.0
+    checked_at: float = float("-inf")
+
+
+class ReplicaPool:
+    def __init__(
+        self,
+        factories: Sequence[Callable[[], Any]],
+        *,
+        lag_probe: LagProbe = ping,
+        max_lag: Optional[float] = None,
+        health_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._replicas = [_Replica(f) for f in factories]
+        self._lag_probe = lag_probe
+        self.max_lag = max_lag
+        self.health_interval = health_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._replicas)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [{"replica": i, "healthy": r.healthy, "lag": r.lag} for i, r in enumerate(self._replicas)]
+
+    def _start(self) -> int:
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self._replicas)
+            return start
+
+    def _connect(self, replica: _Replica) -> Optional[Any]:
+        now = self._clock()
+        due = now - replica.checked_at >= self.health_interval
+        if not replica.healthy and not due:
+            return None
+        try:
+            conn = replica.factory()
+        except Exception:  # noqa: BLE001
+            replica.healthy, replica.checked_at = False, now
+            return None
+        if due:
+            try:
+                lag = self._lag_probe(conn)
+            except Exception:  # noqa: BLE001
+                lag = None
+            replica.lag, replica.checked_at = lag, now
+            replica.healthy = lag is not None and (self.max_lag is None or lag <= self.max_lag)
+            if not replica.healthy:
+                conn.close()
+                return None
+        return conn
+
+    def checkout(self) -> Optional[Any]:
+        """Return a connection to the next usable replica, or ``None`` if none qualifies."""
+
+        if not self._replicas:
+            return None
+        start = self._start()
+        for offset in range(len(self._replicas)):
+            conn = self._connect(self._replicas[(start + offset) % len(self._replicas)])
+            if conn is not None:
+                return conn
+        return None
+
+
+class RecentWrites:
+    """Remembers which users wrote in the last ``window`` seconds."""
+
+    def __init__(self, window: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._expires: Dict[int, float] = {}
+
+    def mark(self, user_ids: Iterable[int]) -> None:
+        now = self._clock()
+        with self._lock:
+            if len(self._expires) > 10_000:
+                self._expires = {uid: t for uid, t in self._expires.items() if t > now}
+            for uid in user_ids:
+                self._expires[uid] = now + self.window
+
+    def __contains__(self, user_id: int) -> bool:
+        expires = self._expires.get(user_id)
+        return expires is not None and expires > self._clock()
+
+
+class ReplicaRouter:
+    """Read-only UoW factory; pass :meth:`record_writes` as a service listener."""
+
+    def __init__(
+        self,
+        primary_factory: Callable[[], Any],
+        replicas: ReplicaPool,
+        repo_factory: Callable[[Any], Any],
+        *,
+        sticky_window: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._primary_factory = primary_factory
+        self._replicas = replicas
+        self._repo_factory = repo_factory
+        self.recent_writes = RecentWrites(sticky_window, clock=clock)
+
+    def __call__(self, user_id: Optional[int] = None) -> SqlUnitOfWork:
+        return self.open(self.route(user_id))
+
+    def route(self, user_id: Optional[int] = None) -> str:
+        """``"primary"`` for a user inside their read-your-writes window, else ``"replica"``."""
+
+        if user_id is not None and user_id in self.recent_writes:
+            return "primary"
+        return "replica"
+
+    def open(self, target: str) -> SqlUnitOfWork:
+        """UoW on ``target``; ``"replica"`` falls back to the primary when none qualifies."""
+
+        if target == "replica":
+            conn = self._replicas.checkout()
+            if conn is not None:
+                return SqlUnitOfWork(lambda: conn, self._repo_factory)
+        return SqlUnitOfWork(self._primary_factory, self._repo_factory)
+
+    def record_writes(self, users: Iterable[User]) -> None:
+        self.recent_writes.mark(user.id for user in users)
+
+
+__all__ = ["RecentWrites", "ReplicaPool", "ReplicaRouter", "mysql_replica_lag", "ping"]
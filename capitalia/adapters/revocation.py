@@ -0,0 +1,269 @@
+"""Token revocation before ``exp``.
+
+Revocations are durable rows in ``token_revocations``. A row revokes either
+one token (``kind='jti'``) or every token of a subject issued before a
+timestamp (``kind='sub'``). Each instance mirrors the rows that have not
+expired yet in a :class:`RevocationList` and polls for new ones
+incrementally through an :class:`~capitalia.adapters.tailing.IdCursor`, so
+a row whose id commits after a higher one is still picked up. The auth
+path never touches the database.
+
+Almost every token presented was never revoked. A :class:`BloomFilter`
+answers that case from a few bits per revoked ``jti``. The exact
+``jti -> expires_at`` map is only consulted when the filter says "maybe",
+which weeds out its false positives. Entries are dropped once the token
+would have expired anyway, so both stay small. The filter is rebuilt when
+enough expired entries have been pruned or when it outgrows its capacity.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .tailing import IdCursor
+
+JTI = "jti"
+SUBJECT = "sub"
+
+_PAGE = 10_000
+
+Revocation = Tuple[int, str, str, Optional[float], float]  # id, kind, value, since, expires_at
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float = 0.01) -> None:
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.bits = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+
+class SqlRevocationStore:
+    """``token_revocations`` on the main database; opens a connection per call."""
+
+    def __init__(self, conn_factory: Callable[[], Any], kind: str) -> None:
+        self._conn_factory = conn_factory
+        ph = "%s" if kind == "mysql" else "?"
+        self._insert = (
+            f"INSERT INTO token_revocations (kind, value, since, expires_at) VALUES ({ph}, {ph}, {ph}, {ph})"
+        )
+        self._changes = (
+            "SELECT id, kind, value, since, expires_at FROM token_revocations "
+            f"WHERE id > {ph} AND expires_at > {ph} ORDER BY id LIMIT {ph}"
+        )
+        self._purge = f"DELETE FROM token_revocations WHERE expires_at < {ph}"
+
+    def _execute(self, sql: str, params: Tuple[Any, ...] = (), *, fetch: bool = False) -> List[Any]:
+        conn = self._conn_factory()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                rows = list(cur.fetchall()) if fetch else []
+            finally:
+                cur.close()
+            conn.commit()
+            return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in rows]
+        finally:
+            conn.close()
+
+    def add(self, kind: str, value: str, since: Optional[float], expires_at: float) -> None:
+        self._execute(self._insert, (kind, value, since, expires_at))
+
+    def changes_since(self, last_id: int, now: float, limit: int = _PAGE) -> List[Revocation]:
+        return [
+            (int(rid), kind, value, None if since is None else float(since), float(expires_at))
+            for rid, kind, value, since, expires_at in self._execute(self._changes, (last_id, now, limit), fetch=True)
+        ]
+
+    def purge(self, before: float) -> None:
+        self._execute(self._purge, (before,))
+
+
+class RevocationList:
+    def __init__(
+        self,
+        store: Optional[SqlRevocationStore] = None,
+        *,
+        capacity: int = 100_000,
+        fp_rate: float = 0.01,
+        refresh_interval: float = 2.0,
+        purge_interval: float = 300.0,
+        gap_timeout: float = 10.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Without a ``store`` revocations only live in this process."""
+
+        self._store = store
+        self._fp_rate = fp_rate
+        self.refresh_interval = refresh_interval
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(capacity, fp_rate)
+        self._tokens: Dict[str, float] = {}  # jti -> expires_at
+        self._subjects: Dict[str, Tuple[float, float]] = {}  # sub -> (since, expires_at)
+        self._cursor = IdCursor(gap_timeout=gap_timeout, clock=clock)
+        self._stale = 0  # expired jtis still set in the filter
+        self._last_purge = clock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._checks = 0
+        self._filter_hits = 0
+        self._false_positives = 0
+        self._revoked = 0
+        self._refresh_failures = 0
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        self._checks += 1  # unlocked: the hot path; approximate under concurrency
+        jti = claims.get("jti")
+        if jti is not None and str(jti) in self._filter:
+            self._filter_hits += 1
+            if str(jti) in self._tokens:
+                self._revoked += 1
+                return True
+            self._false_positives += 1
+        revoked_subject = self._subjects.get(str(claims.get("sub")))
+        if revoked_subject is not None:
+            try:
+                issued_at = float(claims.get("iat", 0))
+            except (TypeError, ValueError):
+                issued_at = 0.0  # cannot prove it was issued after the revocation
+            if issued_at < revoked_subject[0]:
+                self._revoked += 1
+                return True
+        return False
+
+    def revoke_token(self, jti: str, expires_at: float) -> None:
+        self._add(JTI, str(jti), None, expires_at)
+
+    def revoke_subject(self, sub: Any, *, since: Optional[float] = None, max_token_ttl: float = 3600) -> None:
+        """Revoke every token of ``sub`` issued before ``since`` (default: now)."""
+
+        since = self._clock() if since is None else since
+        self._add(SUBJECT, str(sub), since, since + max_token_ttl)
+
+    def _add(self, kind: str, value: str, since: Optional[float], expires_at: float) -> None:
+        if self._store is not None:
+            self._store.add(kind, value, since, expires_at)
+        # Applied right away here; other instances see it on their next refresh.
+        with self._lock:
+            self._apply(kind, value, since, expires_at)
+
+    def _apply(self, kind: str, value: str, since: Optional[float], expires_at: float) -> None:
+        if kind == JTI:
+            self._tokens[value] = max(expires_at, self._tokens.get(value, 0.0))
+            if len(self._tokens) > self._filter.capacity:
+                self._rebuild(self._filter.capacity * 2)
+            else:
+                self._filter.add(value)
+        elif kind == SUBJECT:
+            current = self._subjects.get(value)
+            if current is None or since > current[0]:
+                self._subjects[value] = (since, expires_at)
+
+    def _rebuild(self, capacity: int) -> None:
+        bloom = BloomFilter(capacity, self._fp_rate)
+        for jti in self._tokens:
+            bloom.add(jti)
+        self._filter = bloom  # swapped whole: readers never see a half-built filter
+        self._stale = 0
+
+    def refresh(self) -> int:
+        """Pull new rows from the store and drop expired entries; returns the rows applied."""
+
+        now = self._clock()
+        applied = 0
+        if self._store is not None:
+            after = self._cursor.floor()
+            while True:
+                rows = self._store.changes_since(after, now)
+                with self._lock:
+                    fresh = set(self._cursor.accept(row[0] for row in rows))
+                    for rid, kind, value, since, expires_at in rows:
+                        if rid in fresh:
+                            self._apply(kind, value, since, expires_at)
+                applied += len(fresh)
+                if len(rows) < _PAGE:
+                    break
+                after = rows[-1][0]
+        with self._lock:
+            expired = [jti for jti, exp in self._tokens.items() if exp <= now]
+            for jti in expired:
+                del self._tokens[jti]
+            for sub in [sub for sub, (_, exp) in self._subjects.items() if exp <= now]:
+                del self._subjects[sub]
+            # Stale bits only raise the false-positive rate; rebuild once they add up.
+            self._stale += len(expired)
+            if self._stale > self._filter.capacity // 4:
+                self._rebuild(self._filter.capacity)
+        if self._store is not None and now - self._last_purge >= self.purge_interval:
+            self._last_purge = now
+            self._store.purge(now)
+        return applied
+
+    def _refresh_logged(self) -> None:
+        try:
+            self.refresh()
+        except Exception as exc:  # noqa: BLE001
+            self._refresh_failures += 1
+            print(f"[revocation] refresh failed: {exc!r}", file=sys.stderr)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self._refresh_logged()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._refresh_logged()  # load what is already revoked before serving
+            self._thread = threading.Thread(target=self._run, name="token-revocation", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tokens": len(self._tokens),
+                "subjects": len(self._subjects),
+                "filter_bytes": self._filter.size_bytes,
+                "checks": self._checks,
+                "filter_hits": self._filter_hits,
+                "false_positives": self._false_positives,
+                "revoked": self._revoked,
+                "refresh_failures": self._refresh_failures,
+                "open_gaps": self._cursor.open_gaps,
+                "persistent": self._store is not None,
+            }
+
+
+__all__ = ["BloomFilter", "RevocationList", "SqlRevocationStore"]
@@ -0,0 +1,561 @@
+"""Hash-partitioned user storage spread over several SQLite files or MySQL schemas.
+
+Every uid hashes into one of a fixed number of virtual buckets and the
+``shard_buckets`` table in the directory database maps buckets to shards.
+The directory also owns ``user_directory`` (email -> uid), which allocates
+globally unique ids and serves ``get_by_email``. Status reads and mutations
+only touch the user's own shard, so writes scale with the number of shards.
+
+Buckets move between shards online (see :func:`move_buckets`): a bucket is
+frozen (``state='moving'``), copied, flipped to its new shard and finally
+deleted from the old one. Nodes cache the bucket map for ``ttl`` seconds and
+the mover waits twice that long between steps, so a write to a frozen bucket
+fails fast with :class:`ShardMovingError` instead of being lost. The check
+runs again right before the unit of work commits: a transaction that started
+before the freeze cannot commit on the old shard after the copy read it.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..domain.models import User
+from ..ports.repositories import UserRepository
+from ..ports.unit_of_work import UnitOfWork
+from .chunking import chunked
+from .migrations import Migration, apply_migrations
+
+
+HASH_MULTIPLIER = 2654435761  # Knuth's multiplicative hash constant
+DEFAULT_BUCKETS = 1024
+_USER_COLUMNS = "id, name, email, password_hash, salt, plan, start_date, status"
+
+
+def bucket_for(user_id: int, buckets: int) -> int:
+    return (user_id * HASH_MULTIPLIER) % 4294967296 % buckets
+
+
+def bucket_sql(buckets: int, column: str = "id") -> str:
+    """SQL expression equivalent to :func:`bucket_for` (SQLite and MySQL)."""
+
+    return f"(({column} * {HASH_MULTIPLIER}) % 4294967296) % {buckets}"
+
+
+class ShardMovingError(RuntimeError):
+    """Raised on writes to a bucket that is being moved; safe to retry shortly."""
+
+
+DIRECTORY_MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create_directory",
+        sqlite=[
+            """
+            CREATE TABLE IF NOT EXISTS user_directory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS shard_buckets (
+                bucket INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'active'
+            )
+            """,
+        ],
+        mysql=[
+            """
+            CREATE TABLE IF NOT EXISTS user_directory (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                email VARCHAR(120) NOT NULL UNIQUE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS shard_buckets (
+                bucket INT PRIMARY KEY,
+                shard INT NOT NULL,
+                state ENUM('active','moving') NOT NULL DEFAULT 'active'
+            )
+            """,
+        ],
+    ),
+]
+
+
+def _fetchall(conn: Any, sql: str, params: Sequence[Any] = ()) -> List[Tuple[Any, ...]]:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, tuple(params))
+        return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+
+def _execute(conn: Any, sql: str, params: Sequence[Any] = ()) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, tuple(params))
+    finally:
+        cur.close()
+
+
+def _executemany(conn: Any, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+    cur = conn.cursor()
+    try:
+        cur.executemany(sql, rows)
+    finally:
+        cur.close()
+
+
+class ShardMap:
+    """Bucket -> shard routing backed by the directory database."""
+
+    def __init__(
+        self,
+        kind: str,
+        shard_factories: Sequence[Callable[[], Any]],
+        directory_factory: Callable[[], Any],
+        *,
+        ttl: float = 1.0,
+    ) -> None:
+        if not shard_factories:
+            raise ValueError("at least one shard is required")
+        self.kind = kind
+        self.shard_factories = list(shard_factories)
+        self.directory_factory = directory_factory
+        self.ttl = ttl
+        self.placeholder = "?" if kind == "sqlite" else "%s"
+        self._lock = threading.Lock()
+        self._assignments: List[Tuple[int, str]] = []
+        self._loaded_at = float("-inf")
+
+    def initialize(self, buckets: int = DEFAULT_BUCKETS) -> None:
+        """Create the directory tables, migrate every shard and seed the bucket map.
+
+        Existing bucket assignments are kept, so this is safe to re-run after
+        appending a new shard to the configuration.
+        """
+
+        conn = self.directory_factory()
+        try:
+            apply_migrations(conn, self.kind, migrations=DIRECTORY_MIGRATIONS, version_table="directory_migrations")
+            if not _fetchall(conn, "SELECT bucket FROM shard_buckets LIMIT 1"):
+                ph = self.placeholder
+                _executemany(
+                    conn,
+                    f"INSERT INTO shard_buckets (bucket, shard, state) VALUES ({ph}, {ph}, 'active')",
+                    [(b, b % len(self.shard_factories)) for b in range(buckets)],
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        for factory in self.shard_factories:
+            shard_conn = factory()
+            try:
+                apply_migrations(shard_conn, self.kind)
+            finally:
+                shard_conn.close()
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            conn = self.directory_factory()
+            try:
+                rows = _fetchall(conn, "SELECT bucket, shard, state FROM shard_buckets ORDER BY bucket")
+            finally:
+                conn.close()
+            if not rows:
+                raise RuntimeError("shard map is empty; run python -m capitalia.scripts.reshard init")
+            self._assignments = [(int(shard), str(state)) for _, shard, state in rows]
+            self._loaded_at = time.monotonic()
+
+    @property
+    def bucket_count(self) -> int:
+        self.refresh()
+        return len(self._assignments)
+
+    def route(self, user_id: int) -> Tuple[int, bool]:
+        """Return ``(shard index, writable)`` for ``user_id``."""
+
+        self.refresh()
+        assignments = self._assignments
+        shard, state = assignments[bucket_for(user_id, len(assignments))]
+        return shard, state == "active"
+
+    def shard_for(self, user_id: int) -> int:
+        return self.route(user_id)[0]
+
+    def check_writable(self, user_id: int) -> int:
+        shard, writable = self.route(user_id)
+        if not writable:
+            raise ShardMovingError(f"user {user_id} is being moved between shards; retry shortly")
+        return shard
+
+    def connection_for(self, user_id: int) -> Any:
+        """Open a connection to the shard that owns ``user_id``."""
+
+        return self.shard_factories[self.shard_for(user_id)]()
+
+    def assignments(self) -> List[Tuple[int, str]]:
+        self.refresh(force=True)
+        return list(self._assignments)
+
+
+class ShardedUnitOfWork(UnitOfWork):
+    """Opens shard and directory connections lazily, one transaction each.
+
+    Commits go to the shards first and the directory last. A single-user
+    mutation only touches one shard; adds and email changes also write the
+    directory, so those two commits are not atomic with each other.
+    """
+
+    def __init__(
+        self,
+        shard_map: ShardMap,
+        repo_factory: Callable[[Any], Any],
+        counters_factory: Optional[Callable[[Any], Any]] = None,
+        outbox_factory: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        self.shard_map = shard_map
+        self._repo_factory = repo_factory
+        self._counters_factory = counters_factory
+        self._outbox_factory = outbox_factory
+        self._shard_conns: Dict[int, Any] = {}
+        self._shard_repos: Dict[int, Any] = {}
+        self._directory: Optional[Any] = None
+        self._written: Dict[int, int] = {}  # uid -> shard it was written to
+        self.users = None
+        self.counters = None
+        self.outbox = None
+
+    def __enter__(self):
+        self.begin()
+        self.users = ShardedUserRepository(self)
+        if self._counters_factory is not None:
+            self.counters = _ShardedCounters(self, self._counters_factory)
+        if self._outbox_factory is not None:
+            self.outbox = _ShardedOutbox(self, self._outbox_factory)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc:
+                self.rollback()
+            else:
+                self.commit()
+        finally:
+            for conn in [*self._shard_conns.values(), self._directory]:
+                if conn is not None:
+                    conn.close()
+            self._shard_conns.clear()
+            self._shard_repos.clear()
+            self._written.clear()
+            self._directory = None
+            self.users = None
+            self.counters = None
+            self.outbox = None
+
+    @staticmethod
+    def _open(factory: Callable[[], Any]) -> Any:
+        conn = factory()
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        cur.close()
+        return conn
+
+    def repo_for_shard(self, shard: int) -> Any:
+        repo = self._shard_repos.get(shard)
+        if repo is None:
+            conn = self._open(self.shard_map.shard_factories[shard])
+            self._shard_conns[shard] = conn
+            repo = self._shard_repos[shard] = self._repo_factory(conn)
+        return repo
+
+    def check_writable(self, user_id: int) -> int:
+        """The shard to write ``user_id`` to; re-checked by :meth:`commit`."""
+
+        shard = self.shard_map.check_writable(user_id)
+        self._written[user_id] = shard
+        return shard
+
+    def _confirm_writes(self) -> None:
+        # The mover copies a bucket 2*ttl after freezing it, and this map is at
+        # most ttl old, so a write confirmed here lands before the copy (as long
+        # as the commit itself takes less than ttl) however long the
+        # transaction ran.
+        for uid, shard in self._written.items():
+            if self.shard_map.route(uid) != (shard, True):
+                self.rollback()
+                raise ShardMovingError(f"user {uid} moved between shards during the transaction; retry shortly")
+
+    def directory(self) -> Any:
+        if self._directory is None:
+            self._directory = self._open(self.shard_map.directory_factory)
+        return self._directory
+
+    def begin(self) -> None:
+        # Connections begin lazily, on first use of each shard.
+        pass
+
+    def commit(self) -> None:
+        self._confirm_writes()
+        for conn in self._shard_conns.values():
+            conn.commit()
+        if self._directory is not None:
+            self._directory.commit()
+        self._written.clear()
+
+    def rollback(self) -> None:
+        for conn in [*self._shard_conns.values(), self._directory]:
+            if conn is not None:
+                conn.rollback()
+        self._written.clear()
+
+
+class _ShardedCounters:
+    """Counter deltas go to a shard already enlisted in the unit of work.
+
+    Each shard keeps its own ``user_counters`` and readers sum them, so any
+    shard will do; reusing an open one keeps the deltas in the same commit
+    as the users they describe.
+    """
+
+    def __init__(self, uow: ShardedUnitOfWork, counters_factory: Callable[[Any], Any]) -> None:
+        self._uow = uow
+        self._counters_factory = counters_factory
+
+    def apply(self, deltas: Any) -> None:
+        if not deltas:
+            return
+        shard = next(iter(self._uow._shard_conns), 0)
+        self._uow.repo_for_shard(shard)
+        self._counters_factory(self._uow._shard_conns[shard]).apply(deltas)
+
+
+class _ShardedOutbox:
+    """Events go to the outbox of the shard owning each user, in that shard's transaction."""
+
+    def __init__(self, uow: ShardedUnitOfWork, outbox_factory: Callable[[Any], Any]) -> None:
+        self._uow = uow
+        self._outbox_factory = outbox_factory
+
+    def append(self, events: Sequence[Any]) -> None:
+        by_shard: Dict[int, List[Any]] = {}
+        for event in events:
+            by_shard.setdefault(self._uow.shard_map.shard_for(event.user_id), []).append(event)
+        for shard, members in by_shard.items():
+            self._uow.repo_for_shard(shard)
+            self._outbox_factory(self._uow._shard_conns[shard]).append(members)
+
+
+class ShardedUserRepository(UserRepository):
+    def __init__(self, uow: ShardedUnitOfWork) -> None:
+        self._uow = uow
+        self._map = uow.shard_map
+        self._ph = self._map.placeholder
+        # Emails as loaded, so save() only touches the directory on a change.
+        self._emails: Dict[int, str] = {}
+
+    def _remember(self, user: Optional[User]) -> Optional[User]:
+        if user is not None:
+            self._emails[user.id] = user.email
+        return user
+
+    def _group(self, user_ids: Iterable[int]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for uid in user_ids:
+            groups[self._map.shard_for(uid)].append(uid)
+        return groups
+
+    def _register(self, users: Sequence[User]) -> None:
+        """Reserve emails in the directory and assign the global ids."""
+
+        directory = self._uow.directory()
+        ph = self._ph
+        _executemany(
+            directory,
+            f"INSERT INTO user_directory (id, email) VALUES ({ph}, {ph})",
+            [(user.id, user.email) for user in users],
+        )
+        ids_by_email: Dict[str, int] = {}
+        for chunk in chunked([user.email for user in users], 500):
+            placeholders = ", ".join([ph] * len(chunk))
+            rows = _fetchall(directory, f"SELECT id, email FROM user_directory WHERE email IN ({placeholders})", chunk)
+            ids_by_email.update((email, int(uid)) for uid, email in rows)
+        for user in users:
+            user.id = ids_by_email[user.email]
+
+    def _sync_email(self, user: User) -> None:
+        previous = self._emails.get(user.id)
+        if previous is not None and previous != user.email:
+            _execute(
+                self._uow.directory(),
+                f"UPDATE user_directory SET email = {self._ph} WHERE id = {self._ph}",
+                (user.email, user.id),
+            )
+        self._emails[user.id] = user.email
+
+    def get_by_id(self, user_id: int) -> Optional[User]:
+        repo = self._uow.repo_for_shard(self._map.shard_for(user_id))
+        return self._remember(repo.get_by_id(user_id))
+
+    def get_by_email(self, email: str) -> Optional[User]:
+        rows = _fetchall(self._uow.directory(), f"SELECT id FROM user_directory WHERE email = {self._ph}", (email,))
+        return self.get_by_id(int(rows[0][0])) if rows else None
+
+    def add(self, user: User) -> int:
+        self._register([user])
+        shard = self._uow.check_writable(user.id)
+        self._uow.repo_for_shard(shard).add(user)
+        self._emails[user.id] = user.email
+        return user.id
+
+    def save(self, user: User) -> None:
+        shard = self._uow.check_writable(user.id)
+        self._sync_email(user)
+        self._uow.repo_for_shard(shard).save(user)
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        found: Dict[int, User] = {}
+        for shard, ids in self._group(dict.fromkeys(user_ids)).items():
+            for uid, user in self._uow.repo_for_shard(shard).get_many(ids).items():
+                found[uid] = self._remember(user)
+        return found
+
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        if not users:
+            return []
+        self._register(users)
+        groups: Dict[int, List[User]] = defaultdict(list)
+        for user in users:
+            groups[self._uow.check_writable(user.id)].append(user)
+            self._emails[user.id] = user.email
+        for shard, members in groups.items():
+            self._uow.repo_for_shard(shard).add_many(members)
+        return [user.id for user in users]
+
+    def save_many(self, users: Sequence[User]) -> None:
+        groups: Dict[int, List[User]] = defaultdict(list)
+        for user in users:
+            groups[self._uow.check_writable(user.id)].append(user)
+            self._sync_email(user)
+        for shard, members in groups.items():
+            self._uow.repo_for_shard(shard).save_many(members)
+
+
+def _set_buckets(shard_map: ShardMap, buckets: Sequence[int], *, state: str, shard: Optional[int] = None) -> None:
+    ph = shard_map.placeholder
+    in_list = ", ".join(str(int(b)) for b in buckets)
+    conn = shard_map.directory_factory()
+    try:
+        if shard is None:
+            _execute(conn, f"UPDATE shard_buckets SET state = {ph} WHERE bucket IN ({in_list})", (state,))
+        else:
+            _execute(
+                conn,
+                f"UPDATE shard_buckets SET shard = {ph}, state = {ph} WHERE bucket IN ({in_list})",
+                (shard, state),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    shard_map.refresh(force=True)
+
+
+def _copy_rows(shard_map: ShardMap, source: int, target: int, buckets: Sequence[int], batch_size: int) -> int:
+    ph = shard_map.placeholder
+    in_list = ", ".join(str(int(b)) for b in buckets)
+    where = f"{bucket_sql(shard_map.bucket_count)} IN ({in_list})"
+    src = shard_map.shard_factories[source]()
+    dst = shard_map.shard_factories[target]()
+    copied = 0
+    last_id = 0
+    try:
+        while True:
+            rows = _fetchall(
+                src,
+                f"SELECT {_USER_COLUMNS} FROM users WHERE {where} AND id > {ph} ORDER BY id LIMIT {int(batch_size)}",
+                (last_id,),
+            )
+            if not rows:
+                break
+            # REPLACE keeps re-runs after an interrupted move idempotent.
+            _executemany(dst, f"REPLACE INTO users ({_USER_COLUMNS}) VALUES ({', '.join([ph] * 8)})", rows)
+            dst.commit()
+            copied += len(rows)
+            last_id = int(rows[-1][0])
+    finally:
+        src.close()
+        dst.close()
+    return copied
+
+
+def _delete_rows(shard_map: ShardMap, source: int, buckets: Sequence[int]) -> None:
+    in_list = ", ".join(str(int(b)) for b in buckets)
+    conn = shard_map.shard_factories[source]()
+    try:
+        _execute(conn, f"DELETE FROM users WHERE {bucket_sql(shard_map.bucket_count)} IN ({in_list})")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def move_buckets(
+    shard_map: ShardMap,
+    buckets: Iterable[int],
+    target: int,
+    *,
+    batch_size: int = 1000,
+    step: int = 16,
+    sleep: Callable[[float], None] = time.sleep,
+    progress: Optional[Callable[[str], None]] = None,
+) -> int:
+    """Move ``buckets`` to shard ``target`` while the service keeps running.
+
+    Buckets move ``step`` at a time so each freeze window stays short. Returns
+    the number of user rows copied.
+    """
+
+    if not 0 <= target < len(shard_map.shard_factories):
+        raise ValueError(f"unknown shard {target}")
+    assignments = shard_map.assignments()
+    by_source: Dict[int, List[int]] = defaultdict(list)
+    for bucket in sorted(set(buckets)):
+        if not 0 <= bucket < len(assignments):
+            raise ValueError(f"unknown bucket {bucket}")
+        source = assignments[bucket][0]
+        if source != target:
+            by_source[source].append(bucket)
+
+    lease = 2 * shard_map.ttl
+    moved = 0
+    for source, group in by_source.items():
+        for batch in chunked(group, step):
+            _set_buckets(shard_map, batch, state="moving")
+            sleep(lease)  # every node's cached map now sees the freeze
+            moved += _copy_rows(shard_map, source, target, batch, batch_size)
+            _set_buckets(shard_map, batch, state="active", shard=target)
+            sleep(lease)  # readers have switched before the source rows go away
+            _delete_rows(shard_map, source, batch)
+            if progress is not None:
+                progress(f"buckets {batch[0]}..{batch[-1]}: shard {source} -> {target}")
+    return moved
+
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "DIRECTORY_MIGRATIONS",
+    "ShardMap",
+    "ShardMovingError",
+    "ShardedUnitOfWork",
+    "ShardedUserRepository",
+    "bucket_for",
+    "bucket_sql",
+    "move_buckets",
+]
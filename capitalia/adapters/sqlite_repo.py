@@ -1,42 +1,20 @@
 from __future__ import annotations
 
 import sqlite3
-from datetime import date
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence
 
 from ..domain.models import User
 from ..ports.repositories import UserRepository
+from .chunking import chunked
 
 
-def _to_entity(row) -> User:
-    # row can be tuple or sqlite3.Row depending on connection config
-    if row is None:
-        return None
-    if isinstance(row, sqlite3.Row):
-        d = dict(row)
-    else:
-        cols = [
-            "id",
-            "name",
-            "email",
-            "password_hash",
-            "salt",
-            "plan",
-            "start_date",
-            "status",
-        ]
-        d = {k: row[i] for i, k in enumerate(cols)}
-    sd = date.fromisoformat(d["start_date"]) if isinstance(d["start_date"], str) else d["start_date"]
-    return User(
-        id=int(d["id"]) if d["id"] is not None else None,
-        name=d["name"],
-        email=d["email"],
-        password_hash=d["password_hash"],
-        salt=d["salt"],
-        plan=d["plan"],
-        start_date=sd,
-        status=d["status"],
-    )
+# Stays well below SQLITE_MAX_VARIABLE_NUMBER (999 on older builds).
+IN_CHUNK_SIZE = 500
+
+
+def _to_entity(row) -> Optional[User]:
+    # Tuples and sqlite3.Row both unpack positionally in SELECT column order.
+    return None if row is None else User.from_row(row)
 
 
 class SqliteUserRepository(UserRepository):
@@ -67,10 +45,11 @@ class SqliteUserRepository(UserRepository):
     def add(self, user: User) -> int:
         cur = self.conn.execute(
             """
-            INSERT INTO users (name, email, password_hash, salt, plan, start_date, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO users (id, name, email, password_hash, salt, plan, start_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (
+                user.id,
                 user.name,
                 user.email,
                 user.password_hash,
@@ -80,7 +59,7 @@ class SqliteUserRepository(UserRepository):
                 user.status,
             ),
         )
-        return int(cur.lastrowid)
+        return int(user.id if user.id is not None else cur.lastrowid)
 
     def save(self, user: User) -> None:
         self.conn.execute(
@@ -100,3 +79,81 @@ class SqliteUserRepository(UserRepository):
                 user.id,
             ),
         )
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        found: Dict[int, User] = {}
+        for chunk in chunked(dict.fromkeys(user_ids), IN_CHUNK_SIZE):
+            placeholders = ", ".join("?" * len(chunk))
+            cur = self.conn.execute(
+                f"""
+                SELECT id, name, email, password_hash, salt, plan, start_date, status
+                FROM users WHERE id IN ({placeholders})
+                """,
+                chunk,
+            )
+            for row in cur:
+                user = User.from_row(row)
+                found[user.id] = user
+        return found
+
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        if not users:
+            return []
+        self.conn.executemany(
+            """
+            INSERT INTO users (id, name, email, password_hash, salt, plan, start_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    user.id,
+                    user.name,
+                    user.email,
+                    user.password_hash,
+                    user.salt,
+                    user.plan,
+                    user.start_date.isoformat(),
+                    user.status,
+                )
+                for user in users
+            ],
+        )
+        if all(user.id is not None for user in users):
+            return [int(user.id) for user in users]
+        # executemany does not expose per-row lastrowid; resolve ids through the
+        # unique email index instead.
+        ids_by_email: Dict[str, int] = {}
+        for chunk in chunked([user.email for user in users], IN_CHUNK_SIZE):
+            placeholders = ", ".join("?" * len(chunk))
+            cur = self.conn.execute(
+                f"SELECT id, email FROM users WHERE email IN ({placeholders})",
+                chunk,
+            )
+            ids_by_email.update((email, int(uid)) for uid, email in cur)
+        for user in users:
+            user.id = ids_by_email[user.email]
+        return [user.id for user in users]
+
+    def save_many(self, users: Sequence[User]) -> None:
+        if not users:
+            return
+        self.conn.executemany(
+            """
+            UPDATE users
+            SET name=?, email=?, password_hash=?, salt=?, plan=?, start_date=?, status=?
+            WHERE id=?
+            """,
+            [
+                (
+                    user.name,
+                    user.email,
+                    user.password_hash,
+                    user.salt,
+                    user.plan,
+                    user.start_date.isoformat(),
+                    user.status,
+                    user.id,
+                )
+                for user in users
+            ],
+        )
@@ -0,0 +1,299 @@
+"""Memory-mapped, fixed-width status index: uid -> (plan, status, start_date).
+
+The file is a 24-byte header followed by one 8-byte record per uid, stored
+at ``HEADER_SIZE + uid * RECORD_SIZE``, so a lookup is a single
+``struct.unpack_from`` on the mapping (100M uids ~ 800 MB, paged in lazily).
+A zero plan code marks an absent uid. The header records when the last
+full rebuild finished (``built_at``); a file that was only created and
+filled piecemeal has 0 there and does not describe the whole population.
+
+Server processes map the file read-only. One follower process
+(``scripts/status_index --follow``) owns it: it rebuilds it, then applies
+the outbox events of every node in place (``MAP_SHARED``) and stamps the
+header with the time of its last complete poll (``synced_at``). Readers
+skip the index while that stamp is older than ``max_lag`` seconds, and skip
+the uids they changed themselves until the follower has caught up with
+those commits, so stale entries are never served for longer than that.
+A rebuild writes a new file and atomically replaces the old one; open
+indexes notice the new inode within ``reload_interval`` seconds and remap.
+The database stays the source of truth: writes that bypass the outbox
+(bulk import, manual SQL) require a rebuild.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..domain.events import SubscriptionChanged
+from ..domain.models import Plan, Status, User
+
+
+MAGIC = b"CSIX"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sHHdd")  # magic, version, record size, synced_at, built_at
+_SYNCED_AT = struct.Struct("<d")
+_SYNCED_AT_OFFSET = 8
+_MAX_PENDING = 10_000
+_RECORD = struct.Struct("<iBBxx")  # start_date ordinal, plan code, status code
+HEADER_SIZE = _HEADER.size
+RECORD_SIZE = _RECORD.size
+
+_PLANS = {plan.code: plan for plan in Plan}
+_STATUSES = {status.code: status for status in Status}
+
+Entry = Tuple[Plan, Status, date]
+
+
+def _encode(plan: str, status: str, start_date: Any) -> bytes:
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    return _RECORD.pack(start_date.toordinal(), Plan(plan).code, Status(status).code)
+
+
+def read_header(path: str, header: Optional[bytes] = None) -> Tuple[float, float]:
+    """``(synced_at, built_at)`` of the index at ``path``; ``ValueError`` if it is not one."""
+
+    if header is None:
+        with open(path, "rb") as fh:
+            header = fh.read(HEADER_SIZE)
+    try:
+        magic, version, record_size, synced_at, built_at = _HEADER.unpack(header)
+    except struct.error:
+        magic, version, record_size, synced_at, built_at = b"", 0, 0, 0.0, 0.0
+    if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a status index (version {FORMAT_VERSION}); rebuild it")
+    return synced_at, built_at
+
+
+class StatusIndex:
+    def __init__(
+        self,
+        path: str,
+        *,
+        writable: bool = True,
+        reload_interval: float = 1.0,
+        max_lag: float = 0.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """``max_lag`` > 0 makes reads fall back to the database (``None``)
+        while the follower's last sync is older than that many seconds."""
+
+        self.path = path
+        self.writable = writable
+        self.reload_interval = reload_interval
+        self.max_lag = max_lag
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file: Optional[Any] = None
+        self._map: Optional[mmap.mmap] = None
+        self._inode = None
+        self._checked_at = 0.0
+        self._pending: Dict[int, float] = {}  # uid -> when this process changed it; guarded by _lock
+        self._stale_reads = 0
+        if writable and not os.path.exists(path):
+            self.create(path)
+        if writable or os.path.exists(path):
+            self._open()
+        # A reader may start before the follower has built the file; it maps it once it appears.
+
+    @staticmethod
+    def create(path: str, capacity: int = 0, *, built_at: float = 0.0) -> None:
+        """An empty index; pass ``built_at`` only if the caller then writes every uid."""
+
+        with open(path, "wb") as fh:
+            fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, 0.0, built_at))
+            fh.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+
+    @classmethod
+    def build(cls, path: str, rows: Iterable[Tuple[int, str, str, Any]]) -> int:
+        """Write a fresh index from ``(id, plan, status, start_date)`` rows and swap it in."""
+
+        tmp_path = f"{path}.tmp"
+        count = 0
+        with open(tmp_path, "wb") as fh:
+            fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, 0.0, 0.0))
+            for uid, plan, status, start_date in rows:
+                # Sparse writes: holes between uids cost no disk space.
+                fh.seek(HEADER_SIZE + int(uid) * RECORD_SIZE)
+                fh.write(_encode(plan, status, start_date))
+                count += 1
+            fh.seek(0)
+            fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_SIZE, 0.0, time.time()))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+        return count
+
+    def _open(self) -> None:
+        fh = open(self.path, "r+b" if self.writable else "rb")
+        header = fh.read(HEADER_SIZE)
+        try:
+            read_header(self.path, header)
+        except ValueError:
+            fh.close()
+            raise
+        stat = os.fstat(fh.fileno())
+        mapping = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+        old_file = self._file
+        # The previous mapping is left to the GC: concurrent readers may still hold it.
+        self._file, self._map, self._inode = fh, mapping, stat.st_ino
+        self._checked_at = time.monotonic()
+        if old_file is not None:
+            old_file.close()
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if self._map is None or stat.st_ino != self._inode or stat.st_size > len(self._map):
+                self._open()
+
+    def __len__(self) -> int:
+        """Capacity in uids (including absent ones)."""
+
+        return 0 if self._map is None else (len(self._map) - HEADER_SIZE) // RECORD_SIZE
+
+    @property
+    def synced_at(self) -> float:
+        """When the follower last finished applying the outbox (0 = never)."""
+
+        mapping = self._map
+        return 0.0 if mapping is None else _SYNCED_AT.unpack_from(mapping, _SYNCED_AT_OFFSET)[0]
+
+    def mark_synced(self, at: float) -> None:
+        """Record that every change committed before ``at`` has been applied."""
+
+        if not self.writable:
+            raise PermissionError("status index opened read-only")
+        with self._lock:
+            _SYNCED_AT.pack_into(self._map, _SYNCED_AT_OFFSET, at)
+
+    def _is_current(self, user_id: int) -> bool:
+        if self.max_lag <= 0:
+            return True
+        synced_at = self.synced_at
+        if self._clock() - synced_at > self.max_lag:
+            return False
+        if not self._pending:  # the common case, without taking the lock
+            return True
+        with self._lock:
+            changed_at = self._pending.get(user_id)
+            if changed_at is None:
+                return True
+            if synced_at <= changed_at:
+                return False
+            del self._pending[user_id]
+        return True
+
+    def get(self, user_id: int) -> Optional[Entry]:
+        self._maybe_reload()
+        entry = self.get_raw(user_id)
+        if entry is not None and not self._is_current(user_id):
+            self._stale_reads += 1
+            return None
+        return entry
+
+    def _ensure_capacity(self, user_id: int) -> None:
+        needed = HEADER_SIZE + (user_id + 1) * RECORD_SIZE
+        if needed <= len(self._map):
+            return
+        size = os.fstat(self._file.fileno()).st_size
+        if size < needed:
+            # Grow geometrically so sequential signups do not remap every time.
+            os.ftruncate(self._file.fileno(), max(needed, HEADER_SIZE + 2 * (size - HEADER_SIZE)))
+        self._open()
+
+    def put_many(self, users: Sequence[User]) -> None:
+        if not self.writable:
+            raise PermissionError("status index opened read-only")
+        with self._lock:
+            for user in users:
+                self._ensure_capacity(user.id)
+                self._map[HEADER_SIZE + user.id * RECORD_SIZE : HEADER_SIZE + (user.id + 1) * RECORD_SIZE] = _encode(
+                    user.plan, user.status, user.start_date
+                )
+
+    def put(self, user: User) -> None:
+        self.put_many([user])
+
+    def invalidate(self, users: Sequence[User]) -> None:
+        """Called after ``users`` were committed by this process.
+
+        The owner of the file writes them in place; a reader serves them from
+        the database until the follower's sync passes this moment.
+        """
+
+        if self.writable:
+            self.put_many(users)
+            return
+        now = self._clock()
+        synced_at = self.synced_at
+        with self._lock:
+            pending = self._pending
+            for user in users:
+                pending[user.id] = now
+            if len(pending) > _MAX_PENDING:
+                for uid in [uid for uid, at in pending.items() if at < synced_at]:
+                    del pending[uid]
+
+    def apply(self, events: Sequence[SubscriptionChanged], fetch_many: Callable[[List[int]], Dict[int, User]]) -> None:
+        """Write the outcome of outbox ``events``; uids missing from the index are read with ``fetch_many``."""
+
+        latest: Dict[int, SubscriptionChanged] = {}
+        for event in events:
+            latest[event.user_id] = event
+        missing: List[int] = []
+        with self._lock:
+            for uid, event in latest.items():
+                current = self.get_raw(uid)
+                if current is None:
+                    missing.append(uid)
+                    continue
+                self._map[HEADER_SIZE + uid * RECORD_SIZE : HEADER_SIZE + (uid + 1) * RECORD_SIZE] = _encode(
+                    event.new_plan, event.new_status, current[2]
+                )
+        if missing:
+            self.put_many(list(fetch_many(missing).values()))
+
+    def get_raw(self, user_id: int) -> Optional[Entry]:
+        """The stored entry, without the staleness checks of :meth:`get`."""
+
+        mapping = self._map
+        offset = HEADER_SIZE + user_id * RECORD_SIZE
+        if mapping is None or user_id < 0 or offset + RECORD_SIZE > len(mapping):
+            return None
+        ordinal, plan, status = _RECORD.unpack_from(mapping, offset)
+        if not plan:
+            return None
+        return _PLANS[plan], _STATUSES[status], date.fromordinal(ordinal)
+
+    def stats(self) -> Dict[str, Any]:
+        synced_at = self.synced_at
+        return {
+            "lag": round(self._clock() - synced_at, 3) if synced_at else None,
+            "stale_reads": self._stale_reads,
+            "pending": len(self._pending),
+            "writable": self.writable,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = self._file = None
+
+
+__all__ = ["HEADER_SIZE", "RECORD_SIZE", "StatusIndex", "read_header"]
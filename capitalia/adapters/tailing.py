@@ -0,0 +1,58 @@
+"""Reading an id-ordered table as a change stream.
+
+AUTO_INCREMENT ids are handed out at insert time, not at commit, so on
+MySQL/InnoDB a row with a lower id can become visible after a higher one was
+already read. :class:`IdCursor` remembers the ids it skipped over. Until
+those ids show up or ``gap_timeout`` passes (rolled-back inserts never
+show up), the next read starts again below the oldest open gap. Rows it
+has already returned are filtered out, so callers see each row once.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Iterable, List
+
+# A bigger jump (or the first read from 0) is history or a purge, not in-flight transactions.
+_MAX_GAP = 10_000
+
+
+class IdCursor:
+    def __init__(
+        self, last_id: int = 0, *, gap_timeout: float = 10.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.last_id = last_id
+        self.gap_timeout = gap_timeout
+        self._clock = clock
+        self._gaps: Dict[int, float] = {}  # missing id -> when to stop waiting for it
+
+    def floor(self) -> int:
+        """Read rows with ``id > floor()``."""
+
+        if self._gaps:
+            now = self._clock()
+            self._gaps = {gap: until for gap, until in self._gaps.items() if until > now}
+        return min(self._gaps) - 1 if self._gaps else self.last_id
+
+    def accept(self, ids: Iterable[int]) -> List[int]:
+        """The ids, in order, not returned before; skipped ids become gaps."""
+
+        fresh: List[int] = []
+        until = self._clock() + self.gap_timeout
+        for row_id in sorted(ids):
+            if row_id > self.last_id:
+                if self.last_id and row_id - self.last_id - 1 <= _MAX_GAP:
+                    for missing in range(self.last_id + 1, row_id):
+                        self._gaps[missing] = until
+                self.last_id = row_id
+                fresh.append(row_id)
+            elif self._gaps.pop(row_id, None) is not None:
+                fresh.append(row_id)
+        return fresh
+
+    @property
+    def open_gaps(self) -> int:
+        return len(self._gaps)
+
+
+__all__ = ["IdCursor"]
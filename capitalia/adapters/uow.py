@@ -1,21 +1,35 @@
 from __future__ import annotations
 
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from ..ports.unit_of_work import UnitOfWork
 
 
 class SqlUnitOfWork(UnitOfWork):
-    def __init__(self, conn_factory: Callable[[], Any], repo_factory: Callable[[Any], Any]):
+    def __init__(
+        self,
+        conn_factory: Callable[[], Any],
+        repo_factory: Callable[[Any], Any],
+        counters_factory: Optional[Callable[[Any], Any]] = None,
+        outbox_factory: Optional[Callable[[Any], Any]] = None,
+    ):
         self._conn_factory = conn_factory
         self._repo_factory = repo_factory
+        self._counters_factory = counters_factory
+        self._outbox_factory = outbox_factory
         self.conn = None
         self.users = None
+        self.counters = None
+        self.outbox = None
 
     def __enter__(self):
         self.conn = self._conn_factory()
         self.begin()
         self.users = self._repo_factory(self.conn)
+        if self._counters_factory is not None:
+            self.counters = self._counters_factory(self.conn)
+        if self._outbox_factory is not None:
+            self.outbox = self._outbox_factory(self.conn)
         return self
 
     def __exit__(self, exc_type, exc, tb):
@@ -31,6 +45,8 @@ class SqlUnitOfWork(UnitOfWork):
             finally:
                 self.conn = None
                 self.users = None
+                self.counters = None
+                self.outbox = None
 
     def begin(self) -> None:
         # compatible with sqlite and mysql
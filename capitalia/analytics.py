@@ -0,0 +1,182 @@
+"""Vectorized subscription analytics over the whole user population.
+
+The plan/status/start_date columns are loaded into NumPy arrays (from the
+database or, much faster, straight from the status index file via
+``np.memmap``) and the ``ActiveState.evaluate`` rule is applied to every
+user at once:
+
+    effective = expired  if status == active and plan == trial
+                         and start_date + TRIAL_DAYS <= as_of
+                else status
+
+NumPy is only needed by this module (``pip install numpy``).
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .adapters.status_index import HEADER_SIZE, RECORD_SIZE, read_header
+from .domain.models import Plan, Status
+
+
+TRIAL_DAYS = 30  # keep in sync with ActiveState.evaluate_fields
+FETCH_SIZE = 50_000
+
+_INDEX_DTYPE = np.dtype([("ordinal", "<i4"), ("plan", "u1"), ("status", "u1"), ("pad", "V2")])
+_PLAN_CODES = {plan.value: plan.code for plan in Plan}
+_STATUS_CODES = {status.value: status.code for status in Status}
+
+
+@dataclass
+class StatusColumns:
+    plan: np.ndarray  # uint8 Plan codes
+    status: np.ndarray  # uint8 Status codes (as persisted)
+    start: np.ndarray  # int32 start_date ordinals
+
+    def __len__(self) -> int:
+        return len(self.plan)
+
+
+def columns_from_rows(rows: Iterable[Sequence[Any]], *, chunk_size: int = FETCH_SIZE) -> StatusColumns:
+    """Build columns from ``(plan, status, start_date)`` rows, chunk by chunk."""
+
+    plans, statuses, starts = [], [], []
+    chunk: list = []
+
+    def flush() -> None:
+        if not chunk:
+            return
+        plans.append(np.fromiter((_PLAN_CODES[r[0]] for r in chunk), dtype=np.uint8, count=len(chunk)))
+        statuses.append(np.fromiter((_STATUS_CODES[r[1]] for r in chunk), dtype=np.uint8, count=len(chunk)))
+        starts.append(
+            np.fromiter(
+                ((date.fromisoformat(r[2]) if isinstance(r[2], str) else r[2]).toordinal() for r in chunk),
+                dtype=np.int32,
+                count=len(chunk),
+            )
+        )
+        chunk.clear()
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    if not plans:
+        return StatusColumns(np.zeros(0, np.uint8), np.zeros(0, np.uint8), np.zeros(0, np.int32))
+    return StatusColumns(np.concatenate(plans), np.concatenate(statuses), np.concatenate(starts))
+
+
+def load_columns(conn: Any, kind: str) -> StatusColumns:
+    """Stream the three columns from a SQLite/MySQL connection."""
+
+    query = "SELECT plan, status, start_date FROM users"
+    if kind == "mysql":
+        import pymysql
+
+        cur = conn.cursor(pymysql.cursors.SSCursor)
+    else:
+        cur = conn.cursor()
+    try:
+        cur.execute(query)
+        return columns_from_rows(cur)
+    finally:
+        cur.close()
+
+
+def concat_columns(parts: Sequence[StatusColumns]) -> StatusColumns:
+    if len(parts) == 1:
+        return parts[0]
+    return StatusColumns(
+        np.concatenate([p.plan for p in parts]),
+        np.concatenate([p.status for p in parts]),
+        np.concatenate([p.start for p in parts]),
+    )
+
+
+class IncompleteIndexError(ValueError):
+    """The status index was never fully rebuilt, so it may miss users."""
+
+
+def index_is_complete(path: str) -> bool:
+    try:
+        return read_header(path)[1] > 0
+    except (OSError, ValueError):
+        return False
+
+
+def load_columns_from_index(path: str) -> StatusColumns:
+    """Map a status index file; only the present uids are copied out.
+
+    Raises :class:`IncompleteIndexError` unless the file records a completed
+    full rebuild: a partially filled index would silently undercount.
+    """
+
+    if not index_is_complete(path):
+        raise IncompleteIndexError(
+            f"{path} has no completed rebuild; run python -m capitalia.scripts.status_index"
+        )
+    if os.path.getsize(path) <= HEADER_SIZE:
+        return columns_from_rows([])
+    records = np.memmap(path, dtype=_INDEX_DTYPE, mode="r", offset=HEADER_SIZE)
+    assert records.dtype.itemsize == RECORD_SIZE
+    present = records[records["plan"] != 0]
+    return StatusColumns(present["plan"].copy(), present["status"].copy(), present["ordinal"].copy())
+
+
+def effective_status(cols: StatusColumns, as_of: date) -> np.ndarray:
+    expired = (
+        (cols.status == Status.ACTIVE.code)
+        & (cols.plan == Plan.TRIAL.code)
+        & (cols.start + TRIAL_DAYS <= as_of.toordinal())
+    )
+    return np.where(expired, np.uint8(Status.EXPIRED.code), cols.status)
+
+
+def status_mix(cols: StatusColumns, as_of: date) -> Dict[str, Dict[str, int]]:
+    """Effective ``{plan: {status: count}}`` as of ``as_of``."""
+
+    width = max(s.code for s in Status) + 1
+    effective = effective_status(cols, as_of)
+    counts = np.bincount(cols.plan.astype(np.int64) * width + effective, minlength=(max(p.code for p in Plan) + 1) * width)
+    return {plan.value: {status.value: int(counts[plan.code * width + status.code]) for status in Status} for plan in Plan}
+
+
+def trial_expiry_forecast(cols: StatusColumns, today: date, days: int) -> Dict[str, int]:
+    """Trials still active today that expire on each of the next ``days`` days."""
+
+    first = today.toordinal() + 1
+    expires = cols.start.astype(np.int64) + TRIAL_DAYS
+    pending = (cols.plan == Plan.TRIAL.code) & (cols.status == Status.ACTIVE.code) & (expires >= first)
+    offsets = expires[pending] - first
+    counts = np.bincount(offsets[offsets < days], minlength=days)
+    return {(today + timedelta(days=i + 1)).isoformat(): int(counts[i]) for i in range(days)}
+
+
+def report(cols: StatusColumns, as_of: date, days: int = 30, today: Optional[date] = None) -> Dict[str, Any]:
+    today = today or as_of
+    return {
+        "users": len(cols),
+        "as_of": as_of.isoformat(),
+        "status_mix": status_mix(cols, as_of),
+        "trial_expirations": trial_expiry_forecast(cols, today, days),
+    }
+
+
+__all__ = [
+    "StatusColumns",
+    "columns_from_rows",
+    "concat_columns",
+    "effective_status",
+    "load_columns",
+    "load_columns_from_index",
+    "report",
+    "status_mix",
+    "trial_expiry_forecast",
+]
@@ -5,7 +5,7 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Dict, Any
 
-from ..adapters.jwt_auth import verify as jwt_verify
+from ..adapters.jwt_auth import TokenCodec
 
 
 class AuthStrategy(ABC):
@@ -26,7 +26,7 @@ class JwtAuthStrategy(AuthStrategy):
     """Authenticates requests using JWT tokens signed with HS256."""
 
     def __init__(self, secret: str) -> None:
-        self._secret = secret
+        self._codec = TokenCodec(secret)
 
     def authenticate(self, token: str) -> Dict[str, Any]:  # noqa: D401 - short delegate
-        return jwt_verify(token, self._secret)
+        return self._codec.verify(token)
@@ -1,21 +1,47 @@
 from __future__ import annotations
 
-import hashlib
 import json
 import re
+import secrets
+import sys
 import time
+from datetime import date
 from http import HTTPStatus
 from typing import Any, Callable, Dict, Iterable, Optional
-
-from ..adapters.jwt_client import JwtTokenClient, TokenIssueError
+from urllib.parse import parse_qs
+
+from ..adapters.idempotency import (
+    IdempotencyCache,
+    IdempotencyConflict,
+    IdempotencyInFlight,
+    StoredResponse,
+    fingerprint,
+    scoped_key,
+)
+from ..adapters.passwords import PasswordHasher, PasswordHasherBusy
+from ..adapters.revocation import RevocationList
+from ..adapters.sharding import ShardMovingError
 from ..domain.errors import NotFoundError, ValidationError
 from ..domain.services import SubscriptionService
+from ..metrics import MetricsRegistry
+from ..ports.auth_issuer import AuthIssuer, TokenIssueError
 from ..ports.clock import RealClock
 from .auth_strategies import AuthStrategy, JwtAuthStrategy
 from .http import Handler, HttpRequest, HttpResponse, RequestContext, Route
+from .streams import StatusStreamHub, same_etag, status_etag
 
 
 JsonDict = Dict[str, Any]
+MAX_FORECAST_DAYS = 366
+MAX_LONG_POLL_WAIT = 60.0
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+LOGIN_TOKEN_TTL = 3600
+
+
+def _value_too_long(exc: Exception) -> bool:
+    """MySQL "Data too long" (error 1406 in strict mode) or the same from another driver."""
+
+    return (bool(exc.args) and exc.args[0] == 1406) or "too long" in str(exc).lower()
 
 
 def make_json_response(status: HTTPStatus | int, data: JsonDict) -> HttpResponse:
@@ -116,7 +142,7 @@ class OptionsHandler(AbstractHandler):
         allow_header = ", ".join(sorted(allowed | {"OPTIONS"}))
         headers = {
             "Allow": allow_header,
-            "Access-Control-Allow-Headers": "Authorization, Content-Type",
+            "Access-Control-Allow-Headers": "Authorization, Content-Type, Idempotency-Key",
             "Access-Control-Allow-Methods": ", ".join(sorted(allowed)),
         }
         ctx.response = make_empty_response(HTTPStatus.NO_CONTENT, headers)
@@ -168,9 +194,10 @@ class RoutingHandler(AbstractHandler):
 
 
 class AuthHandler(AbstractHandler):
-    def __init__(self, strategy: AuthStrategy) -> None:
+    def __init__(self, strategy: AuthStrategy, revocations: RevocationList | None = None) -> None:
         super().__init__()
         self._strategy = strategy
+        self._revocations = revocations
 
     def handle(self, ctx: RequestContext) -> HttpResponse:  # noqa: D401
         route = ctx.route
@@ -186,6 +213,9 @@ class AuthHandler(AbstractHandler):
         except Exception as exc:  # noqa: BLE001
             ctx.response = unauthorized(str(exc))
             return ctx.response
+        if self._revocations is not None and self._revocations.is_revoked(ctx.claims):
+            ctx.response = unauthorized("token revogado")
+            return ctx.response
         if route.authorize:
             custom = route.authorize(ctx)
             if custom is not None:
@@ -194,6 +224,57 @@ class AuthHandler(AbstractHandler):
         return self._handle_next(ctx)
 
 
+class IdempotencyHandler(AbstractHandler):
+    """Replays the stored response for a repeated ``Idempotency-Key`` on POST routes.
+
+    Keys are scoped to the token subject and the request path; reusing one
+    with a different body is rejected. Routes with ``idempotency=False``
+    (``/login``) ignore the header, so issued tokens are never kept.
+    """
+
+    def __init__(self, cache: IdempotencyCache) -> None:
+        super().__init__()
+        self._cache = cache
+
+    def handle(self, ctx: RequestContext) -> HttpResponse:  # noqa: D401
+        request = ctx.request
+        key = request.headers.get("idempotency-key")
+        if key is None or request.method != "POST" or ctx.route is None or not ctx.route.idempotency:
+            return self._handle_next(ctx)
+        key = key.strip()
+        if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            ctx.response = bad_request(f"Idempotency-Key deve ter entre 1 e {MAX_IDEMPOTENCY_KEY_LENGTH} caracteres")
+            return ctx.response
+        subject = str(ctx.claims.get("sub")) if ctx.claims else "-"
+        fp = fingerprint(request.method, request.path, request.body)
+
+        def run() -> StoredResponse:
+            response = ctx.response = self._handle_next(ctx)
+            response.ensure_content_length()
+            return StoredResponse(fp, response.status, dict(response.headers), response.body, time.time())
+
+        try:
+            entry, replayed = self._cache.execute(scoped_key(subject, request.method, request.path, key), fp, run)
+        except IdempotencyConflict:
+            ctx.response = json_error(
+                HTTPStatus.UNPROCESSABLE_ENTITY, "Idempotency-Key já utilizada com outra requisição"
+            )
+            return ctx.response
+        except IdempotencyInFlight:
+            ctx.response = json_error(
+                HTTPStatus.CONFLICT,
+                "requisição com a mesma Idempotency-Key ainda em andamento",
+                extra_headers={"Retry-After": "1"},
+            )
+            return ctx.response
+        if not replayed:
+            return ctx.response
+        headers = dict(entry.headers)
+        headers["Idempotent-Replayed"] = "true"
+        ctx.response = HttpResponse(entry.status, headers, entry.body)
+        return ctx.response
+
+
 class HeadHandler(AbstractHandler):
     def handle(self, ctx: RequestContext) -> HttpResponse:  # noqa: D401
         if ctx.request.method != "HEAD":
@@ -221,6 +302,12 @@ class DispatchHandler(AbstractHandler):
             response = json_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(ve))
         except NotFoundError:
             response = not_found()
+        except ShardMovingError:
+            response = json_error(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                "usuário em migração entre shards, tente novamente",
+                extra_headers={"Retry-After": "1"},
+            )
         ctx.response = response
         return response
 
@@ -243,11 +330,29 @@ def build_handler(
     uow_factory,
     jwt_secret: str,
     clock=None,
-    token_client: JwtTokenClient | None = None,
+    token_client: AuthIssuer | None = None,
+    *,
+    read_uow_factory=None,
+    listeners: Iterable[Callable[[Any], None]] = (),
+    metrics: MetricsRegistry | None = None,
+    status_index=None,
+    analytics_report: Optional[Callable[[date, date, int], JsonDict]] = None,
+    stats: Optional[Callable[[], JsonDict]] = None,
+    stream_hub: StatusStreamHub | None = None,
+    idempotency: IdempotencyCache | None = None,
+    password_hasher: PasswordHasher | None = None,
+    revocations: RevocationList | None = None,
 ):
     clock = clock or RealClock()
+    idempotency = idempotency or IdempotencyCache()
+    listeners = list(listeners)
+    if stream_hub is not None:
+        listeners.append(stream_hub.publish)
+    metrics = metrics or MetricsRegistry()
     if token_client is None:
         raise ValueError("token_client is required to issue JWTs")
+    if password_hasher is None:
+        raise ValueError("password_hasher is required to verify logins (see Config.get_password_hasher)")
 
     def read_json(request: HttpRequest) -> JsonDict:
         raw = request.body or b"{}"
@@ -261,7 +366,49 @@ def build_handler(
             raise ValidationError("corpo JSON inválido") from exc
 
     def make_service() -> SubscriptionService:
-        return SubscriptionService(uow_factory, clock)
+        return SubscriptionService(
+            uow_factory,
+            clock,
+            read_uow_factory=read_uow_factory,
+            listeners=listeners,
+            status_index=status_index,
+        )
+
+    if stream_hub is not None:
+        stream_hub.set_refresh(lambda user_id: make_service().read_effective_status(user_id))
+
+    rehash_enabled = True
+
+    def upgrade_password(user, password: str) -> None:
+        """Re-hash with the current scheme; a failure only postpones it to the next login.
+
+        If the column cannot hold the new format (schema before migration 7),
+        upgrades stop for this process instead of re-hashing on every login.
+        """
+        nonlocal rehash_enabled
+        if not rehash_enabled:
+            return
+        try:
+            password_hash, salt = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            return
+        try:
+            with uow_factory() as uow:
+                current = uow.users.get_by_id(user.id)
+                if current is None or current.password_hash != user.password_hash:
+                    return  # changed meanwhile
+                current.password_hash, current.salt = password_hash, salt
+                uow.users.save(current)
+        except Exception as exc:  # noqa: BLE001
+            if _value_too_long(exc):
+                rehash_enabled = False
+                print(
+                    f"[auth] password rehash disabled: users.password_hash cannot hold the new format ({exc!r}); "
+                    "run python -m capitalia.scripts.migrate",
+                    file=sys.stderr,
+                )
+                return
+            print(f"[auth] password rehash failed for user {user.id}: {exc!r}", file=sys.stderr)
 
     def handle_login(ctx: RequestContext) -> HttpResponse:
         content_type = (ctx.request.headers.get("content-type") or "").lower()
@@ -272,30 +419,79 @@ def build_handler(
         password = body.get("password") or ""
         if not email or not password:
             return json_error(HTTPStatus.UNPROCESSABLE_ENTITY, "email e senha são obrigatórios")
+        # Only the lookup runs in a transaction: the hash check and the remote
+        # token call must not pin a DB connection (or SQLite's lock) meanwhile.
         with uow_factory() as uow:
             user = uow.users.get_by_email(email)
-            if not user:
-                return unauthorized("credenciais inválidas")
-            password_hash = hashlib.sha256((user.salt + password).encode()).hexdigest()
-            if password_hash != user.password_hash:
+        if not user:
+            return unauthorized("credenciais inválidas")
+        try:
+            if not password_hasher.verify(password, user.password_hash, user.salt):
                 return unauthorized("credenciais inválidas")
-            try:
-                token = token_client.issue_token(
-                    {"sub": user.id, "email": user.email, "plan": user.plan},
-                    ttl_seconds=3600,
-                )
-            except TokenIssueError as exc:
-                return json_error(HTTPStatus.SERVICE_UNAVAILABLE, str(exc))
+        except PasswordHasherBusy:
+            return json_error(
+                HTTPStatus.SERVICE_UNAVAILABLE, "servidor ocupado, tente novamente", extra_headers={"Retry-After": "1"}
+            )
+        if password_hasher.needs_rehash(user.password_hash):
+            upgrade_password(user, password)
+        try:
+            token = token_client.issue_token(
+                {"sub": user.id, "email": user.email, "plan": user.plan, "jti": secrets.token_urlsafe(12)},
+                ttl_seconds=LOGIN_TOKEN_TTL,
+            )
+        except TokenIssueError as exc:
+            return json_error(HTTPStatus.SERVICE_UNAVAILABLE, str(exc))
         return make_json_response(HTTPStatus.OK, {"token": token})
 
     def handle_health(_: RequestContext) -> HttpResponse:
         return make_json_response(HTTPStatus.OK, {"status": "ok"})
 
+    def handle_metrics(_: RequestContext) -> HttpResponse:
+        return make_json_response(HTTPStatus.OK, metrics.collect())
+
+    def handle_analytics(ctx: RequestContext) -> HttpResponse:
+        query = parse_qs(ctx.request.query)
+        today = clock.today()
+        try:
+            as_of = date.fromisoformat(query["as_of"][0]) if "as_of" in query else today
+            days = int(query.get("days", ["30"])[0])
+        except ValueError:
+            return bad_request("as_of deve ser YYYY-MM-DD e days um inteiro")
+        if not 1 <= days <= MAX_FORECAST_DAYS:
+            return bad_request(f"days deve estar entre 1 e {MAX_FORECAST_DAYS}")
+        return make_json_response(HTTPStatus.OK, analytics_report(as_of, today, days))
+
+    def handle_stats(_: RequestContext) -> HttpResponse:
+        return make_json_response(HTTPStatus.OK, stats())
+
     def handle_get_status(ctx: RequestContext) -> HttpResponse:
         svc = make_service()
         uid = int(ctx.params["uid"])
+        query = parse_qs(ctx.request.query)
+        try:
+            wait = min(float(query["wait"][0]), MAX_LONG_POLL_WAIT) if "wait" in query else 0.0
+        except ValueError:
+            return bad_request("wait deve ser um número de segundos")
         result = svc.read_effective_status(uid)
-        return make_json_response(HTTPStatus.OK, result)
+        etag = status_etag(result)
+        since = query.get("since", [ctx.request.headers.get("if-none-match", "")])[0]
+        if wait > 0 and stream_hub is not None and same_etag(since, etag):
+            # Long-poll: park the connection until the status changes or ``wait`` runs out.
+            if not stream_hub.has_capacity():
+                return json_error(HTTPStatus.SERVICE_UNAVAILABLE, "limite de conexões em espera atingido")
+            return HttpResponse(int(HTTPStatus.OK), detach=lambda conn: stream_hub.wait(conn, result, wait))
+        response = make_json_response(HTTPStatus.OK, result)
+        response.headers["ETag"] = etag
+        return response
+
+    def handle_status_stream(ctx: RequestContext) -> HttpResponse:
+        svc = make_service()
+        uid = int(ctx.params["uid"])
+        result = svc.read_effective_status(uid)
+        if not stream_hub.has_capacity():
+            return json_error(HTTPStatus.SERVICE_UNAVAILABLE, "limite de conexões em espera atingido")
+        last_event_id = ctx.request.headers.get("last-event-id")
+        return HttpResponse(int(HTTPStatus.OK), detach=lambda conn: stream_hub.stream(conn, result, last_event_id))
 
     def handle_upgrade(ctx: RequestContext) -> HttpResponse:
         svc = make_service()
@@ -321,6 +517,33 @@ def build_handler(
         result = svc.reactivate(uid)
         return make_json_response(HTTPStatus.OK, result)
 
+    def handle_logout(ctx: RequestContext) -> HttpResponse:
+        claims = ctx.claims or {}
+        if claims.get("jti") is None:
+            return bad_request("token sem jti não pode ser revogado individualmente")
+        revocations.revoke_token(str(claims["jti"]), float(claims.get("exp") or time.time() + LOGIN_TOKEN_TTL))
+        return make_empty_response(HTTPStatus.NO_CONTENT)
+
+    def handle_revoke(ctx: RequestContext) -> HttpResponse:
+        body = read_json(ctx.request)
+        if not isinstance(body, dict) or ("jti" in body) == ("sub" in body):
+            return json_error(HTTPStatus.UNPROCESSABLE_ENTITY, "informe jti ou sub")
+        try:
+            if "jti" in body:
+                expires_at = float(body.get("exp") or time.time() + LOGIN_TOKEN_TTL)
+                revocations.revoke_token(str(body["jti"]), expires_at)
+                return make_json_response(HTTPStatus.OK, {"jti": str(body["jti"]), "expires_at": expires_at})
+            since = float(body["since"]) if body.get("since") is not None else time.time()
+        except (TypeError, ValueError):
+            return json_error(HTTPStatus.UNPROCESSABLE_ENTITY, "exp e since devem ser timestamps")
+        revocations.revoke_subject(body["sub"], since=since, max_token_ttl=LOGIN_TOKEN_TTL)
+        return make_json_response(HTTPStatus.OK, {"sub": body["sub"], "since": since})
+
+    def require_admin(ctx: RequestContext) -> Optional[HttpResponse]:
+        if not ctx.claims or ctx.claims.get("role") != "admin":
+            return forbidden("acesso restrito a administradores")
+        return None
+
     def ensure_same_user(message: str) -> Callable[[RequestContext], Optional[HttpResponse]]:
         def checker(ctx: RequestContext) -> Optional[HttpResponse]:
             uid = ctx.params.get("uid")
@@ -336,6 +559,14 @@ def build_handler(
 
     routes: list[Route] = [
         Route("health", re.compile(r"^/health$"), {"GET"}, handle_health, requires_auth=False),
+        Route(
+            "metrics",
+            re.compile(r"^/metrics$"),
+            {"GET"},
+            handle_metrics,
+            requires_auth=True,
+            authorize=require_admin,
+        ),
         Route(
             "get_status",
             re.compile(r"^/user/(?P<uid>\d+)/status$"),
@@ -344,7 +575,7 @@ def build_handler(
             requires_auth=True,
             authorize=ensure_same_user("não é possível acessar o status de outro usuário"),
         ),
-        Route("login", re.compile(r"^/login$"), {"POST"}, handle_login, requires_auth=False),
+        Route("login", re.compile(r"^/login$"), {"POST"}, handle_login, requires_auth=False, idempotency=False),
         Route(
             "upgrade",
             re.compile(r"^/user/(?P<uid>\d+)/upgrade$"),
@@ -379,11 +610,61 @@ def build_handler(
         ),
     ]
 
+    if analytics_report is not None:
+        routes.append(
+            Route(
+                "admin_analytics",
+                re.compile(r"^/admin/analytics$"),
+                {"GET"},
+                handle_analytics,
+                requires_auth=True,
+                authorize=require_admin,
+            )
+        )
+
+    if stream_hub is not None:
+        routes.append(
+            Route(
+                "status_stream",
+                re.compile(r"^/user/(?P<uid>\d+)/status/stream$"),
+                {"GET"},
+                handle_status_stream,
+                requires_auth=True,
+                authorize=ensure_same_user("não é possível acessar o status de outro usuário"),
+            )
+        )
+
+    if stats is not None:
+        routes.append(
+            Route(
+                "admin_stats",
+                re.compile(r"^/admin/stats$"),
+                {"GET"},
+                handle_stats,
+                requires_auth=True,
+                authorize=require_admin,
+            )
+        )
+
+    if revocations is not None:
+        routes.append(Route("logout", re.compile(r"^/logout$"), {"POST"}, handle_logout, requires_auth=True))
+        routes.append(
+            Route(
+                "admin_revocations",
+                re.compile(r"^/admin/revocations$"),
+                {"POST"},
+                handle_revoke,
+                requires_auth=True,
+                authorize=require_admin,
+            )
+        )
+
     logging_handler = LoggingHandler()
     error_handler = ErrorHandler()
     options_handler = OptionsHandler(routes)
     routing_handler = RoutingHandler(routes)
-    auth_handler = AuthHandler(JwtAuthStrategy(jwt_secret))
+    auth_handler = AuthHandler(JwtAuthStrategy(jwt_secret), revocations)
+    idempotency_handler = IdempotencyHandler(idempotency)
     head_handler = HeadHandler()
     dispatch_handler = DispatchHandler()
 
@@ -391,7 +672,8 @@ def build_handler(
     error_handler.set_next(options_handler)
     options_handler.set_next(routing_handler)
     routing_handler.set_next(auth_handler)
-    auth_handler.set_next(head_handler)
+    auth_handler.set_next(idempotency_handler)
+    idempotency_handler.set_next(head_handler)
     head_handler.set_next(dispatch_handler)
 
     return RequestProcessor(logging_handler)
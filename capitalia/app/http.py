@@ -7,7 +7,7 @@ building blocks necessary to implement our own handler chain.
 """
 
 from dataclasses import dataclass, field
-from typing import Callable, Dict, Optional, Pattern, Tuple
+from typing import Any, Callable, Dict, Optional, Pattern, Tuple
 
 
 @dataclass(slots=True)
@@ -30,6 +30,9 @@ class HttpResponse:
     status: int
     headers: Dict[str, str] = field(default_factory=dict)
     body: bytes = b""
+    # Long-lived responses (SSE, long-poll): the server hands the socket to
+    # this callable instead of writing the response and closing it.
+    detach: Optional[Callable[[Any], None]] = None
 
     def ensure_content_length(self) -> None:
         """Guarantee the ``Content-Length`` header is present."""
@@ -69,6 +72,8 @@ class Route:
     handler: Callable[["RequestContext"], HttpResponse]
     requires_auth: bool = False
     authorize: Optional[Callable[["RequestContext"], Optional[HttpResponse]]] = None
+    # False for routes whose responses carry credentials: they are never stored for replay.
+    idempotency: bool = True
 
 
 __all__ = [
@@ -7,7 +7,7 @@ import socket
 import threading
 from contextlib import suppress
 from http import HTTPStatus
-from typing import Protocol, Tuple
+from typing import Dict, Protocol, Tuple
 from urllib.parse import urlsplit
 
 from .http import HttpRequest, HttpResponse
@@ -40,7 +40,8 @@ def run_server(handler: RequestHandler, port: int, host: str = "0.0.0.0") -> Non
 
 
 def _serve_connection(conn: socket.socket, addr: Tuple[str, int], handler: RequestHandler) -> None:
-    with conn:
+    detached = False
+    try:
         conn.settimeout(30)
         try:
             request = _read_request(conn, addr)
@@ -66,7 +67,15 @@ def _serve_connection(conn: socket.socket, addr: Tuple[str, int], handler: Reque
             response.ensure_content_length()
             response.headers.setdefault("Access-Control-Allow-Origin", "*")
 
+        if response.detach is not None and request.method != "HEAD":
+            # The callee owns the socket from here on; this thread is released.
+            response.detach(conn)
+            detached = True
+            return
         _send_response(conn, request, response)
+    finally:
+        if not detached:
+            conn.close()
 
 
 def _read_request(conn: socket.socket, addr: Tuple[str, int]) -> HttpRequest | None:
@@ -128,18 +137,22 @@ def _read_request(conn: socket.socket, addr: Tuple[str, int]) -> HttpRequest | N
     )
 
 
-def _send_response(conn: socket.socket, request: HttpRequest, response: HttpResponse) -> None:
-    response.headers.setdefault("Connection", "close")
-    response.ensure_content_length()
+def encode_head(status: int, headers: Dict[str, str]) -> bytes:
+    """Status line plus header block, terminated by the blank line."""
+
     try:
-        reason = HTTPStatus(response.status).phrase
+        reason = HTTPStatus(status).phrase
     except ValueError:
         reason = "OK"
-    status_line = f"HTTP/1.1 {int(response.status)} {reason}\r\n"
-    header_lines = "".join(f"{name.title()}: {value}\r\n" for name, value in response.headers.items())
-    conn.sendall(status_line.encode("iso-8859-1"))
-    conn.sendall(header_lines.encode("iso-8859-1"))
-    conn.sendall(b"\r\n")
+    status_line = f"HTTP/1.1 {int(status)} {reason}\r\n"
+    header_lines = "".join(f"{name.title()}: {value}\r\n" for name, value in headers.items())
+    return (status_line + header_lines + "\r\n").encode("iso-8859-1")
+
+
+def _send_response(conn: socket.socket, request: HttpRequest, response: HttpResponse) -> None:
+    response.headers.setdefault("Connection", "close")
+    response.ensure_content_length()
+    conn.sendall(encode_head(response.status, response.headers))
     if request.method != "HEAD" and response.body:
         conn.sendall(response.body)
 
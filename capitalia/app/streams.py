@@ -0,0 +1,325 @@
+"""Push delivery of status changes: Server-Sent Events and long-poll.
+
+Handlers answer with a detached response and the server hands the socket
+to :class:`StatusStreamHub`. One hub thread multiplexes every waiting
+connection with :mod:`selectors`. It writes when a user's status changes,
+sends SSE heartbeats, answers long-polls that time out with ``304`` and
+drops clients that hang up. An idle client costs a socket and a small
+record, not a thread.
+
+Changes reach the hub through ``publish`` (a ``SubscriptionService``
+listener, i.e. this node's commits). With the outbox on, every node also
+tails ``subscription_outbox`` (``OutboxTail``) into ``publish_events`` and
+calls :meth:`StatusStreamHub.follow`. From then on the hub takes changes
+only from that feed, in commit order, and ``publish`` just wakes the tail.
+Without the outbox, watchers only see changes made on their own node.
+Trial expiry is lazy, so the hub re-reads
+the status of trial/active watchers every ``recheck_interval`` seconds.
+The read persists the expiry and publishes it like any other change.
+"""
+
+from __future__ import annotations
+
+import json
+import selectors
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Mapping, Optional, Sequence, Set
+
+from .server import encode_head
+
+
+Snapshot = Mapping[str, Any]
+
+_CORS = {"Access-Control-Allow-Origin": "*", "Cache-Control": "no-cache", "Connection": "close"}
+_RECENT_SIZE = 4096
+_RECENT_WINDOW = 5.0  # seconds a published change may precede the watcher it is for
+_SWEEP_INTERVAL = 0.25
+
+
+def status_etag(snapshot: Snapshot) -> str:
+    """Content-based ETag: equal on every node for the same plan and status."""
+
+    return f'"{snapshot["plan"]}.{snapshot["status"]}"'
+
+
+def same_etag(candidate: Optional[str], etag: str) -> bool:
+    if not candidate:
+        return False
+    return candidate.strip().removeprefix("W/").strip('"') == etag.strip('"')
+
+
+def _snapshot_json(snapshot: Snapshot) -> str:
+    return json.dumps(
+        {"user_id": snapshot["user_id"], "plan": snapshot["plan"], "status": snapshot["status"]},
+        separators=(",", ":"),
+    )
+
+
+def _sse_event(snapshot: Snapshot) -> bytes:
+    return f"id: {status_etag(snapshot).strip(chr(34))}\nevent: status\ndata: {_snapshot_json(snapshot)}\n\n".encode()
+
+
+@dataclass(eq=False)
+class _Watcher:
+    conn: socket.socket
+    user_id: int
+    etag: str
+    sse: bool
+    deadline: float  # long-poll: give up; SSE: next heartbeat
+    recheck_at: Optional[float]  # trial/active: next expiry re-read
+
+
+class StatusStreamHub:
+    def __init__(
+        self,
+        *,
+        heartbeat: float = 15.0,
+        recheck_interval: float = 60.0,
+        max_connections: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.heartbeat = heartbeat
+        self.recheck_interval = recheck_interval
+        self.max_connections = max_connections
+        self._clock = clock
+        self._refresh: Optional[Callable[[int], Any]] = None
+        self._follow: Optional[Callable[[], None]] = None
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._ops: Deque[Callable[[], None]] = deque()
+        self._by_user: Dict[int, Set[_Watcher]] = {}
+        # Changes published just before a watcher for the same user registers
+        # (the handler read the status first) must still reach it.
+        self._recent: "OrderedDict[int, tuple]" = OrderedDict()
+        self._count = 0  # registered or queued watchers
+        self._sse = 0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stream-recheck")
+        self._delivered = 0
+        self._timeouts = 0
+        self._dropped = 0
+
+    # -- wiring -----------------------------------------------------------
+
+    def set_refresh(self, refresh: Callable[[int], Any]) -> None:
+        """``refresh(user_id)`` re-reads (and, if due, expires) a user's status."""
+
+        self._refresh = refresh
+
+    def follow(self, wake: Callable[[], None]) -> None:
+        """Take changes only from an ordered feed into :meth:`publish_events`; ``publish`` calls ``wake``."""
+
+        self._follow = wake
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="status-stream-hub", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def has_capacity(self) -> bool:
+        return self._count < self.max_connections
+
+    # -- producers (any thread) ------------------------------------------
+
+    def publish(self, users: Sequence[Any]) -> None:
+        """``SubscriptionService`` listener."""
+
+        if self._follow is not None:
+            self._follow()  # the change comes back through the feed, in order
+            return
+        snapshots = [{"user_id": u.id, "plan": str(u.plan), "status": str(u.status)} for u in users]
+        self._submit(lambda: self._deliver(snapshots))
+
+    def publish_events(self, events: Sequence[Any]) -> None:
+        """Sink for ``SubscriptionChanged`` events, e.g. from an ``OutboxTail``."""
+
+        snapshots = [{"user_id": e.user_id, "plan": str(e.new_plan), "status": str(e.new_status)} for e in events]
+        self._submit(lambda: self._deliver(snapshots))
+
+    def stream(self, conn: socket.socket, snapshot: Snapshot, last_event_id: Optional[str] = None) -> None:
+        """Take over ``conn`` as an SSE stream starting at ``snapshot``."""
+
+        self._reserve()
+        self._submit(lambda: self._open(conn, snapshot, sse=True, timeout=self.heartbeat, last_event_id=last_event_id))
+
+    def wait(self, conn: socket.socket, snapshot: Snapshot, timeout: float) -> None:
+        """Take over ``conn`` as a long-poll answered on the next change or with 304 after ``timeout``."""
+
+        self._reserve()
+        self._submit(lambda: self._open(conn, snapshot, sse=False, timeout=timeout))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": self._count,
+            "sse": self._sse,
+            "delivered": self._delivered,
+            "long_poll_timeouts": self._timeouts,
+            "dropped": self._dropped,
+        }
+
+    def _reserve(self) -> None:
+        with self._lock:
+            self._count += 1
+
+    def _submit(self, op: Callable[[], None]) -> None:
+        self._ops.append(op)
+        self._wakeup()
+
+    def _wakeup(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # already pending
+
+    # -- hub thread -------------------------------------------------------
+
+    def _open(self, conn: socket.socket, snapshot: Snapshot, *, sse: bool, timeout: float, last_event_id: Optional[str] = None) -> None:
+        conn.setblocking(False)
+        now = self._clock()
+        etag = status_etag(snapshot)
+        watcher = _Watcher(conn, int(snapshot["user_id"]), etag, sse, now + timeout, self._recheck_due(snapshot, now))
+        if sse:
+            head = encode_head(200, {"Content-Type": "text/event-stream", **_CORS})
+            initial = b"" if same_etag(last_event_id, etag) else _sse_event(snapshot)
+            if not self._send(watcher, head + b"retry: 3000\n\n" + initial):
+                return
+        self._selector.register(conn, selectors.EVENT_READ, watcher)
+        self._by_user.setdefault(watcher.user_id, set()).add(watcher)
+        self._sse += sse
+        recent = self._recent.get(watcher.user_id)
+        if recent is not None and now - recent[0] <= _RECENT_WINDOW:
+            self._deliver([recent[1]])
+
+    def _recheck_due(self, snapshot: Snapshot, now: float) -> Optional[float]:
+        if snapshot["plan"] == "trial" and snapshot["status"] == "active":
+            return now + self.recheck_interval
+        return None
+
+    def _deliver(self, snapshots: Sequence[Snapshot]) -> None:
+        now = self._clock()
+        for snapshot in snapshots:
+            etag = status_etag(snapshot)
+            uid = int(snapshot["user_id"])
+            self._recent[uid] = (now, snapshot)
+            self._recent.move_to_end(uid)
+            if len(self._recent) > _RECENT_SIZE:
+                self._recent.popitem(last=False)
+            for watcher in list(self._by_user.get(int(snapshot["user_id"]), ())):
+                if watcher.etag == etag:
+                    continue
+                watcher.etag = etag
+                watcher.recheck_at = self._recheck_due(snapshot, now)
+                if watcher.sse:
+                    self._send(watcher, _sse_event(snapshot))
+                else:
+                    body = _snapshot_json(snapshot).encode()
+                    head = encode_head(
+                        200,
+                        {"Content-Type": "application/json", "Content-Length": str(len(body)), "ETag": etag, **_CORS},
+                    )
+                    if self._send(watcher, head + body):
+                        self._close(watcher)
+                self._delivered += 1
+
+    def _send(self, watcher: _Watcher, data: bytes) -> bool:
+        # Frames are small; a client whose socket buffer is full is too slow to keep.
+        try:
+            sent = watcher.conn.send(data)
+        except OSError:
+            sent = -1
+        if sent != len(data):
+            self._dropped += 1
+            self._close(watcher)
+            return False
+        return True
+
+    def _close(self, watcher: _Watcher) -> None:
+        watchers = self._by_user.get(watcher.user_id)
+        if watchers is not None:
+            watchers.discard(watcher)
+            if not watchers:
+                del self._by_user[watcher.user_id]
+        try:
+            self._selector.unregister(watcher.conn)
+        except (KeyError, ValueError):
+            pass
+        else:
+            self._sse -= watcher.sse
+        watcher.conn.close()
+        with self._lock:
+            self._count -= 1
+
+    def _sweep(self, now: float) -> None:
+        for watchers in list(self._by_user.values()):
+            for watcher in list(watchers):
+                if watcher.recheck_at is not None and now >= watcher.recheck_at and self._refresh is not None:
+                    watcher.recheck_at = now + self.recheck_interval
+                    self._executor.submit(self._recheck, watcher.user_id)
+                if now < watcher.deadline:
+                    continue
+                if watcher.sse:
+                    watcher.deadline = now + self.heartbeat
+                    self._send(watcher, b": keepalive\n\n")
+                else:
+                    head = encode_head(304, {"ETag": watcher.etag, "Content-Length": "0", **_CORS})
+                    self._timeouts += 1
+                    if self._send(watcher, head):
+                        self._close(watcher)
+
+    def _recheck(self, user_id: int) -> None:
+        try:
+            self._refresh(user_id)  # a change is published through the service listeners
+        except Exception as exc:  # noqa: BLE001
+            print(f"[streams] status recheck for user {user_id} failed: {exc!r}", file=sys.stderr)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                watcher = key.data
+                try:
+                    data = watcher.conn.recv(1024)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if not data:  # client went away
+                    self._close(watcher)
+            while self._ops:
+                self._ops.popleft()()
+            now = self._clock()
+            if now - self._last_sweep >= _SWEEP_INTERVAL:
+                self._last_sweep = now
+                self._sweep(now)
+        for watchers in list(self._by_user.values()):
+            for watcher in list(watchers):
+                self._close(watcher)
+
+
+__all__ = ["StatusStreamHub", "same_etag", "status_etag"]
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .models import Plan, Status
+
+
+@dataclass(frozen=True, slots=True)
+class SubscriptionChanged:
+    """A user's (plan, status) moved from ``old_*`` to ``new_*``.
+
+    ``event_id`` is the outbox row id once the event has been stored; ids
+    are per database (per shard when sharded).
+    """
+
+    user_id: int
+    old_plan: Plan
+    new_plan: Plan
+    old_status: Status
+    new_status: Status
+    occurred_at: float
+    event_id: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.event_id,
+            "user_id": self.user_id,
+            "old_plan": self.old_plan.value,
+            "new_plan": self.new_plan.value,
+            "old_status": self.old_status.value,
+            "new_status": self.new_status.value,
+            "occurred_at": self.occurred_at,
+        }
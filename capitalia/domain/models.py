@@ -2,16 +2,50 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date
+from enum import StrEnum
 from typing import Optional
 
-from .user_states import resolve_state_for
+from .errors import ValidationError
 
 
-Plan = str  # 'basic' | 'trial' | 'premium'
-Status = str  # 'active' | 'suspended' | 'expired'
+class _CodedEnum(StrEnum):
+    """String enum whose members also carry a small integer ``code``.
 
+    Members compare equal to their plain string value, so callers and
+    storage layers that still speak strings keep working.
+    """
 
-@dataclass
+    code: int
+
+    def __new__(cls, value: str, code: int):
+        member = str.__new__(cls, value)
+        member._value_ = value
+        member.code = code
+        return member
+
+    @classmethod
+    def from_code(cls, code: int):
+        return _BY_CODE[cls][code]
+
+
+class Plan(_CodedEnum):
+    BASIC = "basic", 1
+    TRIAL = "trial", 2
+    PREMIUM = "premium", 3
+
+
+class Status(_CodedEnum):
+    ACTIVE = "active", 1
+    SUSPENDED = "suspended", 2
+    EXPIRED = "expired", 3
+
+
+_BY_CODE = {enum: {member.code: member for member in enum} for enum in (Plan, Status)}
+_PLANS = {member.value: member for member in Plan}
+_STATUSES = {member.value: member for member in Status}
+
+
+@dataclass(slots=True)
 class User:
     id: Optional[int]
     name: str
@@ -22,6 +56,27 @@ class User:
     start_date: date
     status: Status
 
+    def __post_init__(self) -> None:
+        # Plain strings (rows, JSON, callers) are mapped to the interned members.
+        if type(self.plan) is not Plan:
+            try:
+                self.plan = _PLANS[self.plan]
+            except KeyError:
+                raise ValidationError(f"plano desconhecido '{self.plan}'") from None
+        if type(self.status) is not Status:
+            try:
+                self.status = _STATUSES[self.status]
+            except KeyError:
+                raise ValidationError(f"status desconhecido '{self.status}'") from None
+
+    @classmethod
+    def from_row(cls, row) -> "User":
+        """Build from ``(id, name, email, password_hash, salt, plan, start_date, status)``."""
+        uid, name, email, password_hash, salt, plan, start_date, status = row
+        if type(start_date) is str:
+            start_date = date.fromisoformat(start_date)
+        return cls(uid, name, email, password_hash, salt, plan, start_date, status)
+
     def evaluate_status(self, today: date) -> Status:
         """
         Regras de status:
@@ -30,6 +85,7 @@ class User:
         - premium-> respeita status persistido (active/suspended)
         Retorna o status efetivo (pode ser igual ao atual). Não persiste.
         """
+        from .user_states import resolve_state_for
+
         state = resolve_state_for(self)
         return state.evaluate(self, today)
-
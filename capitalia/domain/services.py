@@ -1,69 +1,187 @@
 from __future__ import annotations
 
-from ..domain.models import User
+import time
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+from ..domain.events import SubscriptionChanged
+from ..domain.models import Plan, Status, User
 from ..domain.user_states import get_user_state
-from ..domain.errors import NotFoundError
+from ..domain.errors import NotFoundError, ValidationError
 from ..ports.unit_of_work import UnitOfWork
 from ..ports.clock import Clock
 
 
+class StatusLookup(Protocol):
+    def get(self, user_id: int) -> Optional[Tuple[str, str, date]]:
+        ...
+
+    def invalidate(self, users: Sequence[User]) -> None:
+        ...
+
+
 class SubscriptionService:
     """Casos de uso com transação por operação (UoW)."""
 
-    def __init__(self, uow_factory, clock: Clock):
+    def __init__(
+        self,
+        uow_factory,
+        clock: Clock,
+        *,
+        read_uow_factory: Optional[Callable[[int], UnitOfWork]] = None,
+        listeners: Iterable[Callable[[Sequence[User]], None]] = (),
+        status_index: Optional[StatusLookup] = None,
+    ):
+        """``read_uow_factory(user_id)`` serves read-only lookups (e.g. a replica);
+        ``listeners`` are called with the users written after each commit;
+        ``status_index`` answers status reads without touching the database;
+        every mutation invalidates the users it wrote."""
         self._uow_factory = uow_factory
+        self._read_uow_factory = read_uow_factory
+        self._listeners = list(listeners)
+        self._status_index = status_index
         self._clock = clock
 
+    def _notify(self, users: Sequence[User]) -> None:
+        if self._status_index is not None:
+            self._status_index.invalidate(users)
+        for listener in self._listeners:
+            listener(users)
+
     def _get_user(self, uow: UnitOfWork, user_id: int) -> User:
         user = uow.users.get_by_id(user_id)
         if not user:
             raise NotFoundError("user not found")
         return user
 
+    @staticmethod
+    def _change(before: Tuple[str, str], user: User, occurred_at: float) -> SubscriptionChanged:
+        return SubscriptionChanged(
+            user.id, Plan(before[0]), Plan(user.plan), Status(before[1]), Status(user.status), occurred_at
+        )
+
+    def _record(self, uow: UnitOfWork, before: Sequence[Tuple[str, str]], after: Sequence[User]) -> None:
+        """Write what derives from the change inside ``uow``'s transaction:
+        plan/status counter deltas and outbox events."""
+        now = time.time()
+        changes = [self._change(old, user, now) for old, user in zip(before, after) if old != (user.plan, user.status)]
+        if not changes:
+            return
+        counters = getattr(uow, "counters", None)
+        if counters is not None:
+            deltas: Dict[Tuple[str, str], int] = {}
+            for change in changes:
+                old, new = (change.old_plan.value, change.old_status.value), (change.new_plan.value, change.new_status.value)
+                deltas[old] = deltas.get(old, 0) - 1
+                deltas[new] = deltas.get(new, 0) + 1
+            counters.apply({key: delta for key, delta in deltas.items() if delta})
+        outbox = getattr(uow, "outbox", None)
+        if outbox is not None:
+            outbox.append(changes)
+
+    @staticmethod
+    def _snapshot(user: User) -> dict:
+        return {"user_id": user.id, "plan": user.plan, "status": user.status}
+
+    def _transition(self, user_id: int, action: str) -> dict:
+        with self._uow_factory() as uow:
+            user = self._get_user(uow, user_id)
+            before = (str(user.plan), str(user.status))
+            state = get_user_state(user.status)
+            getattr(state, action)(user)
+            uow.users.save(user)
+            self._record(uow, [before], [user])
+            uow.commit()
+        self._notify([user])
+        return self._snapshot(user)
+
+    def _transition_many(self, user_ids: Iterable[int], action: str) -> Dict[int, dict]:
+        """Apply ``action`` to every user in one UoW and report per-user outcomes.
+
+        Users that are missing or whose state rejects the transition get an
+        ``{"user_id", "error"}`` entry and are left untouched; the others are
+        written with a single ``save_many`` and one commit.
+        """
+        ids: List[int] = list(dict.fromkeys(user_ids))
+        outcomes: Dict[int, dict] = {}
+        changed: List[User] = []
+        before: List[Tuple[str, str]] = []
+        with self._uow_factory() as uow:
+            users = uow.users.get_many(ids)
+            for uid in ids:
+                user = users.get(uid)
+                if user is None:
+                    outcomes[uid] = {"user_id": uid, "error": "user not found"}
+                    continue
+                state = get_user_state(user.status)
+                previous = (str(user.plan), str(user.status))
+                try:
+                    getattr(state, action)(user)
+                except ValidationError as exc:
+                    outcomes[uid] = {"user_id": uid, "error": str(exc)}
+                    continue
+                changed.append(user)
+                before.append(previous)
+                outcomes[uid] = self._snapshot(user)
+            if changed:
+                uow.users.save_many(changed)
+                self._record(uow, before, changed)
+                uow.commit()
+        if changed:
+            self._notify(changed)
+        return outcomes
+
     def read_effective_status(self, user_id: int) -> dict:
         today = self._clock.today()
+        if self._status_index is not None:
+            entry = self._status_index.get(user_id)
+            if entry is not None:
+                plan, status, start_date = entry
+                effective = get_user_state(status).evaluate_fields(plan, start_date, today)
+                if effective == status:
+                    return {"user_id": user_id, "plan": plan, "status": effective}
+        if self._read_uow_factory is not None:
+            with self._read_uow_factory(user_id) as uow:
+                user = self._get_user(uow, user_id)
+                effective = get_user_state(user.status).evaluate(user, today)
+            if effective == user.status:
+                return {"user_id": user.id, "plan": user.plan, "status": effective}
+            # Persisting the derived status needs the primary; re-read there.
         with self._uow_factory() as uow:
             user = self._get_user(uow, user_id)
             state = get_user_state(user.status)
             effective = state.evaluate(user, today)
-            if effective != user.status:
+            changed = effective != user.status
+            if changed:
+                before = (str(user.plan), str(user.status))
                 user.status = effective
                 uow.users.save(user)
+                self._record(uow, [before], [user])
                 uow.commit()
-            return {"user_id": user.id, "plan": user.plan, "status": effective}
+        if changed:
+            self._notify([user])
+        return {"user_id": user.id, "plan": user.plan, "status": effective}
 
     def upgrade(self, user_id: int) -> dict:
-        with self._uow_factory() as uow:
-            user = self._get_user(uow, user_id)
-            state = get_user_state(user.status)
-            state.upgrade(user)
-            uow.users.save(user)
-            uow.commit()
-            return {"user_id": user.id, "plan": user.plan, "status": user.status}
+        return self._transition(user_id, "upgrade")
 
     def downgrade(self, user_id: int) -> dict:
-        with self._uow_factory() as uow:
-            user = self._get_user(uow, user_id)
-            state = get_user_state(user.status)
-            state.downgrade(user)
-            uow.users.save(user)
-            uow.commit()
-            return {"user_id": user.id, "plan": user.plan, "status": user.status}
+        return self._transition(user_id, "downgrade")
 
     def suspend(self, user_id: int) -> dict:
-        with self._uow_factory() as uow:
-            user = self._get_user(uow, user_id)
-            state = get_user_state(user.status)
-            state.suspend(user)
-            uow.users.save(user)
-            uow.commit()
-            return {"user_id": user.id, "plan": user.plan, "status": user.status}
+        return self._transition(user_id, "suspend")
 
     def reactivate(self, user_id: int) -> dict:
-        with self._uow_factory() as uow:
-            user = self._get_user(uow, user_id)
-            state = get_user_state(user.status)
-            state.reactivate(user)
-            uow.users.save(user)
-            uow.commit()
-            return {"user_id": user.id, "plan": user.plan, "status": user.status}
+        return self._transition(user_id, "reactivate")
+
+    def upgrade_many(self, user_ids: Iterable[int]) -> Dict[int, dict]:
+        return self._transition_many(user_ids, "upgrade")
+
+    def downgrade_many(self, user_ids: Iterable[int]) -> Dict[int, dict]:
+        return self._transition_many(user_ids, "downgrade")
+
+    def suspend_many(self, user_ids: Iterable[int]) -> Dict[int, dict]:
+        return self._transition_many(user_ids, "suspend")
+
+    def reactivate_many(self, user_ids: Iterable[int]) -> Dict[int, dict]:
+        return self._transition_many(user_ids, "reactivate")
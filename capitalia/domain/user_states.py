@@ -5,6 +5,7 @@ from datetime import date, timedelta
 from typing import Dict, TYPE_CHECKING
 
 from .errors import ValidationError
+from .models import Plan, Status
 
 
 if TYPE_CHECKING:
@@ -12,9 +13,13 @@ if TYPE_CHECKING:
 
 
 class UserState(ABC):
-    name: str
+    name: Status
 
-    def evaluate(self, user: "User", today: date) -> str:
+    def evaluate(self, user: "User", today: date) -> Status:
+        return self.evaluate_fields(user.plan, user.start_date, today)
+
+    def evaluate_fields(self, plan: Plan, start_date: date, today: date) -> Status:
+        """Same as :meth:`evaluate` for callers that only hold the raw fields."""
         return self.name
 
     def upgrade(self, user: "User") -> None:
@@ -31,70 +36,65 @@ class UserState(ABC):
 
 
 class ActiveState(UserState):
-    name = "active"
+    name = Status.ACTIVE
 
-    def evaluate(self, user: "User", today: date) -> str:
-        if user.plan == "basic":
+    def evaluate_fields(self, plan: Plan, start_date: date, today: date) -> Status:
+        if plan == Plan.BASIC:
             return self.name
-        if user.plan == "trial":
-            if user.start_date + timedelta(days=30) <= today:
-                return "expired"
+        if plan == Plan.TRIAL:
+            if start_date + timedelta(days=30) <= today:
+                return Status.EXPIRED
             return self.name
         return self.name
 
     def upgrade(self, user: "User") -> None:
-        if user.plan not in ("basic", "trial"):
+        if user.plan not in (Plan.BASIC, Plan.TRIAL):
             raise ValidationError("apenas planos basic ou trial podem atualizar para premium")
-        user.plan = "premium"
-        user.status = "active"
+        user.plan = Plan.PREMIUM
+        user.status = Status.ACTIVE
 
     def downgrade(self, user: "User") -> None:
-        if user.plan != "premium":
+        if user.plan != Plan.PREMIUM:
             raise ValidationError("apenas usuários premium podem realizar downgrade para basic")
-        user.plan = "basic"
-        user.status = "active"
+        user.plan = Plan.BASIC
+        user.status = Status.ACTIVE
 
     def suspend(self, user: "User") -> None:
-        if user.plan != "premium":
+        if user.plan != Plan.PREMIUM:
             raise ValidationError("apenas assinaturas premium podem ser suspensas")
-        user.status = "suspended"
+        user.status = Status.SUSPENDED
 
 
 class SuspendedState(UserState):
-    name = "suspended"
-
-    def evaluate(self, user: "User", today: date) -> str:  # noqa: ARG002
-        return self.name
+    name = Status.SUSPENDED
 
     def downgrade(self, user: "User") -> None:
-        if user.plan != "premium":
+        if user.plan != Plan.PREMIUM:
             raise ValidationError("apenas usuários premium podem realizar downgrade para basic")
-        user.plan = "basic"
-        user.status = "active"
+        user.plan = Plan.BASIC
+        user.status = Status.ACTIVE
 
     def reactivate(self, user: "User") -> None:
-        if user.plan != "premium":
+        if user.plan != Plan.PREMIUM:
             raise ValidationError("somente assinaturas premium suspensas podem ser reativadas")
-        user.status = "active"
+        user.status = Status.ACTIVE
 
 
 class ExpiredState(UserState):
-    name = "expired"
-
-    def evaluate(self, user: "User", today: date) -> str:  # noqa: ARG002
-        return self.name
+    name = Status.EXPIRED
 
     def upgrade(self, user: "User") -> None:
-        if user.plan not in ("basic", "trial"):
+        if user.plan not in (Plan.BASIC, Plan.TRIAL):
             raise ValidationError("apenas planos basic ou trial podem atualizar para premium")
-        user.plan = "premium"
-        user.status = "active"
+        user.plan = Plan.PREMIUM
+        user.status = Status.ACTIVE
 
 
+# Keyed by Status; plain strings hash and compare equal to the members.
 _STATE_REGISTRY: Dict[str, UserState] = {
-    "active": ActiveState(),
-    "suspended": SuspendedState(),
-    "expired": ExpiredState(),
+    Status.ACTIVE: ActiveState(),
+    Status.SUSPENDED: SuspendedState(),
+    Status.EXPIRED: ExpiredState(),
 }
 
 
@@ -106,6 +106,6 @@ def get_user_state(status: str) -> UserState:
 
 
 def resolve_state_for(user: "User") -> UserState:
-    if user.plan in ("basic", "trial"):
-        return _STATE_REGISTRY["active"]
+    if user.plan in (Plan.BASIC, Plan.TRIAL):
+        return _STATE_REGISTRY[Status.ACTIVE]
     return get_user_state(user.status)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import errno
+import sys
 from typing import Iterable
 
+from .adapters.migrations import SchemaOutdatedError
 from .config import Config
-from .adapters.jwt_client import JwtTokenClient
-from .adapters.uow import SqlUnitOfWork
+from .metrics import MetricsRegistry
+from .adapters.outbox import EventBus
 from .app.server import run_server
 from .app.handlers import build_handler
 from .ports.clock import RealClock
@@ -31,16 +33,83 @@ def _run_with_port_pool(handler, host: str, ports: Iterable[int]) -> None:
     raise RuntimeError("No available ports to bind") from last_error
 
 
-def main() -> None:
-    cfg = Config()
-    conn_factory = cfg.get_connection_factory()
-    repo_factory = cfg.get_repo_factory()
+def _analytics_report(cfg: Config):
+    try:
+        from . import analytics
+
+        loader = cfg.get_analytics_loader()
+    except (ImportError, ValueError) as exc:
+        print(f"[server] /admin/analytics disabled: {exc}", file=sys.stderr)
+        return None
+
+    def build(as_of, today, days: int) -> dict:
+        return analytics.report(loader(), as_of, days, today=today)
 
-    def uow_factory():
-        return SqlUnitOfWork(conn_factory, repo_factory)
+    return build
 
-    token_client = JwtTokenClient(cfg.jwt_service_url, timeout=cfg.jwt_service_timeout)
-    handler = build_handler(uow_factory, cfg.jwt_secret, RealClock(), token_client=token_client)
+
+def main() -> None:
+    cfg = Config()
+    try:
+        cfg.check_schema()
+    except SchemaOutdatedError as exc:
+        raise SystemExit(f"[server] {exc}") from None
+    uow_factory = cfg.get_uow_factory()
+    token_client = cfg.get_auth_issuer()
+    metrics = MetricsRegistry()
+    metrics.register("token_client", token_client.stats)
+    replica_router = cfg.get_read_uow_factory()
+    read_uow_factory = replica_router
+    loader = cfg.get_read_loader()
+    if loader is not None:
+        if replica_router is not None:
+            read_uow_factory = loader.wrap(replica_router, route=replica_router.route, open_route=replica_router.open)
+        else:
+            read_uow_factory = loader.wrap(lambda _user_id=None: uow_factory())
+        metrics.register("read_batching", loader.stats)
+    listeners = [replica_router.record_writes] if replica_router else []
+    event_bus = EventBus()
+    relay = cfg.get_outbox_relay(event_bus)
+    if relay is not None:
+        relay.start()
+        listeners.append(relay.notify)
+        metrics.register("outbox", relay.stats)
+    stream_hub = cfg.get_stream_hub()
+    stream_hub.start()
+    metrics.register("streams", stream_hub.stats)
+    tail = cfg.get_outbox_tail(stream_hub.publish_events)
+    if tail is not None:
+        # Every node reads every change (the relay delivers each to one node only).
+        stream_hub.follow(tail.notify)
+        tail.start()
+        metrics.register("outbox_tail", tail.stats)
+    idempotency = cfg.get_idempotency_cache()
+    metrics.register("idempotency", idempotency.stats)
+    password_hasher = cfg.get_password_hasher()
+    metrics.register("passwords", password_hasher.stats)
+    revocations = cfg.get_revocation_list()
+    if revocations is not None:
+        revocations.start()
+        metrics.register("revocations", revocations.stats)
+    status_index = cfg.get_status_index()
+    if status_index is not None:
+        metrics.register("status_index", status_index.stats)
+    handler = build_handler(
+        uow_factory,
+        cfg.jwt_secret,
+        RealClock(),
+        token_client=token_client,
+        read_uow_factory=read_uow_factory,
+        listeners=listeners,
+        metrics=metrics,
+        status_index=status_index,
+        analytics_report=_analytics_report(cfg),
+        stats=cfg.get_counter_mirror().report,
+        stream_hub=stream_hub,
+        idempotency=idempotency,
+        password_hasher=password_hasher,
+        revocations=revocations,
+    )
     _run_with_port_pool(handler, cfg.host, cfg.port_candidates)
 
 
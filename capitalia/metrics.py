@@ -0,0 +1,58 @@
+"""In-process metrics exposed as JSON by ``GET /metrics`` (admin token required).
+
+Components register a provider (a zero-argument callable returning a JSON
+friendly dict) under a name; the endpoint calls every provider on demand.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Any, Callable, Dict, Sequence
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``snapshot()`` reports cumulative ``le`` counts."""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = sorted(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        buckets: Dict[str, int] = {}
+        running = 0
+        for bound, n in zip(self.bounds, counts):
+            running += n
+            buckets[f"{bound:g}"] = running
+        buckets["+Inf"] = running + counts[-1]
+        n = buckets["+Inf"]
+        return {"count": n, "sum": round(total, 6), "mean": round(total / n, 6) if n else 0.0, "buckets": buckets}
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, Any]:
+        return {name: provider() for name, provider in self._providers.items()}
+
+
+__all__ = ["Histogram", "MetricsRegistry"]
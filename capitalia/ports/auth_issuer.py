@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Sequence, Tuple
+
+TokenRequest = Tuple[Dict[str, Any], int]
+
+
+class TokenIssueError(RuntimeError):
+    """Raised when a token cannot be issued."""
+
+
+class AuthIssuer(ABC):
+    """Issues the JWTs handed out by ``/login`` (remote token service or in-process)."""
+
+    @abstractmethod
+    def issue_token(self, claims: Dict[str, Any], ttl_seconds: int = 3600) -> str:
+        ...
+
+    def issue_tokens(self, requests: Sequence[TokenRequest]) -> List[str]:
+        """Tokens for ``(claims, ttl)`` pairs, in order."""
+        return [self.issue_token(claims, ttl) for claims, ttl in requests]
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
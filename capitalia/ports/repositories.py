@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Sequence
 
 from ..domain.models import User
 
@@ -22,3 +22,15 @@ class UserRepository(ABC):
     @abstractmethod
     def save(self, user: User) -> None:
         ...
+
+    @abstractmethod
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        """Load several users at once; missing ids are simply absent from the result."""
+
+    @abstractmethod
+    def add_many(self, users: Sequence[User]) -> List[int]:
+        """Insert ``users`` in bulk, assigning ``user.id`` and returning ids in input order."""
+
+    @abstractmethod
+    def save_many(self, users: Sequence[User]) -> None:
+        """Persist changes to several existing users at once."""
@@ -6,6 +6,11 @@ from typing import Any
 
 class UnitOfWork(ABC):
     users: Any
+    # Optional ``apply(deltas)`` sink for the materialized plan/status counters,
+    # written in the same transaction as ``users``; None when not maintained.
+    counters: Any = None
+    # Optional ``append(events)`` sink for SubscriptionChanged events (outbox).
+    outbox: Any = None
 
     def __enter__(self) -> "UnitOfWork":  # pragma: no cover
         return self
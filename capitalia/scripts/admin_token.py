@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import argparse
+from typing import Optional, Sequence
+
+from ..config import Config
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.admin_token",
+        description="Issue a token with role=admin for the /admin endpoints.",
+    )
+    parser.add_argument("--subject", default="admin", help="value of the sub claim")
+    parser.add_argument("--ttl", type=int, default=3600, help="lifetime in seconds")
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    client = cfg.get_auth_issuer()
+    print(client.issue_token({"sub": args.subject, "role": "admin"}, ttl_seconds=args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from typing import Optional, Sequence
+
+from ..config import Config
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.analytics",
+        description="Status mix and trial-expiry forecast over all users (requires NumPy).",
+    )
+    parser.add_argument("--as-of", type=date.fromisoformat, help="evaluate statuses at this date (default: today)")
+    parser.add_argument("--days", type=int, default=30, help="forecast horizon in days")
+    parser.add_argument("--index", help="read this status index file instead of STATUS_INDEX_PATH/the database")
+    args = parser.parse_args(argv)
+
+    from .. import analytics
+
+    cfg = Config()
+    today = date.today()
+    started = time.perf_counter()
+    try:
+        # An explicit --index must be complete; STATUS_INDEX_PATH falls back to the database.
+        cols = analytics.load_columns_from_index(args.index) if args.index else cfg.get_analytics_loader()()
+    except analytics.IncompleteIndexError as exc:
+        raise SystemExit(f"[analytics] {exc}") from None
+    loaded = time.perf_counter()
+    result = analytics.report(cols, args.as_of or today, args.days, today=today)
+    done = time.perf_counter()
+    print(json.dumps(result, indent=2))
+    print(
+        f"[analytics] {len(cols)} users: load {loaded - started:.3f}s, compute {done - loaded:.3f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
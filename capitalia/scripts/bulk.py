@@ -0,0 +1,320 @@
+"""Streaming bulk import/export of users.
+
+Usage::
+
+    python -m capitalia.scripts.bulk import users.csv
+    cat users.ndjson | python -m capitalia.scripts.bulk import --format ndjson -
+    python -m capitalia.scripts.bulk export --format ndjson --output users.ndjson
+
+Both commands work against whichever backend ``DB_KIND`` selects, every
+shard included, and never hold more than a few chunks of rows in memory.
+The export includes each user's ``id`` for reference; the import ignores
+it and lets the database assign new ids.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import heapq
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import ExitStack
+from datetime import date
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from ..adapters.chunking import chunked
+from ..adapters.passwords import PasswordHasher
+from ..adapters.sharding import ShardMovingError
+from ..config import Config
+from ..domain.models import Plan, Status, User
+
+
+FIELDS = ["id", "name", "email", "password_hash", "salt", "plan", "start_date", "status"]
+PLANS = {plan.value for plan in Plan}
+STATUSES = {status.value for status in Status}
+
+PreparedRow = Tuple[str, str, str, str, str, str, str]
+
+
+def _prepare_row(raw: Dict[str, Any], hasher: PasswordHasher) -> PreparedRow:
+    name = (raw.get("name") or "").strip()
+    email = (raw.get("email") or "").strip()
+    if not name or not email:
+        raise ValueError("name and email are required")
+    plan = (raw.get("plan") or "trial").strip()
+    status = (raw.get("status") or "active").strip()
+    if plan not in PLANS:
+        raise ValueError(f"invalid plan {plan!r}")
+    if status not in STATUSES:
+        raise ValueError(f"invalid status {status!r}")
+    start_date = date.fromisoformat((raw.get("start_date") or date.today().isoformat()).strip())
+
+    password_hash = raw.get("password_hash") or ""
+    salt = raw.get("salt") or ""
+    if not (password_hash and salt):
+        password = raw.get("password") or ""
+        if not password:
+            raise ValueError("password or password_hash+salt is required")
+        password_hash, salt = hasher.hash(password)
+    return (name, email, password_hash, salt, plan, start_date.isoformat(), status)
+
+
+def _prepare_chunk(first_line: int, rows: List[Dict[str, Any]], hasher: PasswordHasher) -> List[PreparedRow]:
+    """Validate and hash one chunk; runs inside the worker pool."""
+
+    prepared: List[PreparedRow] = []
+    for offset, raw in enumerate(rows):
+        try:
+            prepared.append(_prepare_row(raw, hasher))
+        except ValueError as exc:
+            raise ValueError(f"record {first_line + offset}: {exc}") from None
+    return prepared
+
+
+class _InlineExecutor(Executor):
+    """Executor used with ``--workers 0``: runs tasks in the calling thread."""
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        return future
+
+
+def _infer_format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def _read_records(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _open_input(stack: ExitStack, path: str) -> TextIO:
+    if path == "-":
+        return sys.stdin
+    return stack.enter_context(open(path, newline="", encoding="utf-8"))
+
+
+def _open_output(stack: ExitStack, path: str) -> TextIO:
+    if path == "-":
+        return sys.stdout
+    return stack.enter_context(open(path, "w", newline="", encoding="utf-8"))
+
+
+def _is_duplicate(exc: Exception) -> bool:
+    # sqlite3 and pymysql both raise an IntegrityError (the unique email
+    # index); the memory store raises DuplicateEmailError at commit.
+    return type(exc).__name__ in ("IntegrityError", "DuplicateEmailError")
+
+
+def _report(verb: str, rows: int, started: float) -> None:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"[bulk] {verb} {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+
+def import_users(
+    records: Iterable[Dict[str, Any]],
+    conn: Any,
+    repo: Any,
+    *,
+    password_hasher: PasswordHasher,
+    chunk_size: int = 1000,
+    commit_every: int = 10,
+    workers: int = 0,
+    counters: Any = None,
+) -> int:
+    """Insert ``records`` in chunks, hashing passwords in a process pool.
+
+    Plain passwords get ``password_hasher``'s scheme and cost (it runs
+    inline inside each pool process); rows that already carry
+    ``password_hash`` + ``salt`` are kept as they are.
+
+    At most ``2 * workers`` chunks are in flight at any time, so memory stays
+    bounded regardless of input size. Each chunk also bumps ``counters`` (see
+    ``adapters.counters``) in the same transaction. ``conn`` only needs
+    ``commit()``: a connection or a unit of work. Returns the number of
+    inserted users. A duplicate email aborts the import with a ``ValueError``
+    naming its record, like any other rejected row.
+    """
+
+    started = time.perf_counter()
+    total = 0
+    pending_chunks = 0
+    max_in_flight = max(1, workers * 2)
+    in_flight: Deque[Tuple[int, Future]] = deque()
+    uncommitted: List[Tuple[int, str]] = []  # (record, email) since the last commit
+    executor: Executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else _InlineExecutor()
+
+    def duplicate_error(exc: Exception) -> ValueError:
+        # The failed batch may be half-applied; back to the last commit, then
+        # find the first uncommitted row whose email was already taken.
+        conn.rollback()
+        seen = set()
+        for record, email in uncommitted:
+            if email in seen or repo.get_by_email(email) is not None:
+                return ValueError(f"record {record}: email {email!r} already exists")
+            seen.add(email)
+        return ValueError(f"duplicate email: {exc}")
+
+    def commit() -> None:
+        try:
+            conn.commit()
+        except Exception as exc:  # noqa: BLE001
+            if not _is_duplicate(exc):
+                raise
+            raise duplicate_error(exc) from None
+        uncommitted.clear()
+
+    def drain_one() -> None:
+        nonlocal total, pending_chunks
+        line, future = in_flight.popleft()
+        prepared = future.result()
+        uncommitted.extend((line + offset, row[1]) for offset, row in enumerate(prepared))
+        try:
+            repo.add_many(
+                [
+                    User(None, name, email, pw_hash, salt, plan, date.fromisoformat(start), status)
+                    for name, email, pw_hash, salt, plan, start, status in prepared
+                ]
+            )
+        except Exception as exc:  # noqa: BLE001
+            if not _is_duplicate(exc):
+                raise
+            raise duplicate_error(exc) from None
+        if counters is not None:
+            deltas: Dict[Tuple[str, str], int] = {}
+            for _, _, _, _, plan, _, status in prepared:
+                deltas[plan, status] = deltas.get((plan, status), 0) + 1
+            counters.apply(deltas)
+        total += len(prepared)
+        pending_chunks += 1
+        if pending_chunks >= commit_every:
+            commit()
+            pending_chunks = 0
+            _report("imported", total, started)
+
+    with executor:
+        line = 1
+        for chunk in chunked(records, chunk_size):
+            in_flight.append((line, executor.submit(_prepare_chunk, line, chunk, password_hasher)))
+            line += len(chunk)
+            if len(in_flight) >= max_in_flight:
+                drain_one()
+        while in_flight:
+            drain_one()
+    commit()
+    _report("imported", total, started)
+    return total
+
+
+def _stream_rows(conn: Any, kind: str, fields: Sequence[str] = FIELDS) -> Iterator[Sequence[Any]]:
+    query = f"SELECT {', '.join(fields)} FROM users ORDER BY id"
+    if kind == "mysql":
+        import pymysql
+
+        # Unbuffered server-side cursor: rows arrive as we iterate instead of
+        # being materialised client-side by fetchall().
+        cur = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cur.execute(query)
+            yield from cur
+        finally:
+            cur.close()
+        return
+    yield from conn.execute(query)
+
+
+def export_users(conns: Sequence[Any], kind: str, stream: TextIO, fmt: str) -> int:
+    """Write every user of ``conns`` (one per shard) to ``stream`` in global id order."""
+
+    started = time.perf_counter()
+    total = 0
+    writer = csv.writer(stream) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(FIELDS)
+    for row in heapq.merge(*(_stream_rows(conn, kind) for conn in conns), key=lambda r: r[0]):
+        values = [v.isoformat() if isinstance(v, date) else v for v in row]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            stream.write(json.dumps(dict(zip(FIELDS, values)), separators=(",", ":")) + "\n")
+        total += 1
+    stream.flush()
+    _report("exported", total, started)
+    return total
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.bulk",
+        description="Streaming bulk import/export of users.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="import users from CSV/NDJSON")
+    imp.add_argument("path", nargs="?", default="-", help="input file, or - for stdin (default)")
+    imp.add_argument("--format", choices=("csv", "ndjson"), help="input format (inferred from the file name)")
+    imp.add_argument("--chunk-size", type=int, default=1000, help="rows per executemany batch")
+    imp.add_argument("--commit-every", type=int, default=10, help="commit after this many chunks")
+    imp.add_argument("--workers", type=int, default=4, help="password hashing processes (0 = inline)")
+
+    exp = sub.add_parser("export", help="export users as CSV/NDJSON")
+    exp.add_argument("--output", default="-", help="output file, or - for stdout (default)")
+    exp.add_argument("--format", choices=("csv", "ndjson"), help="output format (inferred from the file name)")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _build_parser().parse_args(argv)
+    cfg = Config()
+    kind = cfg.get_strategy()
+    with ExitStack() as stack:
+        if args.command == "import":
+            fmt = _infer_format(args.path, args.format)
+            records = _read_records(_open_input(stack, args.path), fmt)
+            try:
+                # The unit of work routes rows to their shard (and the directory) when sharded.
+                with cfg.get_uow_factory()() as uow:
+                    import_users(
+                        records,
+                        uow,
+                        uow.users,
+                        # The importer's own pool parallelises; each worker hashes inline.
+                        password_hasher=cfg.get_password_hasher(workers=0),
+                        chunk_size=args.chunk_size,
+                        commit_every=args.commit_every,
+                        workers=args.workers,
+                        counters=uow.counters,
+                    )
+            except (ValueError, ShardMovingError) as exc:
+                raise SystemExit(f"[bulk] import aborted: {exc}") from exc
+        else:
+            fmt = _infer_format(args.output, args.format)
+            conns = []
+            try:
+                for factory in cfg.get_user_connection_factories():
+                    conns.append(factory())
+                export_users(conns, kind, _open_output(stack, args.output), fmt)
+            finally:
+                for conn in conns:
+                    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,12 @@
--- DDL for MySQL (8.x)
+-- Generated by `python -m capitalia.scripts.migrate --sql mysql`; do not edit by hand.
+-- Full schema at the latest migration, with its versions recorded in schema_migrations.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(120) NOT NULL,
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS users (
   id INT AUTO_INCREMENT PRIMARY KEY,
   name VARCHAR(100) NOT NULL,
@@ -12,3 +20,79 @@ CREATE TABLE IF NOT EXISTS users (
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
+INSERT INTO schema_migrations (version, name) VALUES (1, 'create_users');
+
+CREATE INDEX idx_users_plan_status_start ON users (plan, status, start_date);
+
+INSERT INTO schema_migrations (version, name) VALUES (2, 'users_plan_status_start_index');
+
+ALTER TABLE users
+  ADD COLUMN trial_expires_on DATE
+    GENERATED ALWAYS AS (IF(plan = 'trial', start_date + INTERVAL 30 DAY, NULL)) STORED,
+  ADD INDEX idx_users_trial_expires_on (trial_expires_on);
+
+INSERT INTO schema_migrations (version, name) VALUES (3, 'users_trial_expires_on');
+
+CREATE TABLE IF NOT EXISTS user_counters (
+  plan ENUM('basic','trial','premium') NOT NULL,
+  status ENUM('active','suspended','expired') NOT NULL,
+  slot TINYINT UNSIGNED NOT NULL DEFAULT 0,
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (plan, status, slot)
+);
+
+INSERT INTO user_counters (plan, status, slot, count)
+SELECT plan, status, 0, COUNT(*) FROM users GROUP BY plan, status;
+
+INSERT INTO schema_migrations (version, name) VALUES (4, 'user_counters');
+
+CREATE TABLE IF NOT EXISTS subscription_outbox (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  user_id INT NOT NULL,
+  old_plan TINYINT UNSIGNED NOT NULL,
+  new_plan TINYINT UNSIGNED NOT NULL,
+  old_status TINYINT UNSIGNED NOT NULL,
+  new_status TINYINT UNSIGNED NOT NULL,
+  occurred_at DOUBLE NOT NULL
+);
+
+INSERT INTO schema_migrations (version, name) VALUES (5, 'subscription_outbox');
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key_hash CHAR(64) PRIMARY KEY,
+  fingerprint CHAR(64) NOT NULL,
+  status SMALLINT UNSIGNED NOT NULL,
+  headers TEXT NOT NULL,
+  body MEDIUMBLOB NOT NULL,
+  created_at DOUBLE NOT NULL,
+  KEY idx_idempotency_keys_created_at (created_at)
+);
+
+INSERT INTO schema_migrations (version, name) VALUES (6, 'idempotency_keys');
+
+ALTER TABLE users MODIFY password_hash VARCHAR(255) NOT NULL;
+
+INSERT INTO schema_migrations (version, name) VALUES (7, 'versioned_password_hashes');
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  kind ENUM('jti','sub') NOT NULL,
+  value VARCHAR(255) NOT NULL,
+  since DOUBLE NULL,
+  expires_at DOUBLE NOT NULL,
+  KEY idx_token_revocations_expires_at (expires_at)
+);
+
+INSERT INTO schema_migrations (version, name) VALUES (8, 'token_revocations');
+
+ALTER TABLE subscription_outbox
+  ADD COLUMN claimed_by VARCHAR(64) NULL,
+  ADD COLUMN claimed_until DOUBLE NULL;
+
+INSERT INTO schema_migrations (version, name) VALUES (9, 'subscription_outbox_leases');
+
+ALTER TABLE subscription_outbox
+  ADD COLUMN delivered_at DOUBLE NULL,
+  ADD INDEX idx_subscription_outbox_delivered_at (delivered_at);
+
+INSERT INTO schema_migrations (version, name) VALUES (10, 'subscription_outbox_delivered_at');
@@ -1,44 +1,22 @@
 from __future__ import annotations
 
-import os
 import sqlite3
+from contextlib import closing
 from pathlib import Path
 
 # Local import via package path
+from ..adapters.migrations import apply_migrations
 from ..config import Config
 
 
-DDL = """
-PRAGMA foreign_keys = ON;
-
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    email TEXT UNIQUE NOT NULL,
-    password_hash TEXT NOT NULL,
-    salt TEXT NOT NULL,
-    plan TEXT NOT NULL CHECK(plan IN ('basic','trial','premium')) DEFAULT 'trial',
-    start_date TEXT NOT NULL,
-    status TEXT NOT NULL CHECK(status IN ('active','suspended','expired')) DEFAULT 'active',
-    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TRIGGER IF NOT EXISTS users_updated_at
-AFTER UPDATE ON users
-FOR EACH ROW
-BEGIN
-  UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
-END;
-"""
-
-
 def main() -> None:
     cfg = Config()
     path = Path(cfg.sqlite_path)
     print(f"[sqlite] initializing at {path}")
-    with sqlite3.connect(path) as conn:
-        conn.executescript(DDL)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        for migration in apply_migrations(conn, "sqlite"):
+            print(f"[sqlite] applied migration {migration.version:04d} {migration.name}")
     print("[sqlite] done")
 
 
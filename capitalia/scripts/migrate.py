@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import argparse
+from typing import Optional, Sequence
+
+from ..adapters.migrations import MIGRATIONS, applied_versions, apply_migrations, render_script
+from ..adapters.sharding import DIRECTORY_MIGRATIONS
+from ..config import Config
+
+SCRIPT_HEADER = (
+    "-- Generated by `python -m capitalia.scripts.migrate --sql {kind}`; do not edit by hand.\n"
+    "-- Full schema at the latest migration, with its versions recorded in schema_migrations.\n\n"
+)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.migrate",
+        description="Apply pending schema migrations to the configured database (and every shard).",
+    )
+    parser.add_argument("--target", type=int, help="stop after this version (default: latest)")
+    parser.add_argument("--list", action="store_true", help="show migration status and exit")
+    parser.add_argument(
+        "--sql",
+        choices=("sqlite", "mysql"),
+        help="print every migration as one SQL script for this dialect and exit (see scripts/init_mysql.sql)",
+    )
+    args = parser.parse_args(argv)
+    if args.sql:
+        print(SCRIPT_HEADER.format(kind=args.sql) + render_script(args.sql), end="")
+        return
+
+    cfg = Config()
+    kind = cfg.get_strategy()
+    # Sharded: the main database keeps the directory plus the shared tables
+    # (revocations, idempotency) and every shard holds its own users.
+    targets = [("main", cfg.get_connection_factory())]
+    if cfg.is_sharded():
+        targets += [(f"shard {n}", factory) for n, factory in enumerate(cfg.get_shard_connection_factories())]
+    for label, factory in targets:
+        prefix = f"[migrate] {label}: " if len(targets) > 1 else "[migrate] "
+        conn = factory()
+        try:
+            if args.list:
+                if len(targets) > 1:
+                    print(f"{label}:")
+                done = applied_versions(conn, kind)
+                for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+                    mark = "x" if migration.version in done else " "
+                    print(f"[{mark}] {migration.version:04d} {migration.name}")
+                continue
+            applied = apply_migrations(conn, kind, target=args.target)
+            if label == "main" and cfg.is_sharded():
+                apply_migrations(
+                    conn, kind, migrations=DIRECTORY_MIGRATIONS, version_table="directory_migrations"
+                )
+        finally:
+            conn.close()
+
+        for migration in applied:
+            print(f"{prefix}applied {migration.version:04d} {migration.name}")
+        if not applied:
+            print(f"{prefix}{kind} schema is up to date")
+
+if __name__ == "__main__":
+    main()
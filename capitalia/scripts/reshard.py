@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import Counter
+from typing import List, Optional, Sequence
+
+from ..adapters.sharding import DEFAULT_BUCKETS, move_buckets
+from ..config import Config
+
+
+def _parse_buckets(spec: str) -> List[int]:
+    """Parse ``"0-255,512"`` into a list of bucket numbers."""
+
+    buckets: List[int] = []
+    for piece in spec.split(","):
+        piece = piece.strip()
+        if not piece:
+            continue
+        lo, sep, hi = piece.partition("-")
+        if sep:
+            buckets.extend(range(int(lo), int(hi) + 1))
+        else:
+            buckets.append(int(lo))
+    return buckets
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.reshard",
+        description="Manage the bucket -> shard map of a sharded deployment.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    init = sub.add_parser("init", help="create the directory, migrate every shard and seed the bucket map")
+    init.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="virtual buckets (fixed once seeded)")
+    sub.add_parser("status", help="show buckets and users per shard")
+    move = sub.add_parser("move", help="move buckets to another shard online")
+    move.add_argument("--buckets", required=True, help="e.g. 0-255 or 3,7,10-12")
+    move.add_argument("--to", type=int, required=True, dest="target", help="destination shard index")
+    move.add_argument("--batch-size", type=int, default=1000)
+    move.add_argument("--step", type=int, default=16, help="buckets frozen at a time")
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    shard_map = cfg.get_shard_map()
+
+    if args.command == "init":
+        shard_map.initialize(args.buckets)
+        print(f"[reshard] {shard_map.bucket_count} buckets over {len(shard_map.shard_factories)} shards")
+    elif args.command == "status":
+        assignments = shard_map.assignments()
+        per_shard = Counter(shard for shard, _ in assignments)
+        moving = sum(1 for _, state in assignments if state != "active")
+        for index, factory in enumerate(shard_map.shard_factories):
+            conn = factory()
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT COUNT(*) AS n FROM users")
+                row = cur.fetchone()
+                cur.close()
+            finally:
+                conn.close()
+            users = row["n"] if isinstance(row, dict) else row[0]
+            print(f"shard {index}: {per_shard.get(index, 0)} buckets, {users} users")
+        if moving:
+            print(f"{moving} buckets currently moving")
+    else:
+        copied = move_buckets(
+            shard_map,
+            _parse_buckets(args.buckets),
+            args.target,
+            batch_size=args.batch_size,
+            step=args.step,
+            progress=lambda line: print(f"[reshard] {line}", file=sys.stderr),
+        )
+        print(f"[reshard] copied {copied} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,3 +23,8 @@ VALUES (
   'active'
 );
 
+
+-- Keep the materialized plan/status counters in step with the rows above
+DELETE FROM user_counters;
+INSERT INTO user_counters (plan, status, slot, count)
+SELECT plan, status, 0, COUNT(*) FROM users GROUP BY plan, status;
@@ -1,41 +1,47 @@
 from __future__ import annotations
 
-import hashlib
-import secrets
-import sqlite3
+from contextlib import closing
 from datetime import date, timedelta
-from pathlib import Path
 
+from ..adapters.counters import reconcile
+from ..adapters.passwords import PasswordHasher
 from ..config import Config
+from ..domain.models import User
+from ..ports.repositories import UserRepository
 
 
-def seed_user(conn: sqlite3.Connection, name: str, email: str, password: str, plan: str, start_date: date, status: str):
+def seed_user(
+    users: UserRepository,
+    hasher: PasswordHasher,
+    name: str,
+    email: str,
+    password: str,
+    plan: str,
+    start_date: date,
+    status: str,
+):
     """Insert or update the user by email (idempotent)."""
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((salt + password).encode()).hexdigest()
-    conn.execute(
-        """
-        INSERT INTO users (name, email, password_hash, salt, plan, start_date, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(email) DO UPDATE SET
-            name=excluded.name,
-            password_hash=excluded.password_hash,
-            salt=excluded.salt,
-            plan=excluded.plan,
-            start_date=excluded.start_date,
-            status=excluded.status
-        """,
-        (name, email, password_hash, salt, plan, start_date.isoformat(), status),
-    )
+    password_hash, salt = hasher.hash(password)
+    user = users.get_by_email(email)
+    if user is None:
+        users.add(User(None, name, email, password_hash, salt, plan, start_date, status))
+        return
+    user.name, user.password_hash, user.salt = name, password_hash, salt
+    user.plan, user.start_date, user.status = plan, start_date, status
+    users.save(user)
 
 
 def main() -> None:
     cfg = Config()
-    path = Path(cfg.sqlite_path)
-    with sqlite3.connect(path) as conn:
+    if cfg.get_strategy() != "sqlite":
+        raise SystemExit("[sqlite] seed_sqlite requires DB_KIND=sqlite (use scripts/seed_mysql.sql for MySQL)")
+    hasher = cfg.get_password_hasher(workers=0)
+    # Through the unit of work, so each user lands on its shard when sharded.
+    with cfg.get_uow_factory()() as uow:
         # Usuário em trial que começou há 40 dias (irá expirar ao consultar status)
         seed_user(
-            conn,
+            uow.users,
+            hasher,
             name="Alice",
             email="alice@example.com",
             password="password123",
@@ -45,7 +51,8 @@ def main() -> None:
         )
         # Usuário premium ativo
         seed_user(
-            conn,
+            uow.users,
+            hasher,
             name="Bob",
             email="bob@example.com",
             password="password123",
@@ -53,6 +60,9 @@ def main() -> None:
             start_date=date.today(),
             status="active",
         )
+    for factory in cfg.get_user_connection_factories():
+        with closing(factory()) as conn:
+            reconcile(conn)  # writes above bypass the counter deltas
     print("[sqlite] seed completed")
 
 
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from ..adapters.outbox import OutboxTail
+from ..adapters.status_index import StatusIndex
+from ..config import Config
+from ..domain.models import User
+from .bulk import _stream_rows
+
+
+INDEX_FIELDS = ["id", "plan", "status", "start_date"]
+
+
+def _rows(cfg: Config) -> Iterator[Sequence[Any]]:
+    kind = cfg.get_strategy()
+    for factory in cfg.get_user_connection_factories():
+        conn = factory()
+        try:
+            yield from _stream_rows(conn, kind, INDEX_FIELDS)
+        finally:
+            conn.close()
+
+
+def follow(cfg: Config, path: str, *, stop: Optional[threading.Event] = None) -> None:
+    """Rebuild ``path`` and keep applying the outbox to it until ``stop`` is set.
+
+    This process is the only writer of the index; server processes map it
+    read-only and trust it while ``synced_at`` is recent.
+    """
+
+    uow_factory = cfg.get_uow_factory()
+
+    def fetch_many(user_ids: List[int]) -> Dict[int, User]:
+        with uow_factory() as uow:
+            return uow.users.get_many(user_ids)
+
+    index: Optional[StatusIndex] = None
+
+    def sink(events: Sequence[Any]) -> None:
+        index.apply(events, fetch_many)
+
+    tail = OutboxTail(cfg.get_user_connection_factories(), cfg.get_strategy(), sink, batch_size=cfg.outbox_batch_size)
+    # Before the rebuild: changes committed while it runs are replayed on top.
+    tail.seek_to_end()
+    count = StatusIndex.build(path, _rows(cfg))
+    print(f"[status-index] {count} users written to {path}; following the outbox", file=sys.stderr)
+    index = StatusIndex(path)
+    stop = stop or threading.Event()
+    while True:
+        started = time.time()
+        try:
+            tail.poll_once()
+        except Exception as exc:  # noqa: BLE001 - readers fall back to the database meanwhile
+            print(f"[status-index] outbox poll failed: {exc!r}", file=sys.stderr)
+        else:
+            index.mark_synced(started)
+        if stop.wait(cfg.outbox_poll_interval):
+            break
+    index.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m capitalia.scripts.status_index",
+        description="Rebuild the memory-mapped status index from the database.",
+    )
+    parser.add_argument("--output", help="index file (default: STATUS_INDEX_PATH)")
+    parser.add_argument(
+        "--follow", action="store_true", help="after the rebuild, keep the index current from the outbox"
+    )
+    args = parser.parse_args(argv)
+
+    cfg = Config()
+    path = args.output or cfg.status_index_path
+    if not path:
+        parser.error("set STATUS_INDEX_PATH or pass --output")
+    if args.follow:
+        if cfg.get_outbox_factory() is None:
+            parser.error("--follow reads subscription_outbox; set OUTBOX_SINKS (e.g. bus)")
+        follow(cfg, path)
+        return
+    started = time.perf_counter()
+    count = StatusIndex.build(path, _rows(cfg))
+    elapsed = time.perf_counter() - started
+    print(f"[status-index] {count} users written to {path} in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,14 @@ class JwtServiceConfig:
     port: int
     secret: str
     default_ttl: int
+    workers: int = 128
+    backlog: int = 1024
+    keepalive_timeout: float = 15.0
+    shutdown_grace: float = 5.0
+    max_batch: int = 256
+    introspect_cache_size: int = 10_000
+    revocations_db: str = ""
+    revocations_refresh: float = 2.0
 
 
 def load_config() -> JwtServiceConfig:
@@ -17,7 +25,20 @@ def load_config() -> JwtServiceConfig:
     port = int(os.environ.get("JWT_SERVICE_PORT", "8200"))
     secret = os.environ.get("JWT_SECRET", "change-me")
     default_ttl = int(os.environ.get("JWT_DEFAULT_TTL", "3600"))
-    return JwtServiceConfig(host=host, port=port, secret=secret, default_ttl=default_ttl)
+    return JwtServiceConfig(
+        host=host,
+        port=port,
+        secret=secret,
+        default_ttl=default_ttl,
+        workers=int(os.environ.get("JWT_SERVICE_WORKERS", "128")),
+        backlog=int(os.environ.get("JWT_SERVICE_BACKLOG", "1024")),
+        keepalive_timeout=float(os.environ.get("JWT_SERVICE_KEEPALIVE_TIMEOUT", "15")),
+        shutdown_grace=float(os.environ.get("JWT_SERVICE_SHUTDOWN_GRACE", "5")),
+        max_batch=int(os.environ.get("JWT_MAX_BATCH", "256")),
+        introspect_cache_size=int(os.environ.get("JWT_INTROSPECT_CACHE", "10000")),
+        revocations_db=os.environ.get("JWT_REVOCATIONS_DB", ""),
+        revocations_refresh=float(os.environ.get("JWT_REVOCATIONS_REFRESH", "2")),
+    )
 
 
 __all__ = ["JwtServiceConfig", "load_config"]
@@ -0,0 +1,82 @@
+"""Token introspection for services that do not verify HS256 themselves.
+
+:class:`Introspector` verifies a token once and caches the claims until the
+token's ``exp``, in an LRU of ``max_entries``. Repeated checks of the same
+bearer token (one per request in the calling service) then cost a dict
+lookup. Only valid tokens are cached. A bad signature fails before any
+parsing, so there is little to gain by caching failures, and an attacker
+could flood the cache with them.
+
+With a ``revocations`` list (a
+:class:`~capitalia.adapters.revocation.RevocationList` tailing the same
+``token_revocations`` table as the Capitalia instances), every answer,
+cached or not, is checked against it, so a logout or admin revocation turns
+the token inactive within one refresh interval.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .tokens import TokenCodec
+
+
+class Introspector:
+    def __init__(
+        self,
+        codec: TokenCodec,
+        *,
+        max_entries: int = 10_000,
+        revocations: Optional[Any] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._codec = codec
+        self._revocations = revocations
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def introspect(self, token: str) -> Dict[str, Any]:
+        """``{"active": true, "claims": {...}}`` or ``{"active": false, "error": "..."}``."""
+
+        now = self._clock()
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None:
+                if now <= cached[1]:
+                    self._cache.move_to_end(token)
+                    self._hits += 1
+                    return self._answer(cached[0])
+                del self._cache[token]
+            self._misses += 1
+        try:
+            claims = self._codec.verify(token)
+        except ValueError as exc:
+            return {"active": False, "error": str(exc)}
+        exp = float(claims["exp"]) if claims.get("exp") else math.inf
+        if self.max_entries > 0:
+            with self._lock:
+                self._cache[token] = (claims, exp)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return self._answer(claims)
+
+    def _answer(self, claims: Dict[str, Any]) -> Dict[str, Any]:
+        # Revocations can land at any time before exp, so they are never cached.
+        if self._revocations is not None and self._revocations.is_revoked(claims):
+            return {"active": False, "error": "token revoked"}
+        return {"active": True, "claims": claims}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self._hits, "misses": self._misses}
+
+
+__all__ = ["Introspector"]
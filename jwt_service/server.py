@@ -2,17 +2,62 @@ from __future__ import annotations
 
 import json
 import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Optional
+from typing import Any, Deque, Dict, Optional, Set, Tuple
 
-from config import JwtServiceConfig
-from tokens import sign
+from .config import JwtServiceConfig
+from .introspection import Introspector
+from .tokens import TokenCodec, parse_token_request
 
 
 class JwtRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive: backends reuse their connections. Each dispatch serves one
+    # request (plus any the client pipelined); the server then parks the
+    # connection until more bytes arrive. ``timeout`` bounds each read.
+    protocol_version = "HTTP/1.1"
     config: JwtServiceConfig
+    codec: TokenCodec
+    introspector: Introspector
+    server: "TokenHTTPServer"
     logger = logging.getLogger("jwt_service.server")
+    _in_request = False
+
+    def parse_request(self) -> bool:
+        # The request line has arrived: the connection is no longer idle.
+        self._in_request = True
+        self.server.request_started(self.connection)
+        return super().parse_request()
+
+    def handle_one_request(self) -> None:
+        try:
+            super().handle_one_request()
+        finally:
+            if self._in_request:
+                self._in_request = False
+                self.server.request_finished(self.connection)
+
+    def handle(self) -> None:
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._pipelined():
+            self.handle_one_request()
+
+    def _pipelined(self) -> bool:
+        # Bytes already in rfile's buffer are invisible to the server's selector.
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
 
     def do_GET(self) -> None:  # pragma: no cover - simple healthcheck
         if self.path.rstrip("/") == "/health":
@@ -21,7 +66,8 @@ class JwtRequestHandler(BaseHTTPRequestHandler):
         self._write_error(HTTPStatus.NOT_FOUND, "not found")
 
     def do_POST(self) -> None:
-        if self.path.rstrip("/") != "/token":
+        path = self.path.rstrip("/")
+        if path not in ("/token", "/tokens", "/introspect"):
             self._write_error(HTTPStatus.NOT_FOUND, "not found")
             return
 
@@ -38,16 +84,22 @@ class JwtRequestHandler(BaseHTTPRequestHandler):
             self._write_error(HTTPStatus.BAD_REQUEST, "invalid json payload")
             return
 
-        claims = payload.get("claims")
-        if not isinstance(claims, dict):
-            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, "claims must be an object")
+        if path == "/tokens":
+            self._issue_batch(payload)
             return
-
-        ttl = self._coerce_ttl(payload.get("ttl"))
-        if ttl is None:
+        if path == "/introspect":
+            self._introspect(payload)
+            return
+        if not isinstance(payload, dict):
+            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, "payload must be an object")
+            return
+        try:
+            claims, ttl = self._parse_request(payload)
+        except ValueError as exc:
+            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(exc))
             return
 
-        token = sign(claims, self.config.secret, ttl_seconds=ttl)
+        token = self.codec.sign(claims, ttl_seconds=ttl)
         claim_keys = ", ".join(sorted(map(str, claims.keys()))) or "<empty>"
         self.logger.info(
             "issued token for %s (ttl=%s, claim keys=%s)",
@@ -57,27 +109,59 @@ class JwtRequestHandler(BaseHTTPRequestHandler):
         )
         self._write_json(HTTPStatus.OK, {"token": token})
 
+    def _issue_batch(self, payload) -> None:
+        """``{"requests": [{"claims": {...}, "ttl": 900}, ...]}`` -> ``{"tokens": [...]}`` in order."""
+
+        requests = payload.get("requests") if isinstance(payload, dict) else None
+        if not isinstance(requests, list) or not requests:
+            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, "requests must be a non-empty array")
+            return
+        if len(requests) > self.config.max_batch:
+            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"at most {self.config.max_batch} requests per batch")
+            return
+        parsed = []
+        for index, item in enumerate(requests):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("must be an object")
+                parsed.append(self._parse_request(item))
+            except ValueError as exc:
+                self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"requests[{index}]: {exc}")
+                return
+        tokens = [self.codec.sign(claims, ttl_seconds=ttl) for claims, ttl in parsed]
+        self.logger.info("issued %d tokens for %s", len(tokens), self.client_address[0])
+        self._write_json(HTTPStatus.OK, {"tokens": tokens})
+
+    def _introspect(self, payload) -> None:
+        """``{"token": "..."}`` -> one result; ``{"tokens": [...]}`` -> ``{"results": [...]}`` in order."""
+
+        if isinstance(payload, dict) and isinstance(payload.get("token"), str):
+            self._write_json(HTTPStatus.OK, self.introspector.introspect(payload["token"]))
+            return
+        tokens = payload.get("tokens") if isinstance(payload, dict) else None
+        if not isinstance(tokens, list) or not tokens or not all(isinstance(t, str) for t in tokens):
+            self._write_error(
+                HTTPStatus.UNPROCESSABLE_ENTITY, "token must be a string or tokens a non-empty array of strings"
+            )
+            return
+        if len(tokens) > self.config.max_batch:
+            self._write_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"at most {self.config.max_batch} tokens per request")
+            return
+        self._write_json(HTTPStatus.OK, {"results": [self.introspector.introspect(t) for t in tokens]})
+
+    def _parse_request(self, payload: dict) -> Tuple[dict, int]:
+        return parse_token_request(payload, self.config.default_ttl)
+
     def log_message(self, format: str, *args) -> None:  # pragma: no cover - structured logging
         self.logger.info("%s - %s", self.address_string(), format % args)
 
-    def _coerce_ttl(self, raw_ttl) -> Optional[int]:
-        if raw_ttl is None:
-            return self.config.default_ttl
-        try:
-            ttl = int(raw_ttl)
-        except (TypeError, ValueError):
-            self._write_error(HTTPStatus.BAD_REQUEST, "ttl must be an integer")
-            return None
-        if ttl <= 0:
-            self._write_error(HTTPStatus.BAD_REQUEST, "ttl must be positive")
-            return None
-        return ttl
-
-    def _write_json(self, status: HTTPStatus, data) -> None:
+    def _write_json(self, status: HTTPStatus, data, *, close: bool = False) -> None:
         body = json.dumps(data).encode()
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
+        if close or self.server.draining:
+            self.send_header("Connection", "close")
         self.end_headers()
         self.wfile.write(body)
 
@@ -88,13 +172,193 @@ class JwtRequestHandler(BaseHTTPRequestHandler):
             status,
             message,
         )
-        self._write_json(status, {"error": message})
+        # The request body may be unread: do not reuse the connection.
+        self._write_json(status, {"error": message}, close=True)
+
+
+class TokenHTTPServer(HTTPServer):
+    """HTTP server that hands each request to a bounded worker pool.
+
+    Between requests a keep-alive connection is parked in a selector instead
+    of holding a worker, so the idle pools of many backends cost file
+    descriptors, not threads; a parked connection is closed after
+    ``keepalive_timeout`` idle seconds. When ``workers`` dispatches are
+    queued or running the accept loop pauses, and new connections wait in
+    the listen backlog instead of piling up. :meth:`stop` stops accepting,
+    closes idle keep-alive connections right away and lets in-flight
+    requests finish for up to ``grace`` seconds.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        handler_cls: Any,
+        *,
+        workers: int,
+        backlog: int,
+        keepalive_timeout: float = 15.0,
+    ) -> None:
+        self.request_queue_size = backlog
+        self.draining = False
+        self.keepalive_timeout = keepalive_timeout
+        self._workers = workers
+        self._dispatched = 0  # queued or running in the executor
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jwt-worker")
+        self._lock = threading.Condition()
+        self._connections: Set[socket.socket] = set()
+        self._busy: Set[socket.socket] = set()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._parking: Deque[Tuple[socket.socket, Any]] = deque()
+        self._idle: Dict[socket.socket, float] = {}  # parked -> deadline; parker thread only
+        super().__init__(address, handler_cls)
+        self._parker = threading.Thread(target=self._run_parker, name="jwt-keepalive", daemon=True)
+        self._parker.start()
+
+    def finish_request(self, request: socket.socket, client_address: Any) -> Any:
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def process_request(self, request: socket.socket, client_address: Any) -> None:
+        with self._lock:
+            while self._dispatched >= self._workers:
+                if self.draining:
+                    self.shutdown_request(request)
+                    return
+                self._lock.wait(0.5)
+            self._dispatched += 1
+            self._connections.add(request)
+        self._executor.submit(self._serve, request, client_address)
+
+    def _resume(self, request: socket.socket, client_address: Any) -> None:
+        # Not throttled: the connection was already admitted.
+        with self._lock:
+            self._dispatched += 1
+        self._executor.submit(self._serve, request, client_address)
+
+    def _serve(self, request: socket.socket, client_address: Any) -> None:
+        keep_alive = False
+        try:
+            handler = self.finish_request(request, client_address)
+            keep_alive = not handler.close_connection
+        except Exception:  # noqa: BLE001
+            self.handle_error(request, client_address)
+        finally:
+            with self._lock:
+                self._dispatched -= 1
+                self._lock.notify_all()
+                if keep_alive and not self.draining:
+                    self._parking.append((request, client_address))
+                else:
+                    self._connections.discard(request)
+                    keep_alive = False
+            if keep_alive:
+                self._wakeup()
+            else:
+                self.shutdown_request(request)
+
+    def _wakeup(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass  # already pending, or closed by stop()
+
+    def _drop_idle(self, conn: socket.socket) -> None:
+        self._selector.unregister(conn)
+        del self._idle[conn]
+        with self._lock:
+            self._connections.discard(conn)
+        self.shutdown_request(conn)
+
+    def _run_parker(self) -> None:
+        while True:
+            timeout = max(0.0, min(self._idle.values()) - time.monotonic()) if self._idle else None
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                # More bytes (or EOF): hand the connection back to a worker.
+                self._selector.unregister(key.fileobj)
+                del self._idle[key.fileobj]
+                self._resume(key.fileobj, key.data)
+            with self._lock:
+                parked, self._parking = list(self._parking), deque()
+                draining = self.draining
+            deadline = time.monotonic() + self.keepalive_timeout
+            for conn, client_address in parked:
+                self._selector.register(conn, selectors.EVENT_READ, client_address)
+                self._idle[conn] = deadline
+            now = time.monotonic()
+            for conn in [c for c, until in self._idle.items() if draining or until <= now]:
+                self._drop_idle(conn)
+            if draining:
+                return
+
+    def request_started(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._busy.add(conn)
+
+    def request_finished(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._busy.discard(conn)
+            self._lock.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": len(self._connections), "busy": len(self._busy), "idle": len(self._idle)}
+
+    def _close_connections(self, *, idle_only: bool) -> None:
+        with self._lock:
+            conns = [c for c in self._connections if not (idle_only and c in self._busy)]
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # wakes a worker blocked on a keep-alive read
+            except OSError:
+                pass
+
+    def stop(self, grace: float = 5.0) -> None:
+        """Graceful shutdown; call from a thread other than the one in ``serve_forever``."""
+
+        with self._lock:
+            self.draining = True
+        self.shutdown()
+        self._wakeup()
+        self._parker.join()  # closes the parked keep-alive connections
+        self._close_connections(idle_only=True)
+        deadline = time.monotonic() + grace
+        with self._lock:
+            while self._busy and time.monotonic() < deadline:
+                self._lock.wait(deadline - time.monotonic())
+        # Answered requests closed their connections; anything left overran the grace period.
+        self._close_connections(idle_only=False)
+        self._executor.shutdown(wait=True)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        self.server_close()
 
 
-def create_server(config: JwtServiceConfig) -> HTTPServer:
+def create_server(config: JwtServiceConfig, *, revocations: Optional[Any] = None) -> TokenHTTPServer:
     handler_cls = type("ConfiguredJwtRequestHandler", (JwtRequestHandler,), {})
     handler_cls.config = config
-    return HTTPServer((config.host, config.port), handler_cls)
+    handler_cls.codec = TokenCodec(config.secret)
+    handler_cls.introspector = Introspector(
+        handler_cls.codec, max_entries=config.introspect_cache_size, revocations=revocations
+    )
+    handler_cls.timeout = config.keepalive_timeout
+    return TokenHTTPServer(
+        (config.host, config.port),
+        handler_cls,
+        workers=config.workers,
+        backlog=config.backlog,
+        keepalive_timeout=config.keepalive_timeout,
+    )
 
 
-__all__ = ["create_server", "JwtRequestHandler"]
+__all__ = ["create_server", "JwtRequestHandler", "TokenHTTPServer"]
@@ -1,54 +1,106 @@
+"""HS256 JWT signing and verification.
+
+:class:`TokenCodec` does the work for one secret. It encodes the constant
+header segment once, keys an HMAC once and ``copy()``s it per token, and on
+verify checks the signature before decoding anything. The module-level
+:func:`sign`/:func:`verify` keep their old signatures and reuse a cached
+codec per secret.
+"""
+
 from __future__ import annotations
 
 import base64
+import binascii
 import hmac
 import json
 import time
+from functools import lru_cache
 from hashlib import sha256
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Tuple
+
+_HEADER = {"alg": "HS256", "typ": "JWT"}
+_encode_json = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class TokenCodec:
+    def __init__(self, secret: str, *, clock: Callable[[], float] = time.time) -> None:
+        self._prefix = _b64url(_encode_json(_HEADER).encode()) + b"."
+        self._mac = hmac.new(secret.encode(), digestmod=sha256)
+        self._clock = clock
 
+    def _signature(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
 
-def _b64url(data: bytes) -> str:
-    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    def sign(self, payload: Dict[str, Any], ttl_seconds: int = 3600) -> str:
+        now = int(self._clock())
+        body = dict(payload)
+        body.setdefault("iat", now)
+        body.setdefault("exp", now + ttl_seconds)
+        signing_input = self._prefix + _b64url(_encode_json(body).encode())
+        return (signing_input + b"." + _b64url(self._signature(signing_input))).decode()
 
+    def verify(self, token: str) -> Dict[str, Any]:
+        raw = token.encode()
+        signing_input, dot, sig_b64 = raw.rpartition(b".")
+        if not dot or signing_input.count(b".") != 1:
+            raise ValueError("invalid token format")
+        try:
+            actual = _b64url_decode(sig_b64)
+        except binascii.Error:
+            raise ValueError("invalid signature") from None
+        if not hmac.compare_digest(self._signature(signing_input), actual):
+            raise ValueError("invalid signature")
+        try:
+            payload = json.loads(_b64url_decode(signing_input.partition(b".")[2]))
+        except (binascii.Error, ValueError):
+            raise ValueError("invalid token payload") from None
+        if not isinstance(payload, dict):
+            raise ValueError("invalid token payload")
+        exp = int(payload.get("exp", 0))
+        if exp and int(self._clock()) > exp:
+            raise ValueError("token expired")
+        return payload
 
-def _b64url_decode(data: str) -> bytes:
-    pad = "=" * (-len(data) % 4)
-    return base64.urlsafe_b64decode(data + pad)
+
+def parse_token_request(payload: Dict[str, Any], default_ttl: int) -> Tuple[Dict[str, Any], int]:
+    """``{"claims": {...}, "ttl": 900}`` -> ``(claims, ttl)``; raises ValueError with the client-facing message."""
+
+    claims = payload.get("claims")
+    if not isinstance(claims, dict):
+        raise ValueError("claims must be an object")
+    raw_ttl = payload.get("ttl")
+    if raw_ttl is None:
+        return claims, default_ttl
+    try:
+        ttl = int(raw_ttl)
+    except (TypeError, ValueError):
+        raise ValueError("ttl must be an integer") from None
+    if ttl <= 0:
+        raise ValueError("ttl must be positive")
+    return claims, ttl
+
+
+@lru_cache(maxsize=32)
+def _codec(secret: str) -> TokenCodec:
+    return TokenCodec(secret)
 
 
 def sign(payload: Dict[str, Any], secret: str, ttl_seconds: int = 3600) -> str:
-    header = {"alg": "HS256", "typ": "JWT"}
-    now = int(time.time())
-    body = dict(payload)
-    if "iat" not in body:
-        body["iat"] = now
-    if "exp" not in body:
-        body["exp"] = now + ttl_seconds
-
-    header_b64 = _b64url(json.dumps(header, separators=(",", ":")).encode())
-    payload_b64 = _b64url(json.dumps(body, separators=(",", ":")).encode())
-    signing_input = f"{header_b64}.{payload_b64}".encode()
-    signature = hmac.new(secret.encode(), signing_input, sha256).digest()
-    sig_b64 = _b64url(signature)
-    return f"{header_b64}.{payload_b64}.{sig_b64}"
+    return _codec(secret).sign(payload, ttl_seconds)
 
 
 def verify(token: str, secret: str) -> Dict[str, Any]:
-    try:
-        header_b64, payload_b64, sig_b64 = token.split(".")
-    except ValueError as exc:
-        raise ValueError("invalid token format") from exc
-    signing_input = f"{header_b64}.{payload_b64}".encode()
-    expected = hmac.new(secret.encode(), signing_input, sha256).digest()
-    actual = _b64url_decode(sig_b64)
-    if not hmac.compare_digest(expected, actual):
-        raise ValueError("invalid signature")
-    payload = json.loads(_b64url_decode(payload_b64))
-    exp = int(payload.get("exp", 0))
-    if exp and int(time.time()) > exp:
-        raise ValueError("token expired")
-    return payload
-
-
-__all__ = ["sign", "verify"]
+    return _codec(secret).verify(token)
+
+
+__all__ = ["TokenCodec", "parse_token_request", "sign", "verify"]
@@ -1,18 +1,25 @@
+import http.client
 import http.server
 import os
+import socket
 import socketserver
 import threading
 import time
-import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Callable, List
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
 
 BACKEND_HOST = os.environ.get("BACKEND_HOST", "127.0.0.1")
 ROUTER_PORT = int(os.environ.get("ROUTER_PORT", "80"))
 BACKEND_TIMEOUT = float(os.environ.get("BACKEND_TIMEOUT", "10"))
+# Idle read timeout for SSE streams; must exceed the backend heartbeat (STREAM_HEARTBEAT).
+STREAM_TIMEOUT = float(os.environ.get("STREAM_TIMEOUT", "60"))
+MAX_LONG_POLL_WAIT = 60.0
 DISCOVERY_INTERVAL = float(os.environ.get("BACKEND_DISCOVERY_INTERVAL", "2"))
 HEALTH_PATH = os.environ.get("BACKEND_HEALTH_PATH", "/health")
+# Kept-alive upstream connections parked per backend; 0 opens one per request.
+MAX_IDLE_PER_BACKEND = int(os.environ.get("BACKEND_MAX_IDLE", "8"))
 PORT_SPEC = (
     os.environ.get("BACKEND_PORTS")
     or os.environ.get("BACKEND_PORT_POOL")
@@ -67,6 +74,26 @@ def _coerce_port(raw: str) -> int:
     return value
 
 
+# Errors of a kept-alive socket the backend closed while it sat in the pool.
+_STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+def _is_reusable(conn: http.client.HTTPConnection) -> bool:
+    """An idle keep-alive socket must have nothing to read; EOF means the backend closed it."""
+
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        sock.setblocking(False)
+        sock.recv(1, socket.MSG_PEEK)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
 class BackendPool:
     def __init__(
         self,
@@ -75,6 +102,8 @@ class BackendPool:
         health_path: str,
         timeout: float,
         probe: Callable[[str, int, str, float], bool],
+        *,
+        max_idle: int = MAX_IDLE_PER_BACKEND,
     ) -> None:
         if not candidates:
             raise ValueError("at least one backend port is required")
@@ -82,10 +111,16 @@ class BackendPool:
         self.candidates = candidates
         self.health_path = health_path
         self.timeout = timeout
+        self.max_idle = max_idle
         self._probe = probe
         self._lock = threading.Lock()
         self._healthy: list[int] = []
         self._cursor = 0
+        self._idle: Dict[Tuple[str, int], Deque[http.client.HTTPConnection]] = {}
+        self._created = 0
+        self._reused = 0
+        self._stale = 0
+        self._evicted = 0
 
     def refresh(self) -> None:
         healthy: list[int] = []
@@ -99,6 +134,9 @@ class BackendPool:
                 self._cursor %= len(self._healthy)
             else:
                 self._cursor = 0
+            gone = [key for key in self._idle if key[1] not in healthy]
+        for key in gone:
+            self._evict(key)
 
     def next_backend(self) -> int | None:
         with self._lock:
@@ -118,11 +156,93 @@ class BackendPool:
                 self._cursor -= 1
             if self._cursor >= len(self._healthy):
                 self._cursor = 0
+        self._evict((self.host, port))
 
     def snapshot(self) -> list[int]:
         with self._lock:
             return list(self._healthy)
 
+    def acquire(self, port: int, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """An idle connection to ``port`` if a live one is parked, else a new one; ``(conn, reused)``."""
+
+        key = (self.host, port)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                conn = idle.pop()  # LIFO: the warmest socket
+            if _is_reusable(conn):
+                conn.sock.settimeout(timeout)
+                with self._lock:
+                    self._reused += 1
+                return conn, True
+            conn.close()
+            self.count_stale()
+        return self.connect(port, timeout), False
+
+    def connect(self, port: int, timeout: float) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(self.host, port, timeout=timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def release(self, port: int, conn: http.client.HTTPConnection) -> None:
+        """Park ``conn`` for the next request to ``port``, or close it if that backend is out or full."""
+
+        with self._lock:
+            if port in self._healthy:
+                idle = self._idle.setdefault((self.host, port), deque())
+                if len(idle) < self.max_idle:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def count_stale(self) -> None:
+        with self._lock:
+            self._stale += 1
+
+    def _evict(self, key: Tuple[str, int]) -> None:
+        with self._lock:
+            idle = self._idle.pop(key, None) or ()
+            self._evicted += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def close(self) -> None:
+        """Close every idle connection."""
+
+        with self._lock:
+            keys = list(self._idle)
+        for key in keys:
+            self._evict(key)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "created": self._created,
+                "reused": self._reused,
+                "stale": self._stale,
+                "evicted": self._evicted,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+
+def request_timeout(path: str, query: str, accept: str = "") -> float:
+    """Backend timeout for a request: SSE streams and long-polls wait on purpose."""
+
+    if path.endswith("/status/stream") or "text/event-stream" in accept:
+        return STREAM_TIMEOUT
+    wait = urllib.parse.parse_qs(query).get("wait")
+    if wait:
+        try:
+            return BACKEND_TIMEOUT + min(max(float(wait[0]), 0.0), MAX_LONG_POLL_WAIT)
+        except ValueError:
+            pass
+    return BACKEND_TIMEOUT
+
 
 def probe_backend(host: str, port: int, health_path: str, timeout: float) -> bool:
     target = f"http://{host}:{port}{health_path}"
@@ -190,6 +310,13 @@ class Proxy(http.server.BaseHTTPRequestHandler):
         incoming_path = parsed_path.path or "/"
         query = parsed_path.query
         pool, outgoing_path = choose_route(incoming_path)
+
+        # Read once: a retry on another backend resends the same bytes.
+        data = None
+        if with_body:
+            length = int(self.headers.get("Content-Length", "0"))
+            data = self.rfile.read(length) if length > 0 else None
+
         tried: set[int] = set()
         while True:
             port = pool.next_backend()
@@ -198,7 +325,7 @@ class Proxy(http.server.BaseHTTPRequestHandler):
                 return
 
             tried.add(port)
-            if self._forward_request(pool, port, outgoing_path, query, with_body):
+            if self._forward_request(pool, port, outgoing_path, query, data):
                 return
             pool.mark_unhealthy(port)
 
@@ -208,34 +335,58 @@ class Proxy(http.server.BaseHTTPRequestHandler):
         port: int,
         path: str,
         query: str,
-        with_body: bool,
+        data: bytes | None,
     ) -> bool:
         qs = f"?{query}" if query else ""
-        target = f"http://{pool.host}:{port}{path}{qs}"
+        target = f"{path}{qs}"
 
         headers = {
             k: v
             for k, v in self.headers.items()
-            if k.lower() not in {"host", "content-length", "accept-encoding"}
+            if k.lower() not in {"host", "content-length", "accept-encoding", "connection", "keep-alive"}
         }
+        timeout = request_timeout(path, query, self.headers.get("Accept", ""))
 
-        data = None
-        if with_body:
-            length = int(self.headers.get("Content-Length", "0"))
-            data = self.rfile.read(length) if length > 0 else None
-
-        req = urllib.request.Request(target, data=data, method=self.command, headers=headers)
-
+        conn: http.client.HTTPConnection | None = None
         try:
-            with urllib.request.urlopen(req, timeout=BACKEND_TIMEOUT) as resp:
-                self._relay_response(resp.getcode(), resp.getheaders(), resp.read())
+            conn, reused = pool.acquire(port, timeout)
+            try:
+                resp = self._exchange(conn, target, data, headers)
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # The backend dropped the parked socket before reading the request.
+                conn.close()
+                pool.count_stale()
+                conn = None
+                conn = pool.connect(port, timeout)
+                resp = self._exchange(conn, target, data, headers)
+            if (resp.getheader("Content-Type") or "").startswith("text/event-stream"):
+                self._relay_stream(resp)
+                conn.close()
                 return True
-        except urllib.error.HTTPError as err:
-            self._relay_response(err.code, err.headers.items(), err.read())
-            return True
-        except Exception:
+            body = resp.read()
+        except (OSError, http.client.HTTPException):
+            if conn is not None:
+                conn.close()
             return False
 
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.release(port, conn)
+        try:
+            self._relay_response(resp.status, resp.getheaders(), body)
+        except OSError:
+            self.close_connection = True  # the client went away; the backend is fine
+        return True
+
+    def _exchange(
+        self, conn: http.client.HTTPConnection, target: str, data: bytes | None, headers: dict[str, str]
+    ) -> http.client.HTTPResponse:
+        conn.request(self.command, target, body=data, headers=headers)
+        return conn.getresponse()
+
     def _relay_response(self, status: int, headers, body: bytes) -> None:
         self.send_response(status)
         for key, value in headers:
@@ -256,6 +407,21 @@ class Proxy(http.server.BaseHTTPRequestHandler):
         if body:
             self.wfile.write(body)
 
+    def _relay_stream(self, resp) -> None:
+        """Forward an SSE response chunk by chunk instead of buffering it."""
+
+        self.close_connection = True
+        try:
+            self._relay_response(resp.status, resp.getheaders(), b"")
+            while True:
+                chunk = resp.read1(65536)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except OSError:
+            pass  # client or backend went away; the stream is over either way
+
     def _respond_unavailable(self) -> None:
         self.send_response(503)
         self.send_header("Content-Type", "application/json")
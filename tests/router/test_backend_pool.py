@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import pytest
 
-from router.router import BackendPool, parse_port_candidates
+from router.router import BACKEND_TIMEOUT, STREAM_TIMEOUT, BackendPool, parse_port_candidates, request_timeout
 
 
 def test_parse_port_candidates_accepts_ranges_and_deduplicates() -> None:
@@ -35,3 +35,9 @@ def test_backend_pool_refresh_and_round_robin() -> None:
 
     pool.mark_unhealthy(9002)
     assert pool.next_backend() is None
+
+
+def test_request_timeout_covers_streams_and_long_polls() -> None:
+    assert request_timeout("/user/1/status", "") == BACKEND_TIMEOUT
+    assert request_timeout("/user/1/status", "wait=30&since=x") == BACKEND_TIMEOUT + 30
+    assert request_timeout("/user/1/status/stream", "") == STREAM_TIMEOUT
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import http.server
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import router.router as router_module
+from router.router import BackendPool, Proxy, ThreadingTCPServer
+
+
+class KeepAliveBackend(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 65536
+    connections: set = set()
+    drop_after_response = False
+
+    def do_GET(self):
+        type(self).connections.add(self.client_address)
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Close without announcing it, like a backend whose keep-alive timeout fired.
+        self.close_connection = type(self).drop_after_response
+
+    def log_message(self, format, *args):
+        return
+
+
+def _serve(server) -> None:
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def proxied(monkeypatch: pytest.MonkeyPatch):
+    KeepAliveBackend.connections = set()
+    KeepAliveBackend.drop_after_response = False
+    backend = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveBackend)
+    _serve(backend)
+    port = backend.server_address[1]
+    pool = BackendPool("127.0.0.1", [port], "/", 1.0, lambda *args: True)
+    pool.refresh()
+    monkeypatch.setattr(router_module, "ROUTING_RULES", [("", pool)])
+    proxy = ThreadingTCPServer(("127.0.0.1", 0), Proxy)
+    _serve(proxy)
+
+    def get(path: str) -> bytes:
+        with urllib.request.urlopen(f"http://127.0.0.1:{proxy.server_address[1]}{path}", timeout=5) as resp:
+            return resp.read()
+
+    yield pool, port, get
+    proxy.shutdown()
+    proxy.server_close()
+    backend.shutdown()
+    backend.server_close()
+    pool.close()
+
+
+def test_requests_reuse_one_upstream_connection(proxied) -> None:
+    pool, _, get = proxied
+
+    assert [get(f"/n/{n}") for n in range(5)] == [f"/n/{n}".encode() for n in range(5)]
+    assert len(KeepAliveBackend.connections) == 1
+    assert pool.stats() == {"created": 1, "reused": 4, "stale": 0, "evicted": 0, "idle": 1}
+
+
+def test_connections_the_backend_closed_are_replaced(proxied, monkeypatch: pytest.MonkeyPatch) -> None:
+    pool, _, get = proxied
+    KeepAliveBackend.drop_after_response = True
+
+    get("/a")
+    time.sleep(0.1)
+    assert get("/b") == b"/b"  # the closed socket is noticed while parked
+    assert pool.stats()["stale"] == 1
+
+    time.sleep(0.1)
+    monkeypatch.setattr(router_module, "_is_reusable", lambda conn: True)
+    assert get("/c") == b"/c"  # and retried on a new socket when it is not
+    assert pool.stats()["stale"] == 2 and pool.stats()["created"] == 3
+    assert pool.snapshot() != []
+
+
+def test_marking_a_backend_unhealthy_closes_its_idle_connections(proxied) -> None:
+    pool, port, get = proxied
+    get("/a")
+    assert pool.stats()["idle"] == 1
+
+    pool.mark_unhealthy(port)
+    assert pool.stats()["idle"] == 0 and pool.stats()["evicted"] == 1
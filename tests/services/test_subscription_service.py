@@ -28,6 +28,14 @@ class FakeRepo:
     def save(self, user):
         self._by_id[user.id] = user
 
+    def get_many(self, user_ids):
+        return {uid: self._by_id[uid] for uid in user_ids if uid in self._by_id}
+
+    def save_many(self, users):
+        self.saved_many = list(users)
+        for user in users:
+            self._by_id[user.id] = user
+
 
 class FakeUoW:
     def __init__(self, repo: FakeRepo):
@@ -44,6 +52,7 @@ class FakeUoW:
 
     def commit(self):
         self.committed = True
+        self.commits = getattr(self, "commits", 0) + 1
 
 
 def make_service(uow):
@@ -151,3 +160,37 @@ def test_read_effective_status_updates_expired_trial():
 
     assert result["status"] == "expired"
     assert repo.get_by_id(1).status == "expired"
+
+
+def test_suspend_many_reports_per_user_outcomes():
+    users = [
+        User(1, "A", "a@a", "h", "s", "premium", date.today(), "active"),
+        User(2, "B", "b@b", "h", "s", "basic", date.today(), "active"),
+        User(3, "C", "c@c", "h", "s", "premium", date.today(), "active"),
+    ]
+    repo = FakeRepo(users)
+    uow = FakeUoW(repo)
+    service = make_service(uow)
+
+    outcomes = service.suspend_many([1, 2, 3, 4, 1])
+
+    assert list(outcomes) == [1, 2, 3, 4]
+    assert outcomes[1] == {"user_id": 1, "plan": "premium", "status": "suspended"}
+    assert outcomes[3]["status"] == "suspended"
+    assert "error" in outcomes[2]
+    assert outcomes[4] == {"user_id": 4, "error": "user not found"}
+    assert [u.id for u in repo.saved_many] == [1, 3]
+    assert repo.get_by_id(2).status == "active"
+    assert uow.commits == 1
+
+
+def test_bulk_transition_without_changes_does_not_commit():
+    user = User(1, "A", "a@a", "h", "s", "basic", date.today(), "active")
+    repo = FakeRepo([user])
+    uow = FakeUoW(repo)
+    service = make_service(uow)
+
+    outcomes = service.reactivate_many([1])
+
+    assert "error" in outcomes[1]
+    assert uow.committed is False
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import random
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pytest
+
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.status_index import StatusIndex
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.models import User
+from capitalia.domain.user_states import get_user_state
+from jwt_service.tokens import sign
+
+
+SECRET = "analytics-secret"
+TODAY = date(2024, 3, 1)
+
+
+def _population(n: int):
+    rng = random.Random(7)
+    rows = []
+    for uid in range(1, n + 1):
+        plan = rng.choice(["basic", "trial", "premium"])
+        status = "suspended" if plan == "premium" and rng.random() < 0.2 else "active"
+        rows.append((uid, plan, status, TODAY - timedelta(days=rng.randrange(0, 60))))
+    return rows
+
+
+def _loop_mix(rows, as_of):
+    mix = {}
+    for uid, plan, status, start in rows:
+        user = User(uid, "n", "e", "h", "s", plan, start, status)
+        effective = get_user_state(user.status).evaluate(user, as_of)
+        bucket = mix.setdefault(plan, {})
+        bucket[effective] = bucket.get(effective, 0) + 1
+    return mix
+
+
+def test_vectorized_mix_matches_per_user_rules(tmp_path) -> None:
+    pytest.importorskip("numpy")
+    from capitalia import analytics
+
+    rows = _population(2000)
+    path = str(tmp_path / "status.idx")
+    StatusIndex.build(path, rows)
+    from_index = analytics.load_columns_from_index(path)
+    from_rows = analytics.columns_from_rows([(p, s, d.isoformat()) for _, p, s, d in rows], chunk_size=300)
+
+    for cols in (from_index, from_rows):
+        for as_of in (TODAY, TODAY + timedelta(days=10)):
+            mix = analytics.status_mix(cols, as_of)
+            expected = _loop_mix(rows, as_of)
+            for plan, counts in mix.items():
+                assert {k: v for k, v in counts.items() if v} == expected.get(plan, {})
+
+
+def test_partially_filled_index_is_not_used_for_analytics(tmp_path, monkeypatch) -> None:
+    pytest.importorskip("numpy")
+    from capitalia import analytics
+    from capitalia.config import Config
+
+    db = tmp_path / "capitalia.db"
+    with closing(sqlite3.connect(db)) as conn:
+        apply_migrations(conn, "sqlite")
+        SqliteUserRepository(conn).add_many(
+            [User(None, "n", f"u{n}@example.com", "h", "s", "basic", TODAY, "active") for n in range(3)]
+        )
+        conn.commit()
+    path = str(tmp_path / "status.idx")
+    StatusIndex(path).put(User(1, "n", "e", "h", "s", "basic", TODAY, "active"))  # created, never rebuilt
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(db))
+    monkeypatch.setenv("STATUS_INDEX_PATH", path)
+
+    with pytest.raises(analytics.IncompleteIndexError):
+        analytics.load_columns_from_index(path)
+    assert len(Config().get_analytics_loader()()) == 3  # the database, not the 1-user index
+
+    StatusIndex.build(path, [(1, "basic", "active", TODAY), (2, "basic", "active", TODAY)])
+    assert len(Config().get_analytics_loader()()) == 2  # a completed rebuild is trusted
+
+
+def test_trial_forecast_counts_each_expiry_day() -> None:
+    pytest.importorskip("numpy")
+    from capitalia import analytics
+
+    rows = [
+        ("trial", "active", TODAY - timedelta(days=29)),  # expires tomorrow
+        ("trial", "active", TODAY - timedelta(days=29)),
+        ("trial", "active", TODAY - timedelta(days=25)),  # in 5 days
+        ("trial", "active", TODAY - timedelta(days=30)),  # already expired today
+        ("trial", "expired", TODAY - timedelta(days=29)),
+        ("premium", "active", TODAY - timedelta(days=29)),
+    ]
+    cols = analytics.columns_from_rows(rows)
+
+    forecast = analytics.trial_expiry_forecast(cols, TODAY, 7)
+
+    assert list(forecast.values()) == [2, 0, 0, 0, 1, 0, 0]
+    assert next(iter(forecast)) == "2024-03-02"
+
+
+class _Clock:
+    def today(self) -> date:
+        return TODAY
+
+
+def _get(processor, path: str, claims):
+    headers = {"authorization": f"Bearer {sign(claims, SECRET, 60)}"}
+    path_only, _, query = path.partition("?")
+    return processor.handle(HttpRequest("GET", path, path_only, query, headers, b""))
+
+
+def test_admin_analytics_route_requires_admin_role() -> None:
+    calls = []
+
+    def report(as_of, today, days):
+        calls.append((as_of, today, days))
+        return {"as_of": as_of.isoformat(), "days": days}
+
+    processor = build_handler(lambda: None, SECRET, _Clock(), token_client=object(), password_hasher=object(), analytics_report=report)
+
+    assert _get(processor, "/admin/analytics", {"sub": 1}).status == 403
+    ok = _get(processor, "/admin/analytics?as_of=2024-04-01&days=7", {"sub": "ops", "role": "admin"})
+    assert ok.status == 200
+    assert json.loads(ok.body) == {"as_of": "2024-04-01", "days": 7}
+    assert calls == [(date(2024, 4, 1), TODAY, 7)]
+    assert _get(processor, "/admin/analytics?days=0", {"sub": "ops", "role": "admin"}).status == 400
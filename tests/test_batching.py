@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import threading
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.batching import BatchingLoader
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.models import User
+from capitalia.domain.services import SubscriptionService
+from capitalia.metrics import MetricsRegistry
+from jwt_service.tokens import sign
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 2, 1)
+
+
+def _user(uid: int) -> User:
+    return User(uid, f"User {uid}", f"user{uid}@example.com", "h" * 64, "s" * 32, "basic", date(2024, 1, 1), "active")
+
+
+class CountingFetch:
+    def __init__(self) -> None:
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, ids):
+        with self._lock:
+            self.calls.append(list(ids))
+        return {uid: _user(uid) for uid in ids if uid != 404}
+
+
+def _run_concurrently(loader, fetch, ids):
+    results = {}
+    barrier = threading.Barrier(len(ids))
+
+    def worker(uid):
+        barrier.wait()
+        results[uid] = loader.load(uid, fetch)
+
+    threads = [threading.Thread(target=worker, args=(uid,)) for uid in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def test_concurrent_lookups_are_merged() -> None:
+    loader = BatchingLoader(max_batch=100, max_wait=0.05)
+    fetch = CountingFetch()
+
+    results = _run_concurrently(loader, fetch, list(range(1, 21)) + [404])
+
+    assert {uid: (u.id if u else None) for uid, u in results.items()} == {
+        **{uid: uid for uid in range(1, 21)},
+        404: None,
+    }
+    assert len(fetch.calls) < 21
+    stats = loader.stats()
+    assert stats["batch_size"]["count"] == len(fetch.calls)
+    assert stats["wait_ms"]["count"] == 21
+
+
+def test_overflow_is_split_by_max_batch() -> None:
+    loader = BatchingLoader(max_batch=4, max_wait=0.05)
+    fetch = CountingFetch()
+
+    results = _run_concurrently(loader, fetch, list(range(1, 11)))
+
+    assert all(results[uid].id == uid for uid in range(1, 11))
+    assert all(len(call) <= 4 for call in fetch.calls)
+    assert sorted(uid for call in fetch.calls for uid in call) == list(range(1, 11))
+
+
+def test_fetch_errors_reach_every_caller() -> None:
+    loader = BatchingLoader(max_wait=0)
+
+    def failing(ids):
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        loader.load(1, failing)
+    # The loader recovers for the next batch.
+    assert loader.load(2, CountingFetch()).id == 2
+
+
+def test_wrapped_read_uow_serves_status_reads() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uid = uow.users.add(_user(None))
+    loader = BatchingLoader(max_wait=0)
+    service = SubscriptionService(
+        lambda: MemoryUnitOfWork(store),
+        FixedClock(),
+        read_uow_factory=loader.wrap(lambda _uid: MemoryUnitOfWork(store)),
+    )
+
+    assert service.read_effective_status(uid) == {"user_id": uid, "plan": "basic", "status": "active"}
+    assert loader.stats()["batch_size"]["count"] == 1
+
+
+def test_only_the_batch_leader_opens_a_unit_of_work() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        ids = uow.users.add_many([_user(n) for n in range(1, 9)])
+    opened = []
+    loader = BatchingLoader(max_wait=0.05)
+    factory = loader.wrap(lambda _uid: opened.append(_uid) or MemoryUnitOfWork(store))
+    barrier = threading.Barrier(len(ids))
+    found = []
+
+    def read(uid):
+        barrier.wait()
+        with factory(uid) as uow:
+            found.append(uow.users.get_by_id(uid).id)
+
+    threads = [threading.Thread(target=read, args=(uid,)) for uid in ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert sorted(found) == sorted(ids)
+    assert len(opened) == loader.stats()["batch_size"]["count"] < len(ids)
+
+
+def test_metrics_route_reports_loader_histograms() -> None:
+    loader = BatchingLoader(max_wait=0)
+    loader.load(1, CountingFetch())
+    metrics = MetricsRegistry()
+    metrics.register("read_batching", loader.stats)
+    processor = build_handler(lambda: None, "secret", token_client=object(), password_hasher=object(), metrics=metrics)
+
+    def get(claims=None):
+        headers = {"authorization": f"Bearer {sign(claims, 'secret', 60)}"} if claims else {}
+        return processor.handle(HttpRequest("GET", "/metrics", "/metrics", "", headers, b""))
+
+    assert get().status == 401
+    assert get({"sub": 1}).status == 403  # admin only, like /admin/stats
+    response = get({"sub": 1, "role": "admin"})
+    assert response.status == 200
+    assert json.loads(response.body)["read_batching"]["batch_size"]["buckets"]["1"] == 1
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.passwords import PBKDF2, PasswordHasher, parse
+from capitalia.config import Config
+from capitalia.scripts import bulk, seed_sqlite
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "bulk.db"
+    with sqlite3.connect(path) as conn:
+        apply_migrations(conn, "sqlite")
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(path))
+    monkeypatch.setenv("PASSWORD_HASH_ITERATIONS", "1000")
+    return path
+
+
+def _write_csv(path, count: int) -> None:
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["name", "email", "password", "plan", "start_date", "status"])
+        for n in range(count):
+            writer.writerow([f"User {n}", f"user{n}@example.com", f"pw{n}", "trial", "2024-01-01", "active"])
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_import_csv_hashes_passwords(db_path, tmp_path, workers: int) -> None:
+    source = tmp_path / "users.csv"
+    _write_csv(source, 25)
+
+    bulk.main(["import", str(source), "--chunk-size", "4", "--commit-every", "2", "--workers", str(workers)])
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT email, password_hash, salt FROM users ORDER BY id").fetchall()
+    assert len(rows) == 25
+    email, password_hash, salt = rows[7]
+    assert email == "user7@example.com"
+    assert parse(password_hash)[:2] == (PBKDF2, (1000,))  # the configured scheme, not legacy sha256
+    assert PasswordHasher(iterations=1000).verify("pw7", password_hash, salt)
+
+
+def test_import_rejects_invalid_records(db_path, tmp_path) -> None:
+    source = tmp_path / "users.ndjson"
+    source.write_text(json.dumps({"name": "A", "email": "a@a", "password": "x", "plan": "gold"}) + "\n")
+
+    with pytest.raises(SystemExit, match="record 1: invalid plan"):
+        bulk.main(["import", str(source), "--workers", "0"])
+
+
+def test_import_reports_the_record_with_a_duplicate_email(db_path, tmp_path) -> None:
+    first = tmp_path / "first.csv"
+    _write_csv(first, 3)
+    bulk.main(["import", str(first), "--workers", "0"])
+    source = tmp_path / "users.csv"
+    _write_csv(source, 6)  # user0..user2 are already there
+
+    with pytest.raises(SystemExit, match="record 1: email 'user0@example.com' already exists"):
+        bulk.main(["import", str(source), "--workers", "0", "--chunk-size", "4"])
+
+    source.write_text("name,email,password\nA,a@example.com,x\nB,b@example.com,x\nA2,a@example.com,x\n")
+    with pytest.raises(SystemExit, match="record 3: email 'a@example.com' already exists"):
+        bulk.main(["import", str(source), "--workers", "0", "--chunk-size", "1", "--commit-every", "5"])
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 3  # back to the last commit
+
+
+def test_export_round_trips_through_ndjson(db_path, tmp_path) -> None:
+    source = tmp_path / "users.csv"
+    _write_csv(source, 5)
+    bulk.main(["import", str(source), "--workers", "0"])
+
+    exported = tmp_path / "out.ndjson"
+    bulk.main(["export", "--output", str(exported)])
+
+    records = [json.loads(line) for line in exported.read_text().splitlines()]
+    assert [r["email"] for r in records] == [f"user{n}@example.com" for n in range(5)]
+    assert set(records[0]) == set(bulk.FIELDS)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM users")
+    bulk.main(["import", str(exported), "--workers", "0"])
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT password_hash FROM users ORDER BY id").fetchall()[0][0] == records[0]["password_hash"]
+
+
+@pytest.fixture
+def shard_paths(tmp_path, monkeypatch):
+    shards = [tmp_path / f"shard{n}.db" for n in range(2)]
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "directory.db"))
+    monkeypatch.setenv("SQLITE_SHARDS", ",".join(map(str, shards)))
+    monkeypatch.setenv("PASSWORD_HASH_ITERATIONS", "1000")
+    Config().get_shard_map().initialize(16)
+    return shards
+
+
+def test_sharded_import_and_export_cover_every_shard(shard_paths, tmp_path) -> None:
+    source = tmp_path / "users.csv"
+    _write_csv(source, 20)
+    bulk.main(["import", str(source), "--workers", "0", "--chunk-size", "3"])
+
+    counts, counted = [], 0
+    for path in shard_paths:
+        with sqlite3.connect(path) as conn:
+            counts.append(conn.execute("SELECT COUNT(*) FROM users").fetchone()[0])
+            counted += conn.execute("SELECT COALESCE(SUM(count), 0) FROM user_counters").fetchone()[0]
+    assert sum(counts) == counted == 20 and all(counts)
+    with sqlite3.connect(tmp_path / "directory.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_directory").fetchone()[0] == 20
+
+    exported = tmp_path / "out.ndjson"
+    bulk.main(["export", "--output", str(exported)])
+    ids = [json.loads(line)["id"] for line in exported.read_text().splitlines()]
+    assert ids == sorted(ids) and len(ids) == 20
+
+
+def test_seed_places_users_on_their_shards(shard_paths) -> None:
+    seed_sqlite.main()
+    seed_sqlite.main()
+
+    shard_map = Config().get_shard_map()
+    with Config().get_uow_factory()() as uow:
+        alice = uow.users.get_by_email("alice@example.com")
+    assert alice is not None and alice.plan == "trial"
+    assert parse(alice.password_hash)[0] == PBKDF2
+    with sqlite3.connect(shard_paths[shard_map.shard_for(alice.id)]) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE email = 'alice@example.com'").fetchone()[0] == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from capitalia.adapters.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    return CircuitBreaker(window=10, min_calls=4, open_duration=5, clock=clock, **kwargs)
+
+
+def test_trips_on_failure_rate_and_rejects_until_the_open_period_ends() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock, failure_rate=0.5)
+    for ok in (True, False, True):
+        assert breaker.allow()
+        breaker.record(ok, 0.01)
+    assert breaker.state == CLOSED  # below min_calls
+
+    breaker.allow()
+    breaker.record(False, 0.01)  # 2 of 4 failed
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 5
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["rejected"] == 2 and breaker.stats()["trips"] == 1
+
+
+def test_slow_calls_trip_and_a_failed_probe_reopens() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock, slow_call_threshold=1.0, slow_call_rate=0.75)
+    for latency in (2.0, 2.0, 0.1, 2.0):
+        breaker.allow()
+        breaker.record(True, latency)
+    assert breaker.state == OPEN
+
+    clock.now = 6
+    assert breaker.allow()
+    breaker.record(True, 3.0)  # still slow
+    assert breaker.state == OPEN and not breaker.allow()
+    assert breaker.stats()["slow_calls"] == 4
+
+
+def test_cancelled_probe_is_handed_back() -> None:
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(False, 0.1)
+    clock.now = 6
+
+    assert breaker.allow() and not breaker.allow()
+    breaker.cancel()  # the probe never went out
+    assert breaker.state == HALF_OPEN and breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from contextlib import closing
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.counters import CounterMirror, SqlCounters, read_totals, reconcile, stats_payload, sum_totals
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.sharding import ShardMap, ShardedUnitOfWork
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.uow import SqlUnitOfWork
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.errors import ValidationError
+from capitalia.domain.models import User
+from capitalia.domain.services import SubscriptionService
+from capitalia.scripts import reconcile_counters
+from jwt_service.tokens import sign
+
+
+SECRET = "counters-secret"
+GROUP_BY = "SELECT plan, status, COUNT(*) FROM users GROUP BY plan, status"
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 3, 1)
+
+
+def _user(n: int, plan: str, start: date = date(2024, 2, 20)) -> User:
+    return User(None, f"User {n}", f"user{n}@example.com", "h" * 64, "s" * 32, plan, start, "active")
+
+
+def _factory(path):
+    def factory():
+        return sqlite3.connect(path)
+
+    return factory
+
+
+def _actual(path) -> dict:
+    with closing(sqlite3.connect(path)) as conn:
+        return {(plan, status): count for plan, status, count in conn.execute(GROUP_BY)}
+
+
+def _counters(path) -> dict:
+    with closing(sqlite3.connect(path)) as conn:
+        return read_totals(conn)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "counters.db"
+    with closing(sqlite3.connect(path)) as conn:
+        apply_migrations(conn, "sqlite", target=3)
+        repo = SqliteUserRepository(conn)
+        repo.add_many([_user(1, "premium"), _user(2, "premium"), _user(3, "basic")])
+        repo.add(_user(4, "trial", start=date(2024, 1, 1)))
+        conn.commit()
+        apply_migrations(conn, "sqlite")  # 0004 seeds the counters from existing rows
+    return path
+
+
+def _service(path) -> SubscriptionService:
+    def uow_factory():
+        return SqlUnitOfWork(_factory(path), SqliteUserRepository, lambda conn: SqlCounters(conn, "sqlite"))
+
+    return SubscriptionService(uow_factory, FixedClock())
+
+
+def test_migration_seeds_counters_from_existing_users(db) -> None:
+    assert _counters(db) == _actual(db) == {("premium", "active"): 2, ("basic", "active"): 1, ("trial", "active"): 1}
+
+
+def test_mutations_and_expiry_apply_deltas_in_the_same_transaction(db) -> None:
+    service = _service(db)
+
+    service.suspend(1)
+    service.downgrade_many([2, 3, 99])
+    service.read_effective_status(4)  # trial past 30 days -> expired
+    with pytest.raises(ValidationError):
+        service.suspend(3)  # basic cannot be suspended: rolled back, no delta
+
+    assert _counters(db) == _actual(db) == {
+        ("premium", "suspended"): 1,
+        ("basic", "active"): 2,
+        ("trial", "expired"): 1,
+    }
+    with closing(sqlite3.connect(db)) as conn:
+        assert conn.execute("SELECT MAX(slot) FROM user_counters").fetchone()[0] < 8
+
+
+def test_sharded_deltas_sum_across_shards(tmp_path) -> None:
+    shards = [tmp_path / f"shard{i}.db" for i in range(3)]
+    shard_map = ShardMap("sqlite", [_factory(p) for p in shards], _factory(tmp_path / "directory.db"), ttl=0)
+    shard_map.initialize(16)
+
+    def uow_factory():
+        return ShardedUnitOfWork(shard_map, SqliteUserRepository, lambda conn: SqlCounters(conn, "sqlite"))
+
+    with uow_factory() as uow:
+        ids = uow.users.add_many([_user(n, "premium") for n in range(12)])
+    for path in shards:
+        with closing(sqlite3.connect(path)) as conn:
+            reconcile(conn)
+    service = SubscriptionService(uow_factory, FixedClock())
+
+    service.suspend(ids[0])
+    service.downgrade_many(ids[1:6])
+
+    assert sum_totals(_counters(p) for p in shards) == {
+        ("premium", "active"): 6,
+        ("premium", "suspended"): 1,
+        ("basic", "active"): 5,
+    }
+
+
+def test_memory_store_counts_follow_commits() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        ids = uow.users.add_many([_user(1, "premium"), _user(2, "premium"), _user(3, "trial")])
+    service = SubscriptionService(lambda: MemoryUnitOfWork(store), FixedClock())
+
+    service.suspend(ids[0])
+    service.upgrade(ids[2])
+
+    assert store.counts() == {("premium", "suspended"): 1, ("premium", "active"): 2}
+
+
+def test_reconcile_cli_repairs_drift(db, monkeypatch, capsys) -> None:
+    with closing(sqlite3.connect(db)) as conn:
+        conn.execute("UPDATE user_counters SET count = count + 5 WHERE plan = 'basic'")
+        conn.execute("DELETE FROM user_counters WHERE plan = 'trial'")
+        conn.commit()
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(db))
+    monkeypatch.delenv("SQLITE_SHARDS", raising=False)
+
+    reconcile_counters.main([])
+
+    assert _counters(db) == _actual(db)
+    err = capsys.readouterr().err
+    assert "basic    active" in err and "(-5)" in err and "(+1)" in err
+
+
+def test_mirror_reloads_after_ttl() -> None:
+    now = [0.0]
+    loads = []
+
+    def load():
+        loads.append(now[0])
+        return {("basic", "active"): len(loads)}
+
+    mirror = CounterMirror(load, ttl=1.0, clock=lambda: now[0])
+    assert mirror.totals() == {("basic", "active"): 1}
+    now[0] = 0.5
+    assert mirror.totals() == {("basic", "active"): 1}
+    now[0] = 1.5
+    assert mirror.report()["by_plan"]["basic"]["active"] == 2
+    assert loads == [0.0, 1.5]
+
+
+def _get(processor, path: str, claims):
+    headers = {"authorization": f"Bearer {sign(claims, SECRET, 60)}"}
+    return processor.handle(HttpRequest("GET", path, path, "", headers, b""))
+
+
+def test_admin_stats_route_requires_admin_role() -> None:
+    payload = stats_payload({("premium", "active"): 3, ("trial", "expired"): 1})
+    processor = build_handler(lambda: None, SECRET, FixedClock(), token_client=object(), password_hasher=object(), stats=lambda: payload)
+
+    assert _get(processor, "/admin/stats", {"sub": 1}).status == 403
+    ok = _get(processor, "/admin/stats", {"sub": "ops", "role": "admin"})
+    assert ok.status == 200
+    body = json.loads(ok.body)
+    assert body["users"] == 4
+    assert body["by_plan"]["premium"] == {"active": 3, "suspended": 0, "expired": 0}
@@ -3,7 +3,8 @@ from __future__ import annotations
 import unittest
 from datetime import date, timedelta
 
-from capitalia.domain.models import User
+from capitalia.domain.errors import ValidationError
+from capitalia.domain.models import Plan, Status, User
 from capitalia.domain.services import SubscriptionService
 from capitalia.ports.clock import Clock
 
@@ -105,6 +106,26 @@ class TestDomain(unittest.TestCase):
         self.assertEqual(repo.get_by_id(1).status, "expired")
 
 
+
+class UserEntityTests(unittest.TestCase):
+    def test_strings_are_coerced_to_interned_enums(self):
+        u = User(1, "A", "a@a", "h", "s", "trial", date(2024, 1, 1), "active")
+        self.assertIs(u.plan, Plan.TRIAL)
+        self.assertIs(u.status, Status.ACTIVE)
+        self.assertEqual(u.plan, "trial")
+        self.assertEqual((Plan.PREMIUM.code, Status.EXPIRED.code), (3, 3))
+        self.assertIs(Status.from_code(2), Status.SUSPENDED)
+        self.assertFalse(hasattr(u, "__dict__"))
+
+    def test_from_row_maps_positional_tuples(self):
+        u = User.from_row((7, "A", "a@a", "h", "s", "premium", "2024-02-03", "suspended"))
+        self.assertEqual((u.id, u.start_date, u.plan, u.status), (7, date(2024, 2, 3), Plan.PREMIUM, Status.SUSPENDED))
+
+    def test_unknown_plan_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            User(1, "A", "a@a", "h", "s", "gold", date(2024, 1, 1), "active")
+
+
 if __name__ == "__main__":
     unittest.main()
 
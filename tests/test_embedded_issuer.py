@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from capitalia.adapters.embedded_issuer import EmbeddedTokenIssuer
+from capitalia.adapters.jwt_client import JwtTokenClient
+from capitalia.config import Config
+from capitalia.ports.auth_issuer import TokenIssueError
+from jwt_service import JwtServiceConfig, create_server, verify
+
+
+def test_issues_the_same_claims_as_the_token_service() -> None:
+    issuer = EmbeddedTokenIssuer("secret")
+    claims = verify(issuer.issue_token({"sub": 1, "plan": "trial"}, ttl_seconds=30), "secret")
+
+    assert claims["sub"] == 1 and claims["exp"] - claims["iat"] == 30
+    assert [verify(t, "secret")["sub"] for t in issuer.issue_tokens([({"sub": 2}, 60), ({"sub": 3}, 60)])] == [2, 3]
+    assert issuer.stats() == {"mode": "embedded", "issued": 3, "rejected": 0}
+
+
+@pytest.mark.parametrize("claims, ttl", [({}, 0), ({}, "soon"), ([], 60)])
+def test_rejects_what_the_token_service_rejects(claims, ttl) -> None:
+    server = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = JwtTokenClient(f"http://127.0.0.1:{server.server_address[1]}")
+        with pytest.raises(TokenIssueError, match="422"):
+            client.issue_token(claims, ttl_seconds=ttl)
+    finally:
+        server.stop(grace=1)
+
+    with pytest.raises(TokenIssueError, match="invalid token request"):
+        EmbeddedTokenIssuer("secret").issue_token(claims, ttl_seconds=ttl)
+
+
+def test_issuer_is_selected_by_config(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("JWT_ISSUER", "embedded")
+    assert isinstance(Config().get_auth_issuer(), EmbeddedTokenIssuer)
+    monkeypatch.setenv("JWT_ISSUER", "http")
+    assert isinstance(Config().get_auth_issuer(), JwtTokenClient)
+    monkeypatch.setenv("JWT_ISSUER", "grpc")
+    with pytest.raises(ValueError, match="JWT_ISSUER"):
+        Config().get_auth_issuer()
@@ -9,6 +9,8 @@ from typing import Callable
 
 import pytest
 
+from capitalia.adapters.passwords import PBKDF2, PasswordHasher, parse
+from capitalia.adapters.revocation import RevocationList
 from capitalia.adapters.sqlite_repo import SqliteUserRepository
 from capitalia.adapters.uow import SqlUnitOfWork
 from capitalia.app.handlers import build_handler
@@ -120,6 +122,7 @@ def test_full_flow_over_sqlite(sqlite_app: _SetupResult) -> None:
         secret,
         FixedClock(sqlite_app.clock_today),
         token_client=token_client,
+        password_hasher=PasswordHasher(iterations=1000),
     )
 
     login_body = json.dumps({"email": sqlite_app.email, "password": sqlite_app.password}).encode()
@@ -167,3 +170,109 @@ def test_full_flow_over_sqlite(sqlite_app: _SetupResult) -> None:
         "plan": "premium",
         "status": "active",
     }
+
+
+def test_login_releases_the_connection_before_issuing_the_token(sqlite_app: _SetupResult) -> None:
+    open_units: list[SqlUnitOfWork] = []
+
+    def uow_factory() -> SqlUnitOfWork:
+        uow = sqlite_app.uow_factory()
+        open_units.append(uow)
+        return uow
+
+    class CheckingTokenClient(StubTokenClient):
+        def issue_token(self, claims: dict[str, object], ttl_seconds: int = 3600) -> str:
+            assert open_units and all(uow.conn is None for uow in open_units)
+            return super().issue_token(claims, ttl_seconds)
+
+    processor = build_handler(
+        uow_factory,
+        "secret",
+        FixedClock(sqlite_app.clock_today),
+        token_client=CheckingTokenClient("secret"),
+        password_hasher=PasswordHasher(iterations=1000),
+    )
+    body = json.dumps({"email": sqlite_app.email, "password": sqlite_app.password}).encode()
+    response = processor.handle(_make_request("POST", "/login", headers={"content-type": "application/json"}, body=body))
+
+    assert response.status == 200
+
+
+def test_login_upgrades_legacy_password_hashes(sqlite_app: _SetupResult) -> None:
+    processor = build_handler(
+        sqlite_app.uow_factory,
+        "secret",
+        FixedClock(sqlite_app.clock_today),
+        token_client=StubTokenClient("secret"),
+        password_hasher=PasswordHasher(iterations=1000),
+    )
+
+    def login(password: str) -> int:
+        body = json.dumps({"email": sqlite_app.email, "password": password}).encode()
+        return processor.handle(_make_request("POST", "/login", headers={"content-type": "application/json"}, body=body)).status
+
+    assert login(sqlite_app.password) == 200
+    with sqlite_app.uow_factory() as uow:
+        upgraded = uow.users.get_by_id(sqlite_app.user_id)
+    assert parse(upgraded.password_hash)[:2] == (PBKDF2, (1000,)) and upgraded.salt != "static-salt"
+
+    assert login(sqlite_app.password) == 200
+    assert login("wrong") == 401
+
+
+def test_rehash_stops_when_the_column_is_too_narrow(sqlite_app: _SetupResult, monkeypatch, capsys) -> None:
+    save = SqliteUserRepository.save
+
+    def narrow_save(self, user) -> None:
+        if len(user.password_hash) > 64:  # VARCHAR(64) under MySQL strict mode
+            raise Exception(1406, "Data too long for column 'password_hash' at row 1")
+        save(self, user)
+
+    monkeypatch.setattr(SqliteUserRepository, "save", narrow_save)
+    hasher = PasswordHasher(iterations=1000)
+    processor = build_handler(
+        sqlite_app.uow_factory,
+        "secret",
+        FixedClock(sqlite_app.clock_today),
+        token_client=StubTokenClient("secret"),
+        password_hasher=hasher,
+    )
+    body = json.dumps({"email": sqlite_app.email, "password": sqlite_app.password}).encode()
+
+    for _ in range(3):
+        response = processor.handle(_make_request("POST", "/login", headers={"content-type": "application/json"}, body=body))
+        assert response.status == 200
+
+    assert hasher.stats()["derived"] == 4  # three legacy checks, one attempted upgrade
+    assert capsys.readouterr().err.count("password rehash disabled") == 1
+
+
+def test_logout_and_admin_revocation_reject_tokens_before_exp(sqlite_app: _SetupResult) -> None:
+    revocations = RevocationList()
+    processor = build_handler(
+        sqlite_app.uow_factory,
+        "secret",
+        FixedClock(sqlite_app.clock_today),
+        token_client=StubTokenClient("secret"),
+        password_hasher=PasswordHasher(iterations=1000),
+        revocations=revocations,
+    )
+
+    def login() -> str:
+        body = json.dumps({"email": sqlite_app.email, "password": sqlite_app.password}).encode()
+        response = processor.handle(_make_request("POST", "/login", headers={"content-type": "application/json"}, body=body))
+        return json.loads(response.body)["token"]
+
+    def call(method: str, path: str, token: str, body: bytes = b"") -> int:
+        return processor.handle(_make_request(method, path, headers={"authorization": f"Bearer {token}"}, body=body)).status
+
+    status_path = f"/user/{sqlite_app.user_id}/status"
+    first, second = login(), login()
+    assert call("POST", "/logout", first) == 204
+    assert call("GET", status_path, first) == 401
+    assert call("GET", status_path, second) == 200  # only the logged-out token
+
+    admin = jwt_sign({"sub": 0, "role": "admin"}, "secret", 60)
+    assert call("POST", "/admin/revocations", second, json.dumps({"sub": sqlite_app.user_id}).encode()) == 403
+    assert call("POST", "/admin/revocations", admin, json.dumps({"sub": sqlite_app.user_id}).encode()) == 200
+    assert call("GET", status_path, second) == 401
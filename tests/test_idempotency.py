@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.idempotency import (
+    IdempotencyCache,
+    IdempotencyConflict,
+    IdempotencyInFlight,
+    SqlIdempotencyStore,
+    StoredResponse,
+)
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.passwords import PasswordHasher
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.models import User
+from jwt_service.tokens import sign
+
+
+SECRET = "idempotency-secret"
+NOW = time.time()
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 3, 1)
+
+
+def _response(status: int = 200, body: bytes = b"{}") -> StoredResponse:
+    return StoredResponse("fp", status, {"Content-Type": "application/json"}, body, NOW)
+
+
+@pytest.fixture
+def app():
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uid = uow.users.add(User(None, "Ana", "ana@example.com", "h", "s", "basic", date(2024, 2, 1), "active"))
+    cache = IdempotencyCache()
+    processor = build_handler(
+        lambda: MemoryUnitOfWork(store),
+        SECRET,
+        FixedClock(),
+        token_client=object(),
+        password_hasher=object(),
+        idempotency=cache,
+    )
+    return processor, cache, uid
+
+
+def _post(processor, path: str, uid: int, key: str | None, body: bytes = b""):
+    headers = {"authorization": f"Bearer {sign({'sub': uid}, SECRET, 60)}"}
+    if key is not None:
+        headers["idempotency-key"] = key
+    return processor.handle(HttpRequest("POST", path, path, "", headers, body))
+
+
+def test_retry_replays_the_first_result(app) -> None:
+    processor, cache, uid = app
+
+    first = _post(processor, f"/user/{uid}/upgrade", uid, "k-1")
+    retry = _post(processor, f"/user/{uid}/upgrade", uid, "k-1")
+    without_key = _post(processor, f"/user/{uid}/upgrade", uid, None)
+
+    assert first.status == retry.status == 200
+    assert retry.body == first.body and retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert without_key.status == 422  # already premium: ran again
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_key_reused_with_another_body_or_too_long_is_rejected(app) -> None:
+    processor, _, uid = app
+    _post(processor, f"/user/{uid}/upgrade", uid, "k-2")
+
+    assert _post(processor, f"/user/{uid}/upgrade", uid, "k-2", body=b'{"x":1}').status == 422
+    assert _post(processor, f"/user/{uid}/upgrade", uid, "x" * 256).status == 400
+    # Scoped per route: the same key on another route is a new request.
+    assert _post(processor, f"/user/{uid}/suspend", uid, "k-2").status == 200
+
+
+class CountingIssuer:
+    def __init__(self) -> None:
+        self.issued = 0
+
+    def issue_token(self, claims, ttl_seconds=None) -> str:
+        self.issued += 1
+        return f"token-{self.issued}"
+
+
+def test_login_is_never_stored_for_replay() -> None:
+    hasher = PasswordHasher(iterations=1_000)
+    password_hash, salt = hasher.hash("secret")
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uow.users.add(User(None, "Ana", "ana@example.com", password_hash, salt, "basic", date(2024, 2, 1), "active"))
+    cache, issuer = IdempotencyCache(), CountingIssuer()
+    processor = build_handler(
+        lambda: MemoryUnitOfWork(store),
+        SECRET,
+        FixedClock(),
+        token_client=issuer,
+        idempotency=cache,
+        password_hasher=hasher,
+    )
+    body = b'{"email": "ana@example.com", "password": "secret"}'
+    headers = {"content-type": "application/json", "idempotency-key": "login-1"}
+
+    responses = [processor.handle(HttpRequest("POST", "/login", "/login", "", dict(headers), body)) for _ in range(2)]
+
+    assert [r.status for r in responses] == [200, 200]
+    assert "Idempotent-Replayed" not in responses[1].headers and issuer.issued == 2
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_concurrent_duplicates_wait_for_the_first_execution() -> None:
+    cache = IdempotencyCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def run():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return _response()
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.execute("k", "fp", run)))
+    first.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.execute("k", "fp", run))) for _ in range(4)]
+    for thread in waiters:
+        thread.start()
+    release.set()
+    for thread in [first, *waiters]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+    assert cache.stats()["waits"] == 4
+
+    with pytest.raises(IdempotencyConflict):
+        cache.execute("k", "other", run)
+
+
+def test_server_errors_and_slow_owners_are_not_cached() -> None:
+    cache = IdempotencyCache(wait_timeout=0.05)
+    assert cache.execute("k", "fp", lambda: _response(503)) == (_response(503), False)
+    assert cache.execute("k", "fp", lambda: _response(201)) == (_response(201), False)
+    assert cache.execute("k", "fp", lambda: _response(500))[0].status == 201
+
+    release = threading.Event()
+    owner = threading.Thread(target=cache.execute, args=("slow", "fp", lambda: release.wait(5) and _response()))
+    owner.start()
+    while not cache.stats()["in_flight"]:
+        pass
+    with pytest.raises(IdempotencyInFlight):
+        cache.execute("slow", "fp", _response)
+    release.set()
+    owner.join(5)
+
+
+def test_persisted_results_survive_a_new_cache(tmp_path) -> None:
+    path = tmp_path / "idem.db"
+    with closing(sqlite3.connect(path)) as conn:
+        apply_migrations(conn, "sqlite")
+
+    def store():
+        return SqlIdempotencyStore(lambda: sqlite3.connect(path), "sqlite")
+
+    now = [1000.0]
+    cache = IdempotencyCache(store=store(), ttl=60, clock=lambda: now[0], purge_interval=0)
+    stored = StoredResponse("fp", 200, {"ETag": '"a"'}, b"payload", now[0])
+    cache.execute("k", "fp", lambda: stored)
+
+    restarted = IdempotencyCache(store=store(), ttl=60, clock=lambda: now[0], purge_interval=0)
+    assert restarted.execute("k", "fp", pytest.fail) == (stored, True)
+
+    now[0] += 120  # expired: runs again and the purge drops the old row
+    fresh = StoredResponse("fp", 200, {}, b"again", now[0])
+    assert IdempotencyCache(store=store(), ttl=60, clock=lambda: now[0], purge_interval=0).execute(
+        "k", "fp", lambda: fresh
+    ) == (fresh, False)
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("SELECT body FROM idempotency_keys").fetchall() == [(b"again",)]
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from capitalia.adapters.circuit_breaker import OPEN, CircuitBreaker
+from capitalia.adapters.embedded_issuer import EmbeddedTokenIssuer
+from capitalia.adapters.jwt_client import JwtTokenClient, TokenIssueError, TokenServiceUnavailable
+from jwt_service import JwtServiceConfig, create_server, verify
+
+
+class _KeepAliveTokenHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self) -> None:
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/tokens":  # a token service without the batch endpoint
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        payload = json.loads(body)
+        body = json.dumps({"token": f"t-{payload['claims']['sub']}"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def keep_alive_server():
+    def start(idle_timeout=None):
+        handler = type("Handler", (_KeepAliveTokenHandler,), {"connections": 0, "timeout": idle_timeout})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, handler
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_logins_reuse_one_kept_alive_connection(keep_alive_server) -> None:
+    server, handler = keep_alive_server()
+    client = JwtTokenClient(f"http://127.0.0.1:{server.server_port}")
+
+    tokens = [client.issue_token({"sub": n}) for n in range(5)]
+
+    assert tokens == [f"t-{n}" for n in range(5)]
+    assert handler.connections == 1
+    assert client.stats() == {
+        "created": 1,
+        "reused": 4,
+        "stale_retries": 0,
+        "in_use": 0,
+        "idle": 1,
+        "errors": 0,
+        "local_fallbacks": 0,
+    }
+    client.close()
+    assert client.stats()["idle"] == 0
+
+
+def test_connection_closed_by_the_server_is_retried_on_a_fresh_one(keep_alive_server) -> None:
+    server, handler = keep_alive_server(idle_timeout=0.1)
+    client = JwtTokenClient(f"http://127.0.0.1:{server.server_port}")
+    client.issue_token({"sub": 1})
+    time.sleep(0.3)  # the server drops the idle socket
+
+    assert client.issue_token({"sub": 2}) == "t-2"
+    assert client.stats()["stale_retries"] == 1
+    assert handler.connections == 2
+
+
+def test_keeps_connections_to_the_token_service_alive() -> None:
+    server = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = JwtTokenClient(f"http://127.0.0.1:{server.server_address[1]}")
+        token = client.issue_token({"sub": 7}, ttl_seconds=30)
+        assert verify(token, "secret")["sub"] == 7
+        client.issue_token({"sub": 8})
+        assert client.stats()["created"] == 1 and client.stats()["idle"] == 1
+    finally:
+        server.stop(grace=1)
+
+
+def test_unreachable_service_fails_within_the_connect_timeout() -> None:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    client = JwtTokenClient(f"http://127.0.0.1:{port}", timeout=5, connect_timeout=0.5)
+
+    with pytest.raises(TokenIssueError):
+        client.issue_token({"sub": 1})
+    assert client.stats()["errors"] == 1 and client.stats()["in_use"] == 0
+
+
+def test_coalesced_logins_share_batch_requests() -> None:
+    server = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = JwtTokenClient(f"http://127.0.0.1:{server.server_address[1]}", coalesce_window=0.05, max_batch=8)
+    results = {}
+    barrier = threading.Barrier(20)
+
+    def login(n: int) -> None:
+        barrier.wait()
+        results[n] = client.issue_token({"sub": n}, ttl_seconds=30)
+
+    try:
+        threads = [threading.Thread(target=login, args=(n,)) for n in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+    finally:
+        server.stop(grace=1)
+
+    assert {n: verify(token, "secret")["sub"] for n, token in results.items()} == {n: n for n in range(20)}
+    batches = client.stats()["batch_size"]
+    assert batches["count"] < 20 and batches["sum"] == 20
+    assert batches["buckets"]["8"] == batches["count"]  # max_batch respected
+
+
+def test_coalescing_falls_back_without_the_batch_endpoint(keep_alive_server) -> None:
+    server, _ = keep_alive_server()
+    client = JwtTokenClient(f"http://127.0.0.1:{server.server_port}", coalesce_window=0.01)
+
+    assert client.issue_tokens([({"sub": 1}, 60), ({"sub": 2}, 60)]) == ["t-1", "t-2"]
+    assert client.issue_token({"sub": 3}) == "t-3"  # no longer tries /tokens
+    assert client.stats()["batch_size"]["count"] == 0
+
+
+def _dead_url() -> str:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{probe.getsockname()[1]}"
+
+
+def test_open_circuit_fails_fast_and_local_signing_takes_over() -> None:
+    breaker = CircuitBreaker(window=4, min_calls=2, open_duration=60)
+    client = JwtTokenClient(_dead_url(), connect_timeout=0.5, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(TokenServiceUnavailable):
+            client.issue_token({"sub": 1})
+    assert breaker.state == OPEN
+
+    with pytest.raises(TokenServiceUnavailable, match="circuit open"):
+        client.issue_token({"sub": 1})
+    assert client.stats()["errors"] == 2  # the third call never reached the network
+
+    fallback = JwtTokenClient(
+        _dead_url(), connect_timeout=0.5, breaker=breaker, fallback_signer=EmbeddedTokenIssuer("secret").issue_token
+    )
+    assert verify(fallback.issue_token({"sub": 9}, ttl_seconds=30), "secret")["sub"] == 9
+    assert fallback.stats()["local_fallbacks"] == 1
+
+
+def test_client_errors_neither_trip_the_breaker_nor_fall_back() -> None:
+    server = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    breaker = CircuitBreaker(window=4, min_calls=2)
+    client = JwtTokenClient(
+        f"http://127.0.0.1:{server.server_address[1]}", breaker=breaker, fallback_signer=pytest.fail
+    )
+    try:
+        for _ in range(3):
+            with pytest.raises(TokenIssueError, match="422"):
+                client.issue_token({"sub": 1}, ttl_seconds=0)
+    finally:
+        server.stop(grace=1)
+    assert breaker.stats()["calls"] == 3 and breaker.stats()["failures"] == 0
+
+
+def test_pool_exhaustion_does_not_count_against_the_service(keep_alive_server) -> None:
+    server, _ = keep_alive_server()
+    breaker = CircuitBreaker(window=4, min_calls=2)
+    client = JwtTokenClient(
+        f"http://127.0.0.1:{server.server_port}", connect_timeout=0.05, max_connections=1, breaker=breaker
+    )
+    client._slots.acquire()  # every connection is busy
+    try:
+        for _ in range(3):
+            with pytest.raises(TokenServiceUnavailable, match="pool exhausted"):
+                client.issue_token({"sub": 1})
+    finally:
+        client._slots.release()
+
+    assert breaker.stats()["calls"] == 0 and breaker.state != OPEN
+    assert client.issue_token({"sub": 2}) == "t-2"
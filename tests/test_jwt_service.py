@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from capitalia.adapters.jwt_client import JwtTokenClient
+from jwt_service import JwtServiceConfig, create_server, sign, verify
+from jwt_service.introspection import Introspector
+from jwt_service.tokens import TokenCodec
+
+
+@pytest.fixture
+def server():
+    srv = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60, workers=4, keepalive_timeout=5))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    if not srv.draining:
+        srv.stop(grace=1)
+    thread.join(5)
+
+
+def _raw(srv) -> socket.socket:
+    return socket.create_connection(srv.server_address, timeout=5)
+
+
+def _read_until(conn: socket.socket, marker: bytes) -> bytes:
+    data = b""
+    while marker not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _token_request(body: bytes) -> bytes:
+    return (
+        b"POST /token HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+    )
+
+
+def test_a_stalled_client_does_not_block_other_logins(server) -> None:
+    stalled = _raw(server)
+    stalled.sendall(b"POST /token HTTP/1.1\r\n")  # and nothing else
+    client = JwtTokenClient(f"http://127.0.0.1:{server.server_address[1]}")
+
+    started = time.monotonic()
+    tokens = [client.issue_token({"sub": n}) for n in range(10)]
+
+    assert len(set(tokens)) == 10 and time.monotonic() - started < 2
+    assert server.stats()["connections"] == 2
+    stalled.close()
+
+
+def test_idle_keep_alive_connections_do_not_hold_workers(server) -> None:
+    health = b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+    conns = [_raw(server) for _ in range(12)]  # three times the workers
+    for _ in range(2):
+        for conn in conns:
+            conn.sendall(health)
+            assert b"200 OK" in _read_until(conn, b"}")
+
+    deadline = time.monotonic() + 2
+    while server.stats()["idle"] < 12 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.stats() == {"connections": 12, "busy": 0, "idle": 12}
+
+    conns[0].sendall(health * 2)  # pipelined
+    data = b""
+    while data.count(b"200 OK") < 2:
+        data += conns[0].recv(4096)
+    for conn in conns:
+        conn.close()
+
+
+def test_parked_connections_close_after_the_keepalive_timeout() -> None:
+    srv = create_server(JwtServiceConfig("127.0.0.1", 0, "secret", 60, workers=1, keepalive_timeout=0.2))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        conn = _raw(srv)
+        conn.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+        assert b"200 OK" in _read_until(conn, b"}")
+        assert conn.recv(4096) == b""
+        assert srv.stats() == {"connections": 0, "busy": 0, "idle": 0}
+    finally:
+        srv.stop(grace=1)
+
+
+def _post(srv, path: str, payload) -> tuple[int, dict]:
+    body = json.dumps(payload).encode()
+    conn = _raw(srv)
+    conn.sendall(_token_request(body).replace(b"/token", path.encode(), 1) + body)
+    head, _, rest = _read_until(conn, b"}").partition(b"\r\n\r\n")
+    conn.close()
+    return int(head.split()[1]), json.loads(rest)
+
+
+def test_batch_endpoint_returns_tokens_in_order(server) -> None:
+    status, data = _post(server, "/tokens", {"requests": [{"claims": {"sub": n}, "ttl": 10 + n} for n in range(5)]})
+
+    assert status == 200
+    claims = [verify(token, "secret") for token in data["tokens"]]
+    assert [c["sub"] for c in claims] == list(range(5))
+    assert [c["exp"] - c["iat"] for c in claims] == [10, 11, 12, 13, 14]
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        ({"requests": []}, "requests must be a non-empty array"),
+        ({"requests": [{"claims": {}}, {"claims": []}]}, "requests[1]: claims must be an object"),
+        ({"requests": [{"claims": {}, "ttl": 0}]}, "requests[0]: ttl must be positive"),
+        ({"requests": [{"claims": {}}] * 257}, "at most 256 requests per batch"),
+    ],
+)
+def test_batch_endpoint_rejects_invalid_items(server, payload, message) -> None:
+    assert _post(server, "/tokens", payload) == (422, {"error": message})
+
+
+def test_errors_close_the_connection(server) -> None:
+    conn = _raw(server)
+    conn.sendall(b"POST /nope HTTP/1.1\r\nHost: x\r\nContent-Length: 2\r\n\r\n{}")
+    response = b""
+    while chunk := conn.recv(4096):
+        response += chunk
+    assert b"404" in response and b"Connection: close" in response
+
+
+def test_stop_finishes_in_flight_requests_and_closes_idle_ones(server) -> None:
+    idle = _raw(server)
+    idle.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+    assert b"200 OK" in _read_until(idle, b"}")
+
+    while server.stats()["busy"]:
+        time.sleep(0.01)
+    body = json.dumps({"claims": {"sub": 1}}).encode()
+    busy = _raw(server)
+    busy.sendall(_token_request(body) + body[:5])
+    while server.stats()["busy"] == 0:
+        time.sleep(0.01)
+
+    stopper = threading.Thread(target=server.stop, kwargs={"grace": 5})
+    stopper.start()
+    time.sleep(0.2)
+    assert idle.recv(4096) == b""  # idle keep-alive connection dropped...
+    busy.sendall(body[5:])
+    response = _read_until(busy, b"}")
+    stopper.join(5)
+
+    assert b"200 OK" in response and b"Connection: close" in response  # ...in-flight one answered
+    assert not stopper.is_alive()
+
+
+def test_introspect_verifies_one_or_many_tokens_on_a_kept_alive_connection(server) -> None:
+    good = sign({"sub": 1}, "secret", 60)
+    conn = _raw(server)
+    responses = []
+    for payload in ({"token": good}, {"tokens": [good, sign({"sub": 2}, "other", 60), sign({"sub": 3}, "secret", -5)]}):
+        body = json.dumps(payload).encode()
+        conn.sendall(_token_request(body).replace(b"/token", b"/introspect", 1) + body)
+        head, _, rest = _read_until(conn, b"}}" if "token" in payload else b"]}").partition(b"\r\n\r\n")
+        assert b"200 OK" in head and b"Connection: close" not in head
+        responses.append(json.loads(rest))
+    conn.close()
+
+    assert responses[0] == {"active": True, "claims": verify(good, "secret")}
+    assert [r["active"] for r in responses[1]["results"]] == [True, False, False]
+    assert [r.get("error") for r in responses[1]["results"][1:]] == ["invalid signature", "token expired"]
+    assert server.RequestHandlerClass.introspector.stats() == {"entries": 1, "hits": 1, "misses": 3}
+
+
+def test_introspection_cache_expires_with_the_token() -> None:
+    now = [1_000.0]
+    codec = TokenCodec("secret", clock=lambda: now[0])
+    introspector = Introspector(codec, max_entries=1, clock=lambda: now[0])
+    token = codec.sign({"sub": 1}, ttl_seconds=10)
+
+    assert introspector.introspect(token)["active"] and introspector.introspect(token)["active"]
+    now[0] += 11
+    assert introspector.introspect(token) == {"active": False, "error": "token expired"}
+    assert introspector.stats() == {"entries": 0, "hits": 1, "misses": 2}
+
+
+def test_introspection_sees_revocations_even_for_cached_tokens() -> None:
+    from capitalia.adapters.revocation import RevocationList
+
+    codec = TokenCodec("secret")
+    revocations = RevocationList()
+    introspector = Introspector(codec, revocations=revocations)
+    token = codec.sign({"sub": 1, "jti": "a"}, ttl_seconds=60)
+    other = codec.sign({"sub": 2, "jti": "b"}, ttl_seconds=60)
+
+    assert introspector.introspect(token)["active"] and introspector.introspect(other)["active"]
+    revocations.revoke_token("a", time.time() + 60)
+    revocations.revoke_subject(2, since=time.time() + 1)
+
+    assert introspector.introspect(token) == {"active": False, "error": "token revoked"}
+    assert introspector.introspect(other) == {"active": False, "error": "token revoked"}
+    assert introspector.stats()["hits"] == 2
+
+
+def test_revocation_mirror_is_opt_in_and_must_load_before_serving(tmp_path) -> None:
+    import sqlite3
+
+    from capitalia.adapters.migrations import apply_migrations
+    from jwt_service.main import _revocation_list
+
+    config = JwtServiceConfig("127.0.0.1", 0, "secret", 60)
+    assert _revocation_list(config) is None
+
+    missing = tmp_path / "missing.db"
+    config.revocations_db = f"sqlite://{missing}"
+    with pytest.raises(sqlite3.OperationalError):
+        _revocation_list(config)
+    assert not missing.exists()
+
+    path = tmp_path / "capitalia.db"
+    with sqlite3.connect(path) as conn:
+        apply_migrations(conn, "sqlite")
+        conn.execute(
+            "INSERT INTO token_revocations (kind, value, since, expires_at) VALUES ('jti', 'a', NULL, ?)",
+            (time.time() + 60,),
+        )
+    config.revocations_db = f"sqlite://{path}"
+    revocations = _revocation_list(config)
+    try:
+        assert revocations.is_revoked({"jti": "a"})
+    finally:
+        revocations.stop()
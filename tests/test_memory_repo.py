@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from capitalia.adapters.memory_repo import DuplicateEmailError, MemoryStore, MemoryUnitOfWork
+from capitalia.config import Config
+from capitalia.domain.models import User
+from capitalia.domain.services import SubscriptionService
+
+
+class FixedClock:
+    def __init__(self, today: date) -> None:
+        self._today = today
+
+    def today(self) -> date:
+        return self._today
+
+
+def _user(email: str, plan: str = "premium", start: date = date(2024, 1, 1)) -> User:
+    return User(None, "Name", email, "h", "s", plan, start, "active")
+
+
+def test_uncommitted_changes_are_private_to_the_unit_of_work() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uid = uow.users.add(_user("a@a"))
+
+    with MemoryUnitOfWork(store) as uow:
+        user = uow.users.get_by_id(uid)
+        user.status = "suspended"
+        uow.users.save(user)
+        with MemoryUnitOfWork(store) as other:
+            assert other.users.get_by_id(uid).status == "active"
+        uow.rollback()
+
+    with MemoryUnitOfWork(store) as uow:
+        assert uow.users.get_by_email("a@a").status == "active"
+
+
+def test_commit_enforces_unique_email() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uow.users.add(_user("a@a"))
+
+    with pytest.raises(DuplicateEmailError):
+        with MemoryUnitOfWork(store) as uow:
+            uow.users.add(_user("a@a"))
+    assert len(store) == 1
+
+
+def test_service_runs_on_memory_backend() -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        trial = uow.users.add(_user("t@t", plan="trial", start=date(2024, 1, 1)))
+        premium = uow.users.add(_user("p@p"))
+    service = SubscriptionService(lambda: MemoryUnitOfWork(store), FixedClock(date(2024, 1, 1) + timedelta(days=40)))
+
+    assert service.read_effective_status(trial)["status"] == "expired"
+    outcomes = service.suspend_many([premium, trial])
+
+    assert outcomes[premium]["status"] == "suspended"
+    assert "error" in outcomes[trial]
+    assert store.get(trial).status == "expired"
+
+
+def test_log_and_snapshot_are_replayed_on_startup(tmp_path) -> None:
+    log_path = str(tmp_path / "users.log")
+    store = MemoryStore(log_path, fsync_interval=0)
+    with MemoryUnitOfWork(store) as uow:
+        first = uow.users.add(_user("a@a"))
+    store.snapshot()
+    with MemoryUnitOfWork(store) as uow:
+        second = uow.users.add(_user("b@b"))
+        user = uow.users.get_by_id(first)
+        user.email = "renamed@a"
+        uow.users.save(user)
+    store.close()
+    with open(log_path, "a") as fh:
+        fh.write('{"op": "put", "user": {"id"')  # torn write from a crash
+
+    recovered = MemoryStore(log_path)
+    try:
+        with MemoryUnitOfWork(recovered) as uow:
+            assert uow.users.get_by_email("renamed@a").id == first
+            assert uow.users.get_by_email("a@a") is None
+            assert uow.users.get_by_id(second).email == "b@b"
+            assert uow.users.add(_user("c@c")) == second + 1
+    finally:
+        recovered.close()
+    snapshot = json.loads((tmp_path / "users.log.snapshot").read_text())
+    assert [u["email"] for u in snapshot["users"]] == ["a@a"]
+
+
+def test_recovery_survives_a_second_crash(tmp_path) -> None:
+    log_path = str(tmp_path / "users.log")
+    emails = []
+    for crash in range(3):
+        store = MemoryStore(log_path, fsync_interval=0)
+        with MemoryUnitOfWork(store) as uow:
+            uow.users.add(_user(f"u{crash}@a"))
+        emails.append(f"u{crash}@a")
+        store.close()
+        with open(log_path, "a") as fh:
+            fh.write('{"op": "put", "user": {"id"')  # torn write from a crash
+
+    recovered = MemoryStore(log_path)
+    try:
+        with MemoryUnitOfWork(recovered) as uow:
+            assert all(uow.users.get_by_email(email) is not None for email in emails)
+    finally:
+        recovered.close()
+
+
+def test_config_builds_memory_uow_factory(monkeypatch) -> None:
+    monkeypatch.setenv("DB_KIND", "memory")
+    monkeypatch.delenv("MEMORY_LOG_PATH", raising=False)
+    factory = Config().get_uow_factory()
+
+    with factory() as uow:
+        uid = uow.users.add(_user("a@a"))
+    with factory() as uow:
+        assert uow.users.get_by_id(uid).email == "a@a"
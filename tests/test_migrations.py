@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+import pytest
+
+from pathlib import Path
+
+from capitalia.adapters.migrations import (
+    MIGRATIONS,
+    SchemaOutdatedError,
+    applied_versions,
+    apply_migrations,
+    check_schema,
+    render_script,
+)
+from capitalia.config import Config
+from capitalia.scripts import migrate
+
+
+# Hot sweep queries: trial expiry and per-plan status scans.
+EXPIRING_TRIALS = "SELECT id FROM users WHERE trial_expires_on <= ?"
+PLAN_STATUS_SWEEP = "SELECT id FROM users WHERE plan = ? AND status = ? AND start_date < ?"
+PLAN_STATUS_COUNTS = "SELECT plan, status, COUNT(*) FROM users GROUP BY plan, status"
+
+
+@pytest.fixture
+def conn(tmp_path):
+    with closing(sqlite3.connect(tmp_path / "migrations.db")) as conn:
+        yield conn
+
+
+def _plan(conn: sqlite3.Connection, query: str, params=()) -> str:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_apply_migrations_is_idempotent(conn) -> None:
+    applied = apply_migrations(conn, "sqlite")
+
+    assert [m.version for m in applied] == [m.version for m in MIGRATIONS]
+    assert applied_versions(conn, "sqlite") == {m.version for m in MIGRATIONS}
+    assert apply_migrations(conn, "sqlite") == []
+
+
+def test_apply_migrations_honours_target(conn) -> None:
+    applied = apply_migrations(conn, "sqlite", target=1)
+
+    assert [m.version for m in applied] == [1]
+    assert applied_versions(conn, "sqlite") == {1}
+
+
+def test_trial_expires_on_is_derived_from_plan_and_start_date(conn) -> None:
+    apply_migrations(conn, "sqlite")
+    conn.executemany(
+        "INSERT INTO users (name, email, password_hash, salt, plan, start_date, status) VALUES (?, ?, 'h', 's', ?, ?, 'active')",
+        [("A", "a@a", "trial", "2024-01-01"), ("B", "b@b", "premium", "2024-01-01")],
+    )
+
+    rows = dict(conn.execute("SELECT email, trial_expires_on FROM users").fetchall())
+
+    assert rows == {"a@a": "2024-01-31", "b@b": None}
+    cutoff = (date(2024, 1, 1) + timedelta(days=30)).isoformat()
+    assert conn.execute(EXPIRING_TRIALS, (cutoff,)).fetchall() == [(1,)]
+
+
+def test_hot_queries_use_indexes(conn) -> None:
+    apply_migrations(conn, "sqlite")
+    conn.execute("ANALYZE")
+
+    assert "idx_users_trial_expires_on" in _plan(conn, EXPIRING_TRIALS, ("2024-01-31",))
+    assert "idx_users_plan_status_start" in _plan(conn, PLAN_STATUS_SWEEP, ("trial", "active", "2024-01-01"))
+    assert "COVERING INDEX idx_users_plan_status_start" in _plan(conn, PLAN_STATUS_COUNTS)
+
+
+def test_cli_applies_and_lists(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "cli.db"))
+
+    migrate.main([])
+    migrate.main(["--list"])
+
+    out = capsys.readouterr().out
+    assert "applied 0001 create_users" in out
+    assert "[x] 0003 users_trial_expires_on" in out
+
+
+def test_cli_migrates_every_shard(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "directory.db"))
+    monkeypatch.setenv("SQLITE_SHARDS", f"{tmp_path / 's0.db'},{tmp_path / 's1.db'}")
+
+    migrate.main([])
+
+    out = capsys.readouterr().out
+    assert "shard 1: applied 0001 create_users" in out
+    for name in ("directory.db", "s0.db", "s1.db"):
+        with closing(sqlite3.connect(tmp_path / name)) as conn:
+            check_schema(conn, "sqlite")
+    Config().check_schema()
+
+
+def test_init_mysql_sql_is_generated_from_the_migrations(capsys) -> None:
+    migrate.main(["--sql", "mysql"])
+
+    script = (Path(migrate.__file__).parent / "init_mysql.sql").read_text()
+    assert script == capsys.readouterr().out
+    assert "CREATE TABLE IF NOT EXISTS user_counters" in script
+    assert "password_hash VARCHAR(255)" in script
+
+
+def test_rendered_script_builds_a_current_schema(conn) -> None:
+    conn.executescript(render_script("sqlite"))
+
+    check_schema(conn, "sqlite")
+    assert apply_migrations(conn, "sqlite") == []
+
+
+def test_startup_check_rejects_an_outdated_schema(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "old.db"))
+    with closing(sqlite3.connect(tmp_path / "old.db")) as conn:
+        apply_migrations(conn, "sqlite", target=3)
+
+    with pytest.raises(SchemaOutdatedError, match="0004.*capitalia.scripts.migrate"):
+        Config().check_schema()
+    migrate.main([])
+    Config().check_schema()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from datetime import date
+
+from capitalia.adapters import mysql_repo
+from capitalia.adapters.mysql_repo import MySQLUserRepository
+from capitalia.domain.models import User
+
+
+class RecordingCursor:
+    def __init__(self, statements: list) -> None:
+        self.statements = statements
+
+    def __enter__(self) -> "RecordingCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, sql: str, params) -> None:
+        self.statements.append((" ".join(sql.split()), list(params)))
+
+
+class RecordingConnection:
+    def __init__(self) -> None:
+        self.statements: list = []
+
+    def cursor(self) -> RecordingCursor:
+        return RecordingCursor(self.statements)
+
+
+def _user(uid: int, plan: str = "premium") -> User:
+    return User(uid, f"User {uid}", f"user{uid}@example.com", "h", "s", plan, date(2024, 1, 1), "active")
+
+
+def test_save_many_sends_one_multi_row_update_per_chunk(monkeypatch) -> None:
+    monkeypatch.setattr(mysql_repo, "UPDATE_CHUNK_SIZE", 2)
+    conn = RecordingConnection()
+
+    MySQLUserRepository(conn).save_many([_user(1), _user(2), _user(3, "basic"), _user(1, "basic")])
+
+    assert len(conn.statements) == 2
+    sql, params = conn.statements[0]
+    assert sql.startswith("UPDATE users AS u JOIN (SELECT %s AS id,") and sql.count("UNION ALL") == 1
+    assert "ON u.id = v.id" in sql and "u.status = v.status" in sql
+    assert sql.count("%s") == len(params) == 16
+    # The last write of an id wins, as with consecutive save() calls.
+    assert params[:8] == [1, "User 1", "user1@example.com", "h", "s", "basic", date(2024, 1, 1), "active"]
+    assert conn.statements[1][1][0] == 3
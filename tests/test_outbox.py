@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.outbox import EventBus, FileSink, OutboxRelay, OutboxTail, SqlOutbox, WebhookSink
+from capitalia.adapters.sharding import ShardMap, ShardedUnitOfWork
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.uow import SqlUnitOfWork
+from capitalia.app.streams import StatusStreamHub
+from capitalia.domain.errors import ValidationError
+from capitalia.domain.events import SubscriptionChanged
+from capitalia.domain.models import Plan, Status, User
+from capitalia.domain.services import SubscriptionService
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 3, 1)
+
+
+def _user(n: int, plan: str, start: date = date(2024, 2, 20)) -> User:
+    return User(None, f"User {n}", f"user{n}@example.com", "h" * 64, "s" * 32, plan, start, "active")
+
+
+def _factory(path):
+    def factory():
+        return sqlite3.connect(path)
+
+    return factory
+
+
+def _outbox_rows(path) -> int:
+    with closing(sqlite3.connect(path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM subscription_outbox").fetchone()[0]
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "outbox.db"
+    with closing(sqlite3.connect(path)) as conn:
+        apply_migrations(conn, "sqlite")
+        repo = SqliteUserRepository(conn)
+        repo.add_many([_user(1, "premium"), _user(2, "premium"), _user(3, "basic")])
+        repo.add(_user(4, "trial", start=date(2024, 1, 1)))
+        conn.commit()
+    return path
+
+
+def _service(path, listeners=()) -> SubscriptionService:
+    def uow_factory():
+        return SqlUnitOfWork(_factory(path), SqliteUserRepository, outbox_factory=lambda conn: SqlOutbox(conn, "sqlite"))
+
+    return SubscriptionService(uow_factory, FixedClock(), listeners=listeners)
+
+
+def test_mutations_append_events_in_the_same_transaction(db) -> None:
+    service = _service(db)
+
+    service.suspend(1)
+    service.downgrade_many([2, 3])  # 3 is already basic/active: a no-op, no event
+    service.read_effective_status(4)
+    with pytest.raises(ValidationError):
+        service.suspend(3)  # rejected: rolled back with the user row
+
+    published = []
+    relay = OutboxRelay([_factory(db)], "sqlite", [published.extend])
+    assert relay.drain_once() == 3
+    assert [(e.user_id, e.old_plan, e.new_plan, e.old_status, e.new_status) for e in published] == [
+        (1, Plan.PREMIUM, Plan.PREMIUM, Status.ACTIVE, Status.SUSPENDED),
+        (2, Plan.PREMIUM, Plan.BASIC, Status.ACTIVE, Status.ACTIVE),
+        (4, Plan.TRIAL, Plan.TRIAL, Status.ACTIVE, Status.EXPIRED),
+    ]
+    assert [e.event_id for e in published] == [1, 2, 3]
+    assert _outbox_rows(db) == 0
+
+
+def test_relay_drains_in_batches_to_file_and_bus(db, tmp_path) -> None:
+    service = _service(db)
+    for _ in range(3):
+        service.suspend(1)
+        service.reactivate(1)
+    bus = EventBus()
+    seen = []
+    bus.subscribe(lambda events: seen.append(len(events)))
+    bus.subscribe(lambda events: 1 / 0)  # a broken subscriber does not stop delivery
+    log = tmp_path / "events.ndjson"
+    relay = OutboxRelay([_factory(db)], "sqlite", [FileSink(str(log)), bus], batch_size=4)
+
+    assert relay.drain_once() == 6
+
+    assert seen == [4, 2]
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [line["new_status"] for line in lines] == ["suspended", "active"] * 3
+    assert relay.stats()["batches"] == 2
+    assert _outbox_rows(db) == 0
+
+
+def test_failing_sink_keeps_the_batch_for_redelivery(db) -> None:
+    _service(db).suspend(1)
+    delivered = []
+
+    def flaky(events):
+        delivered.append([e.event_id for e in events])
+        if len(delivered) == 1:
+            raise ConnectionError("sink down")
+
+    relay = OutboxRelay([_factory(db)], "sqlite", [flaky])
+
+    with pytest.raises(ConnectionError):
+        relay.drain_once()
+    assert _outbox_rows(db) == 1
+    assert relay.drain_once() == 1
+    assert delivered == [[1], [1]]
+
+
+def test_slow_sink_does_not_block_writers(db) -> None:
+    _service(db).suspend(1)
+    in_sink = threading.Event()
+    release = threading.Event()
+
+    def slow(events):
+        in_sink.set()
+        release.wait(5)
+
+    relay = OutboxRelay([_factory(db)], "sqlite", [slow])
+    drainer = threading.Thread(target=relay.drain_once)
+    drainer.start()
+    try:
+        assert in_sink.wait(5)
+
+        def uow_factory():
+            return SqlUnitOfWork(
+                lambda: sqlite3.connect(db, timeout=0.2),
+                SqliteUserRepository,
+                outbox_factory=lambda conn: SqlOutbox(conn, "sqlite"),
+            )
+
+        SubscriptionService(uow_factory, FixedClock()).suspend(2)  # would hit "database is locked"
+    finally:
+        release.set()
+        drainer.join(5)
+    assert relay.stats()["published"] == 1
+    assert _outbox_rows(db) == 1  # the second suspension, left for the next batch
+
+
+def test_batch_of_a_dead_relay_is_claimed_after_its_lease(db) -> None:
+    _service(db).suspend(1)
+    now = [1000.0]
+    dead = OutboxRelay([_factory(db)], "sqlite", [], lease=30, clock=lambda: now[0])
+    with closing(sqlite3.connect(db)) as conn:
+        assert [e.user_id for e in dead._claim_batch(conn)] == [1]  # then it crashes
+
+    published = []
+    other = OutboxRelay([_factory(db)], "sqlite", [published.extend], lease=30, clock=lambda: now[0])
+    assert other.drain_once() == 0
+    now[0] += 31
+    assert other.drain_once() == 1
+    assert [e.user_id for e in published] == [1]
+    assert _outbox_rows(db) == 0
+
+
+def test_background_relay_wakes_on_notify(db) -> None:
+    received = threading.Event()
+    relay = OutboxRelay([_factory(db)], "sqlite", [lambda events: received.set()], poll_interval=60)
+    relay.start()
+    try:
+        _service(db, listeners=[relay.notify]).suspend(1)
+        assert received.wait(5)
+    finally:
+        relay.stop()
+
+
+def test_every_node_tails_events_that_one_relay_delivered(db) -> None:
+    now = [1000.0]
+    nodes = [[], []]
+    tails = [OutboxTail([_factory(db)], "sqlite", seen.extend) for seen in nodes]
+    for tail in tails:
+        tail.seek_to_end()
+    relay = OutboxRelay([_factory(db)], "sqlite", [], retention=60, clock=lambda: now[0])
+
+    _service(db).suspend(1)
+    assert relay.drain_once() == 1  # delivered by one node's relay...
+    _service(db).suspend(2)
+
+    for seen, tail in zip(nodes, tails):
+        assert tail.poll_once() == 2  # ...and still seen by every node
+        assert tail.poll_once() == 0
+        assert [e.user_id for e in seen] == [1, 2]
+    assert relay.drain_once() == 1 and _outbox_rows(db) == 2
+    now[0] += 61
+    relay.drain_once()
+    assert _outbox_rows(db) == 0  # purged after the retention
+
+
+def test_hub_following_a_feed_wakes_it_instead_of_publishing() -> None:
+    hub = StatusStreamHub()
+    woken = []
+    hub.follow(lambda: woken.append(True))
+
+    hub.publish([User(1, "A", "a@a", "h", "s", "basic", date(2024, 1, 1), "active")])
+
+    assert woken == [True]
+
+
+def test_sharded_events_land_on_the_owning_shard(tmp_path) -> None:
+    shards = [tmp_path / f"shard{i}.db" for i in range(3)]
+    shard_map = ShardMap("sqlite", [_factory(p) for p in shards], _factory(tmp_path / "directory.db"), ttl=0)
+    shard_map.initialize(16)
+
+    def uow_factory():
+        return ShardedUnitOfWork(shard_map, SqliteUserRepository, outbox_factory=lambda conn: SqlOutbox(conn, "sqlite"))
+
+    with uow_factory() as uow:
+        ids = uow.users.add_many([_user(n, "premium") for n in range(12)])
+    SubscriptionService(uow_factory, FixedClock()).suspend_many(ids)
+
+    for shard, path in enumerate(shards):
+        with closing(sqlite3.connect(path)) as conn:
+            owners = [uid for (uid,) in conn.execute("SELECT user_id FROM subscription_outbox")]
+        assert all(shard_map.shard_for(uid) == shard for uid in owners)
+    published = []
+    relay = OutboxRelay([_factory(p) for p in shards], "sqlite", [published.extend])
+    assert relay.drain_once() == 12
+    assert sorted(e.user_id for e in published) == sorted(ids)
+
+
+def test_webhook_sink_posts_event_batches() -> None:
+    bodies = []
+
+    class Hook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            bodies.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Hook)
+    thread = threading.Thread(target=server.handle_request, daemon=True)
+    thread.start()
+    try:
+        event = SubscriptionChanged(7, Plan.TRIAL, Plan.PREMIUM, Status.ACTIVE, Status.ACTIVE, 1.5, 42)
+        WebhookSink(f"http://127.0.0.1:{server.server_port}/events")([event])
+        thread.join(5)
+    finally:
+        server.server_close()
+
+    assert bodies == [{"events": [event.to_dict()]}]
+    assert bodies[0]["events"][0]["new_plan"] == "premium"
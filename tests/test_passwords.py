@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import hashlib
+import pickle
+import threading
+import time
+
+import pytest
+
+from capitalia.adapters.passwords import LEGACY, PBKDF2, SCRYPT, PasswordHasher, PasswordHasherBusy, parse
+
+
+@pytest.mark.parametrize("scheme", [PBKDF2, SCRYPT])
+def test_hash_round_trip_records_scheme_and_cost(scheme) -> None:
+    hasher = PasswordHasher(scheme, iterations=1000, scrypt_n=1024)
+    password_hash, salt = hasher.hash("s3cret")
+
+    assert parse(password_hash)[0] == scheme and len(salt) == 32
+    assert hasher.verify("s3cret", password_hash, salt)
+    assert not hasher.verify("wrong", password_hash, salt)
+    assert not hasher.needs_rehash(password_hash)
+    assert PasswordHasher(scheme, iterations=2000, scrypt_n=2048).needs_rehash(password_hash)
+
+
+def test_legacy_sha256_hashes_verify_and_need_rehash() -> None:
+    legacy = hashlib.sha256(b"salt" + b"s3cret").hexdigest()
+    hasher = PasswordHasher(iterations=1000)
+
+    assert parse(legacy) == (LEGACY, (), legacy)
+    assert hasher.verify("s3cret", legacy, "salt")
+    assert hasher.needs_rehash(legacy)
+    assert not hasher.verify("s3cret", "bogus$1$00", "salt")
+
+
+def test_pool_verifies_off_thread_and_rejects_past_the_queue_limit() -> None:
+    hasher = PasswordHasher(iterations=1000, workers=1, max_queue=0)
+    password_hash, salt = hasher.hash("s3cret")
+    assert hasher.verify("s3cret", password_hash, salt)
+
+    slow = PasswordHasher(iterations=3_000_000, workers=1, max_queue=0)
+    slow._executor = hasher._pool()  # share the warm worker
+    worker = threading.Thread(target=slow.hash, args=("s3cret",))
+    worker.start()
+    while slow.stats()["in_flight"] == 0:
+        time.sleep(0.01)
+    with pytest.raises(PasswordHasherBusy):
+        slow.hash("other")
+    worker.join()
+
+    assert slow.stats()["rejected"] == 1 and hasher.stats()["offloaded"] == 2
+    hasher.close()
+
+
+def test_pickled_hasher_keeps_scheme_and_cost_and_runs_inline() -> None:
+    hasher = PasswordHasher(iterations=1_000, workers=2)
+    copy = pickle.loads(pickle.dumps(hasher))
+
+    assert (copy.scheme, copy.params, copy.workers) == (PBKDF2, (1_000,), 0)
+    assert hasher.verify("secret", *copy.hash("secret"))
+    hasher.close()
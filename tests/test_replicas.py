@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.batching import BatchingLoader
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.replicas import ReplicaPool, ReplicaRouter
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.uow import SqlUnitOfWork
+from capitalia.domain.models import User
+from capitalia.domain.services import SubscriptionService
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 1, 10)
+
+
+class Ticker:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _factory(path):
+    return lambda: sqlite3.connect(path)
+
+
+def _set_name(path, uid: int, name: str) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE users SET name = ? WHERE id = ?", (name, uid))
+
+
+def _name_seen(router: ReplicaRouter, uid: int) -> str:
+    with router(uid) as uow:
+        return uow.users.get_by_id(uid).name
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    primary = tmp_path / "primary.db"
+    conn = sqlite3.connect(primary)
+    apply_migrations(conn, "sqlite")
+    uid = SqliteUserRepository(conn).add(
+        User(None, "primary", "a@example.com", "h" * 64, "s" * 32, "premium", date(2024, 1, 1), "active")
+    )
+    conn.commit()
+    conn.close()
+    replicas = []
+    for i in range(2):
+        copy = tmp_path / f"replica{i}.db"
+        shutil.copy(primary, copy)
+        _set_name(copy, uid, f"replica{i}")
+        replicas.append(copy)
+    return primary, replicas, uid
+
+
+def test_reads_round_robin_over_replicas(dbs) -> None:
+    primary, replicas, uid = dbs
+    router = ReplicaRouter(_factory(primary), ReplicaPool([_factory(p) for p in replicas]), SqliteUserRepository)
+
+    assert [_name_seen(router, uid) for _ in range(4)] == ["replica0", "replica1", "replica0", "replica1"]
+
+
+def test_reads_stick_to_primary_after_own_write(dbs) -> None:
+    primary, replicas, uid = dbs
+    ticker = Ticker()
+    router = ReplicaRouter(
+        _factory(primary),
+        ReplicaPool([_factory(replicas[0])]),
+        SqliteUserRepository,
+        sticky_window=2.0,
+        clock=ticker,
+    )
+    service = SubscriptionService(
+        lambda: SqlUnitOfWork(_factory(primary), SqliteUserRepository),
+        FixedClock(),
+        read_uow_factory=router,
+        listeners=[router.record_writes],
+    )
+
+    service.suspend(uid)
+
+    assert service.read_effective_status(uid)["status"] == "suspended"
+    ticker.now = 5.0
+    # The stale replica is used again once the window has passed.
+    assert service.read_effective_status(uid)["status"] == "active"
+
+
+def test_lagging_or_unreachable_replicas_are_skipped(dbs) -> None:
+    primary, replicas, uid = dbs
+    lags = {str(replicas[0]): 30.0, str(replicas[1]): 0.5}
+
+    def probe(conn):
+        return lags[conn.execute("PRAGMA database_list").fetchone()[2]]
+
+    def broken():
+        raise sqlite3.OperationalError("unreachable")
+
+    ticker = Ticker()
+    pool = ReplicaPool(
+        [_factory(replicas[0]), broken, _factory(replicas[1])],
+        lag_probe=probe,
+        max_lag=5.0,
+        health_interval=10.0,
+        clock=ticker,
+    )
+    router = ReplicaRouter(_factory(primary), pool, SqliteUserRepository)
+
+    assert {_name_seen(router, uid) for _ in range(6)} == {"replica1"}
+    assert [r["healthy"] for r in pool.status()] == [False, False, True]
+
+    lags[str(replicas[1])] = 60.0
+    ticker.now = 20.0
+    assert _name_seen(router, uid) == "primary"
+
+
+def test_batched_reads_do_not_mix_primary_and_replica_targets(dbs) -> None:
+    primary, replicas, uid = dbs
+    with sqlite3.connect(primary) as conn:
+        other = SqliteUserRepository(conn).add(
+            User(None, "primary", "b@example.com", "h" * 64, "s" * 32, "premium", date(2024, 1, 1), "active")
+        )
+    shutil.copy(primary, replicas[0])
+    _set_name(replicas[0], uid, "replica")
+    _set_name(replicas[0], other, "replica")
+    router = ReplicaRouter(_factory(primary), ReplicaPool([_factory(replicas[0])]), SqliteUserRepository)
+    router.recent_writes.mark([uid])  # uid just wrote: its reads must see the primary
+    loader = BatchingLoader(max_wait=0.2)
+    batched = loader.wrap(router, route=router.route, open_route=router.open)
+    names = {}
+
+    def read(user_id: int) -> None:
+        with batched(user_id) as uow:
+            names[user_id] = uow.users.get_by_id(user_id).name
+
+    follower = threading.Thread(target=read, args=(uid,))
+    leader = threading.Thread(target=read, args=(other,))
+    leader.start()
+    time.sleep(0.05)  # the replica batch is open and waiting for more lookups
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+
+    assert names == {other: "replica", uid: "primary"}
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.revocation import BloomFilter, RevocationList, SqlRevocationStore
+
+NOW = 1_700_000_000.0
+
+
+def test_bloom_filter_has_no_false_negatives_and_a_bounded_error_rate() -> None:
+    bloom = BloomFilter(1000, fp_rate=0.01)
+    for n in range(1000):
+        bloom.add(f"revoked-{n}")
+
+    assert all(f"revoked-{n}" in bloom for n in range(1000))
+    assert sum(f"other-{n}" in bloom for n in range(10_000)) < 300
+    assert bloom.size_bytes < 1300  # ~10 bits per entry
+
+
+@pytest.fixture
+def store(tmp_path) -> SqlRevocationStore:
+    path = tmp_path / "revocations.db"
+    with sqlite3.connect(path) as conn:
+        apply_migrations(conn, "sqlite")
+    return SqlRevocationStore(lambda: sqlite3.connect(path), "sqlite")
+
+
+def test_revocations_reach_other_instances_on_refresh(store) -> None:
+    now = [NOW]
+    a = RevocationList(store, clock=lambda: now[0])
+    b = RevocationList(store, clock=lambda: now[0])
+
+    a.revoke_token("t1", expires_at=NOW + 60)
+    a.revoke_subject(7, since=NOW - 1)
+    assert a.is_revoked({"jti": "t1", "sub": 1})
+    assert not b.is_revoked({"jti": "t1", "sub": 1})
+
+    assert b.refresh() == 2 and b.refresh() == 0  # incremental
+    assert b.is_revoked({"jti": "t1", "sub": 1})
+    assert b.is_revoked({"jti": "t2", "sub": 7, "iat": NOW - 10})
+    assert not b.is_revoked({"jti": "t3", "sub": 7, "iat": NOW})  # issued after the revocation
+    assert not b.is_revoked({"jti": "t2", "sub": 1, "iat": NOW})
+
+
+def test_rows_committed_out_of_id_order_are_not_skipped(store, tmp_path) -> None:
+    now = [NOW]
+    revocations = RevocationList(store, gap_timeout=30, clock=lambda: now[0])
+
+    def insert(rid: int, jti: str) -> None:
+        with sqlite3.connect(tmp_path / "revocations.db") as conn:
+            conn.execute(
+                "INSERT INTO token_revocations (id, kind, value, since, expires_at) VALUES (?, 'jti', ?, NULL, ?)",
+                (rid, jti, NOW + 600),
+            )
+
+    insert(1, "t1")
+    insert(3, "t3")  # id 2 is still in an open transaction elsewhere
+    assert revocations.refresh() == 2 and revocations.stats()["open_gaps"] == 1
+    insert(2, "t2")
+    assert revocations.refresh() == 1 and revocations.is_revoked({"jti": "t2"})
+    assert revocations.refresh() == 0 and revocations.stats()["open_gaps"] == 0
+
+
+def test_revoked_subject_with_a_malformed_iat_is_rejected() -> None:
+    revocations = RevocationList(clock=lambda: NOW)
+    revocations.revoke_subject(7)
+
+    assert revocations.is_revoked({"sub": 7, "iat": "yesterday"})
+    assert not revocations.is_revoked({"sub": 8, "iat": "yesterday"})
+
+
+def test_entries_are_dropped_once_the_tokens_would_have_expired(store) -> None:
+    now = [NOW]
+    revocations = RevocationList(store, clock=lambda: now[0])
+    revocations.revoke_token("t1", expires_at=NOW + 60)
+    revocations.revoke_subject(7, since=NOW, max_token_ttl=120)
+
+    now[0] += 61
+    revocations.refresh()
+    assert revocations.stats()["tokens"] == 0 and revocations.stats()["subjects"] == 1
+    now[0] += 60
+    revocations.refresh()
+    assert revocations.stats()["subjects"] == 0
+    assert RevocationList(store, clock=lambda: now[0]).refresh() == 0  # expired rows are not loaded
+
+
+def test_filter_grows_past_its_capacity() -> None:
+    revocations = RevocationList(capacity=8, clock=lambda: NOW)
+    for n in range(100):
+        revocations.revoke_token(f"t{n}", expires_at=NOW + 60)
+
+    assert all(revocations.is_revoked({"jti": f"t{n}"}) for n in range(100))
+    assert revocations.stats()["filter_bytes"] > BloomFilter(8).size_bytes
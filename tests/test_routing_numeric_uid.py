@@ -74,7 +74,7 @@ def test_user_status_route_accepts_numeric_uid() -> None:
 
     secret = "secret"
     token_client = FakeTokenClient(secret)
-    processor = build_handler(uow_factory, secret, FakeClock(), token_client=token_client)
+    processor = build_handler(uow_factory, secret, FakeClock(), token_client=token_client, password_hasher=object())
 
     token = jwt_sign({"sub": user.id, "email": user.email, "plan": user.plan}, secret)
     request = HttpRequest(
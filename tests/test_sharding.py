@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.sharding import (
+    ShardMap,
+    ShardMovingError,
+    ShardedUnitOfWork,
+    bucket_for,
+    bucket_sql,
+    move_buckets,
+)
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.domain.models import User
+from capitalia.domain.services import SubscriptionService
+from jwt_service.tokens import sign as jwt_sign
+
+
+BUCKETS = 16
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 1, 10)
+
+
+def _factory(path):
+    def factory():
+        return sqlite3.connect(path)
+
+    return factory
+
+
+def _user(n: int, plan: str = "premium") -> User:
+    return User(None, f"User {n}", f"user{n}@example.com", "h" * 64, "s" * 32, plan, date(2024, 1, 1), "active")
+
+
+def _count(path) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+@pytest.fixture
+def shard_map(tmp_path):
+    shards = [tmp_path / f"shard{i}.db" for i in range(3)]
+    shard_map = ShardMap("sqlite", [_factory(p) for p in shards], _factory(tmp_path / "directory.db"), ttl=0)
+    shard_map.initialize(BUCKETS)
+    shard_map.paths = shards
+    return shard_map
+
+
+def _uow(shard_map):
+    return ShardedUnitOfWork(shard_map, SqliteUserRepository)
+
+
+def test_bucket_sql_matches_python_hash() -> None:
+    conn = sqlite3.connect(":memory:")
+    for uid in (1, 2, 17, 123456, 2**31 - 1):
+        assert conn.execute(f"SELECT {bucket_sql(BUCKETS, '?')}", (uid,)).fetchone()[0] == bucket_for(uid, BUCKETS)
+
+
+def test_users_spread_over_shards_with_global_ids(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        ids = uow.users.add_many([_user(n) for n in range(30)])
+        extra = uow.users.add(_user(99))
+
+    assert len(set(ids + [extra])) == 31
+    assert sum(_count(p) for p in shard_map.paths) == 31
+    assert all(_count(p) > 0 for p in shard_map.paths)
+    with _uow(shard_map) as uow:
+        assert uow.users.get_by_email("user7@example.com").id == ids[7]
+        assert sorted(uow.users.get_many(ids)) == sorted(ids)
+
+
+def test_service_mutations_touch_only_the_owning_shard(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        ids = uow.users.add_many([_user(n) for n in range(10)])
+    service = SubscriptionService(lambda: _uow(shard_map), FixedClock())
+
+    assert service.suspend(ids[3])["status"] == "suspended"
+    assert service.read_effective_status(ids[3])["status"] == "suspended"
+    results = service.downgrade_many(ids)
+
+    assert all(r["plan"] == "basic" for r in results.values())
+    assert service.read_effective_status(ids[5])["plan"] == "basic"
+
+
+def test_email_change_updates_directory(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        uid = uow.users.add(_user(1))
+    with _uow(shard_map) as uow:
+        user = uow.users.get_by_id(uid)
+        user.email = "renamed@example.com"
+        uow.users.save(user)
+    with _uow(shard_map) as uow:
+        assert uow.users.get_by_email("user1@example.com") is None
+        assert uow.users.get_by_email("renamed@example.com").id == uid
+
+
+def test_duplicate_email_is_rejected_across_shards(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        uow.users.add(_user(1))
+    with pytest.raises(sqlite3.IntegrityError):
+        with _uow(shard_map) as uow:
+            uow.users.add(_user(1))
+
+
+def test_move_buckets_relocates_rows_and_keeps_them_readable(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        ids = uow.users.add_many([_user(n) for n in range(40)])
+    moving = [b for b in range(BUCKETS) if b % 3 == 0]
+    expected = sum(1 for uid in ids if bucket_for(uid, BUCKETS) in moving and shard_map.shard_for(uid) != 2)
+
+    copied = move_buckets(shard_map, moving, 2, step=2, sleep=lambda _: None)
+
+    assert copied == expected
+    assert sum(_count(p) for p in shard_map.paths) == 40
+    for uid in ids:
+        if bucket_for(uid, BUCKETS) in moving:
+            assert shard_map.shard_for(uid) == 2
+    with _uow(shard_map) as uow:
+        assert len(uow.users.get_many(ids)) == 40
+
+
+def test_writes_to_moving_bucket_fail_fast(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        uid = uow.users.add(_user(1))
+    frozen = bucket_for(uid, BUCKETS)
+
+    def sleep(_):
+        with pytest.raises(ShardMovingError):
+            with _uow(shard_map) as uow:
+                user = uow.users.get_by_id(uid)
+                user.status = "suspended"
+                uow.users.save(user)
+        raise KeyboardInterrupt  # stop while the bucket is still frozen
+
+    with pytest.raises(KeyboardInterrupt):
+        move_buckets(shard_map, [frozen], (shard_map.shard_for(uid) + 1) % 3, sleep=sleep)
+
+
+def test_write_checked_before_a_freeze_cannot_commit_after_it(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        uid = uow.users.add(_user(1))
+    frozen = bucket_for(uid, BUCKETS)
+
+    def sleep(_):
+        raise KeyboardInterrupt  # stop while the bucket is still frozen
+
+    with pytest.raises(ShardMovingError):
+        with _uow(shard_map) as uow:
+            user = uow.users.get_by_id(uid)
+            user.status = "suspended"
+            uow.users.save(user)  # the bucket is still active here
+            with pytest.raises(KeyboardInterrupt):
+                move_buckets(shard_map, [frozen], (shard_map.shard_for(uid) + 1) % 3, sleep=sleep)
+
+    with _uow(shard_map) as uow:
+        assert uow.users.get_by_id(uid).status == "active"
+
+
+def test_writes_to_moving_bucket_answer_503_with_retry_after(shard_map) -> None:
+    with _uow(shard_map) as uow:
+        uid = uow.users.add(_user(1, plan="trial"))
+    processor = build_handler(
+        lambda: _uow(shard_map), "secret", FixedClock(), token_client=object(), password_hasher=object()
+    )
+    token = jwt_sign({"sub": uid}, "secret", 60)
+    request = HttpRequest(
+        method="POST",
+        target=f"/user/{uid}/upgrade",
+        path=f"/user/{uid}/upgrade",
+        query="",
+        headers={"authorization": f"Bearer {token}"},
+        body=b"",
+        client=("127.0.0.1", 0),
+    )
+    responses = []
+
+    def sleep(_):
+        responses.append(processor.handle(request))
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        move_buckets(shard_map, [bucket_for(uid, BUCKETS)], (shard_map.shard_for(uid) + 1) % 3, sleep=sleep)
+
+    assert responses[0].status == 503
+    assert responses[0].headers["Retry-After"] == "1"
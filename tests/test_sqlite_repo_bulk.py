@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from capitalia.adapters import sqlite_repo
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.domain.models import User
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "bulk.db")
+    apply_migrations(conn, "sqlite")
+    yield conn
+    conn.close()
+
+
+def _user(n: int, plan: str = "premium") -> User:
+    return User(None, f"User {n}", f"user{n}@example.com", "h" * 64, "s" * 32, plan, date(2024, 1, n % 28 + 1), "active")
+
+
+def test_add_many_assigns_ids_in_input_order(conn) -> None:
+    repo = SqliteUserRepository(conn)
+    users = [_user(n) for n in range(5)]
+
+    ids = repo.add_many(users)
+
+    assert ids == [u.id for u in users]
+    assert len(set(ids)) == 5
+    for user in users:
+        assert repo.get_by_id(user.id).email == user.email
+
+
+def test_get_many_chunks_large_id_lists(conn, monkeypatch) -> None:
+    monkeypatch.setattr(sqlite_repo, "IN_CHUNK_SIZE", 3)
+    repo = SqliteUserRepository(conn)
+    ids = repo.add_many([_user(n) for n in range(10)])
+
+    found = repo.get_many(ids + [9999])
+
+    assert sorted(found) == sorted(ids)
+    assert found[ids[4]].email == "user4@example.com"
+
+
+def test_save_many_updates_rows(conn) -> None:
+    repo = SqliteUserRepository(conn)
+    users = [_user(n) for n in range(3)]
+    repo.add_many(users)
+    for user in users:
+        user.status = "suspended"
+
+    repo.save_many(users)
+
+    assert {u.status for u in repo.get_many([u.id for u in users]).values()} == {"suspended"}
+    assert repo.add_many([]) == []
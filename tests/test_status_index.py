@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.adapters.migrations import apply_migrations
+from capitalia.adapters.sqlite_repo import SqliteUserRepository
+from capitalia.adapters.status_index import StatusIndex
+from capitalia.domain.models import User
+from capitalia.config import Config
+from capitalia.domain.services import SubscriptionService
+from capitalia.scripts import status_index as status_index_cli
+
+
+class FixedClock:
+    def __init__(self, today: date) -> None:
+        self._today = today
+
+    def today(self) -> date:
+        return self._today
+
+
+def _user(uid, plan="premium", status="active", start=date(2024, 1, 1)) -> User:
+    email = f"{plan}-{status}-{uid}@example.com"
+    return User(uid, "User", email, "h" * 64, "s" * 32, plan, start, status)
+
+
+def test_build_and_lookup(tmp_path) -> None:
+    path = str(tmp_path / "status.idx")
+    StatusIndex.build(path, [(1, "basic", "active", "2024-01-01"), (7, "premium", "suspended", date(2023, 5, 2))])
+    index = StatusIndex(path, writable=False)
+
+    assert index.get(1) == ("basic", "active", date(2024, 1, 1))
+    assert index.get(7) == ("premium", "suspended", date(2023, 5, 2))
+    assert index.get(3) is None
+    assert index.get(10_000) is None
+
+
+def test_updates_and_growth_are_visible_to_readers(tmp_path) -> None:
+    path = str(tmp_path / "status.idx")
+    writer = StatusIndex(path)
+    reader = StatusIndex(path, writable=False, reload_interval=0)
+
+    writer.put(_user(5))
+    writer.put_many([_user(5000, plan="trial")])
+
+    assert reader.get(5) == ("premium", "active", date(2024, 1, 1))
+    assert reader.get(5000)[0] == "trial"
+    with pytest.raises(PermissionError):
+        reader.put(_user(1))
+
+
+def test_rebuild_is_picked_up_by_open_indexes(tmp_path) -> None:
+    path = str(tmp_path / "status.idx")
+    StatusIndex.build(path, [(1, "basic", "active", "2024-01-01")])
+    index = StatusIndex(path, writable=False, reload_interval=0)
+
+    StatusIndex.build(path, [(1, "premium", "active", "2024-01-01")])
+
+    assert index.get(1)[0] == "premium"
+
+
+def test_service_reads_from_index_and_keeps_it_current(tmp_path) -> None:
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        premium = uow.users.add(_user(None))
+        trial = uow.users.add(_user(None, plan="trial", start=date(2024, 1, 1)))
+    index = StatusIndex(str(tmp_path / "status.idx"))
+    index.put_many([store.get(premium), store.get(trial)])
+    db_reads = []
+
+    def uow_factory():
+        db_reads.append(1)
+        return MemoryUnitOfWork(store)
+
+    service = SubscriptionService(uow_factory, FixedClock(date(2024, 1, 10)), status_index=index)
+
+    assert service.read_effective_status(premium)["status"] == "active"
+    assert db_reads == []
+
+    service.suspend(premium)  # the owner of the file writes in place
+    assert index.get(premium)[1] == "suspended"
+    assert service.read_effective_status(premium)["status"] == "suspended"
+    assert len(db_reads) == 1
+
+    # An expired trial falls through to the DB so the new status is persisted.
+    later = SubscriptionService(uow_factory, FixedClock(date(2024, 3, 1)), status_index=index)
+    assert later.read_effective_status(trial)["status"] == "expired"
+    assert index.get(trial)[1] == "expired"
+    assert store.get(trial).status == "expired"
+
+
+def test_readers_skip_a_stale_index_and_their_own_recent_writes(tmp_path) -> None:
+    path = str(tmp_path / "status.idx")
+    StatusIndex.build(path, [(1, "premium", "active", "2024-01-01"), (2, "basic", "active", "2024-01-01")])
+    now = [1000.0]
+    follower = StatusIndex(path)
+    reader = StatusIndex(path, writable=False, reload_interval=0, max_lag=5, clock=lambda: now[0])
+
+    assert reader.get(1) is None  # never synced
+    follower.mark_synced(999.0)
+    assert reader.get(1)[1] == "active"
+
+    reader.invalidate([_user(1, status="suspended")])  # committed by this process at t=1000
+    assert reader.get(1) is None and reader.get(2) is not None
+    follower.put(_user(1, status="suspended"))
+    follower.mark_synced(1000.5)
+    assert reader.get(1)[1] == "suspended"
+
+    now[0] += 10  # the follower stopped
+    assert reader.get(2) is None
+    assert reader.stats()["stale_reads"] == 3
+    with pytest.raises(PermissionError):
+        reader.mark_synced(now[0])
+
+
+def test_concurrent_invalidations_and_reads_do_not_race(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr("capitalia.adapters.status_index._MAX_PENDING", 0)  # prune on every invalidate
+    path = str(tmp_path / "status.idx")
+    StatusIndex.build(path, [(uid, "premium", "active", "2024-01-01") for uid in range(64)])
+    StatusIndex(path).mark_synced(1000.5)
+    reader = StatusIndex(path, writable=False, max_lag=5, clock=lambda: 1000.0)
+    errors = []
+    deadline = time.monotonic() + 0.5
+
+    def run(work) -> None:
+        try:
+            while time.monotonic() < deadline:
+                work()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+    writers = [lambda: reader.invalidate([_user(uid) for uid in range(64)]) for _ in range(2)]
+    readers = [lambda: [reader.get(uid) for uid in range(64)] for _ in range(2)]
+    threads = [threading.Thread(target=run, args=(work,)) for work in writers + readers]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often enough to interleave the dict operations
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+
+
+def test_reader_maps_the_index_once_the_follower_creates_it(tmp_path) -> None:
+    path = str(tmp_path / "status.idx")
+    reader = StatusIndex(path, writable=False, reload_interval=0)
+    assert reader.get(1) is None
+
+    StatusIndex.build(path, [(1, "basic", "active", "2024-01-01")])
+    assert reader.get(1)[0] == "basic"
+
+
+def test_follower_applies_outbox_events_from_every_process(tmp_path, monkeypatch) -> None:
+    db = tmp_path / "capitalia.db"
+    with closing(sqlite3.connect(db)) as conn:
+        apply_migrations(conn, "sqlite")
+        ids = SqliteUserRepository(conn).add_many([_user(None), _user(None, plan="basic")])
+        conn.commit()
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(db))
+    monkeypatch.setenv("OUTBOX_SINKS", "bus")
+    monkeypatch.setenv("OUTBOX_POLL_INTERVAL", "0.01")
+    cfg = Config()
+    path = str(tmp_path / "status.idx")
+    stop = threading.Event()
+    thread = threading.Thread(target=status_index_cli.follow, args=(cfg, path), kwargs={"stop": stop})
+    thread.start()
+    try:
+        reader = StatusIndex(path, writable=False, reload_interval=0, max_lag=5)
+        service = SubscriptionService(cfg.get_uow_factory(), FixedClock(date(2024, 1, 10)), status_index=reader)
+        deadline = time.monotonic() + 5
+        while reader.get(ids[0]) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        service.suspend(ids[0])
+        assert service.read_effective_status(ids[0])["status"] == "suspended"  # never the stale entry
+        while reader.get(ids[0]) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert reader.get(ids[0])[1] == "suspended"
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_cli_rebuilds_from_database(tmp_path, monkeypatch) -> None:
+    db = tmp_path / "capitalia.db"
+    conn = sqlite3.connect(db)
+    apply_migrations(conn, "sqlite")
+    ids = SqliteUserRepository(conn).add_many([_user(None, plan="trial"), _user(None, status="suspended")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("DB_KIND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(db))
+    output = str(tmp_path / "status.idx")
+
+    status_index_cli.main(["--output", output])
+
+    index = StatusIndex(output, writable=False)
+    assert index.get(ids[0]) == ("trial", "active", date(2024, 1, 1))
+    assert index.get(ids[1])[1] == "suspended"
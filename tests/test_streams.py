@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from capitalia.adapters.memory_repo import MemoryStore, MemoryUnitOfWork
+from capitalia.app.handlers import build_handler
+from capitalia.app.http import HttpRequest
+from capitalia.app.server import _serve_connection
+from capitalia.app.streams import StatusStreamHub
+from capitalia.domain.models import User
+from jwt_service.tokens import sign
+
+
+SECRET = "streams-secret"
+
+
+class FixedClock:
+    def today(self) -> date:
+        return date(2024, 3, 1)
+
+
+@pytest.fixture
+def app():
+    store = MemoryStore()
+    with MemoryUnitOfWork(store) as uow:
+        uid = uow.users.add(User(None, "Ana", "ana@example.com", "h", "s", "basic", date(2024, 2, 1), "active"))
+    hub = StatusStreamHub(heartbeat=0.3)
+    hub.start()
+    processor = build_handler(lambda: MemoryUnitOfWork(store), SECRET, FixedClock(), token_client=object(), password_hasher=object(), stream_hub=hub)
+    yield processor, hub, uid
+    hub.stop()
+
+
+def _token(uid: int) -> str:
+    return sign({"sub": uid}, SECRET, 60)
+
+
+def _open(processor, target: str, uid: int, extra: str = ""):
+    """Serve one request over a socketpair; returns (client socket, server thread)."""
+
+    client, server = socket.socketpair()
+    thread = threading.Thread(target=_serve_connection, args=(server, ("test", 0), processor), daemon=True)
+    thread.start()
+    client.sendall(f"GET {target} HTTP/1.1\r\nHost: x\r\nAuthorization: Bearer {_token(uid)}\r\n{extra}\r\n".encode())
+    client.settimeout(5)
+    return client, thread
+
+
+def _read_until(client: socket.socket, marker: bytes) -> bytes:
+    data = b""
+    while marker not in data:
+        chunk = client.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _post(processor, path: str, uid: int) -> None:
+    headers = {"authorization": f"Bearer {_token(uid)}"}
+    assert processor.handle(HttpRequest("POST", path, path, "", headers, b"")).status == 200
+
+
+def test_sse_streams_changes_and_heartbeats_without_holding_the_request_thread(app) -> None:
+    processor, hub, uid = app
+    client, thread = _open(processor, f"/user/{uid}/status/stream", uid)
+
+    head = _read_until(client, b"event: status")
+    thread.join(2)
+    assert not thread.is_alive()  # the socket now lives in the hub
+    assert b"200 OK" in head and b"text/event-stream" in head
+
+    _post(processor, f"/user/{uid}/upgrade", uid)
+    event = _read_until(client, b"premium")
+    assert b'"status":"active"' in event and b"id: premium.active" in event
+    assert b": keepalive" in _read_until(client, b": keepalive")
+    assert hub.stats()["sse"] == 1
+
+    client.close()
+    deadline = time.monotonic() + 3
+    while hub.stats()["connections"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert hub.stats()["connections"] == 0
+
+
+def test_long_poll_answers_on_change(app) -> None:
+    processor, _, uid = app
+    client, _ = _open(processor, f"/user/{uid}/status?wait=10&since=basic.active", uid)
+    time.sleep(0.2)
+
+    _post(processor, f"/user/{uid}/upgrade", uid)
+
+    response = _read_until(client, b"}")
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert b"200 OK" in head and b'Etag: "premium.active"' in head
+    assert json.loads(body) == {"user_id": uid, "plan": "premium", "status": "active"}
+
+
+def test_long_poll_times_out_with_304(app) -> None:
+    processor, hub, uid = app
+    client, _ = _open(processor, f"/user/{uid}/status?wait=0.4", uid, extra='If-None-Match: "basic.active"\r\n')
+
+    started = time.monotonic()
+    response = _read_until(client, b"\r\n\r\n")
+    assert b"304 Not Modified" in response
+    assert time.monotonic() - started >= 0.3
+    assert hub.stats()["long_poll_timeouts"] == 1
+
+
+def test_stale_etag_gets_an_immediate_answer(app) -> None:
+    processor, _, uid = app
+    client, _ = _open(processor, f"/user/{uid}/status?wait=30&since=premium.active", uid)
+
+    response = _read_until(client, b"}")
+    assert b"200 OK" in response and b'"plan": "basic"' in response
+
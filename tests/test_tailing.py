@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from capitalia.adapters.tailing import IdCursor
+
+
+def test_ids_committed_out_of_order_are_picked_up_once() -> None:
+    now = [0.0]
+    cursor = IdCursor(gap_timeout=10, clock=lambda: now[0])
+
+    assert cursor.accept([1, 2]) == [1, 2]
+    assert cursor.accept([4, 5]) == [4, 5]  # 3 is still in flight
+    assert cursor.floor() == 2
+    assert cursor.accept([3, 4, 5, 6]) == [3, 6]
+    assert cursor.floor() == 6 and cursor.open_gaps == 0
+
+
+def test_gaps_that_never_fill_are_given_up() -> None:
+    now = [0.0]
+    cursor = IdCursor(gap_timeout=10, clock=lambda: now[0])
+    cursor.accept([1, 3])  # 2 was rolled back
+
+    assert cursor.floor() == 1
+    now[0] = 11
+    assert cursor.floor() == 3
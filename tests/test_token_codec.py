@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from jwt_service.tokens import TokenCodec, sign, verify
+
+
+def _reference_token(claims: dict, secret: str) -> str:
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    signing_input = b64(b'{"alg":"HS256","typ":"JWT"}') + "." + b64(json.dumps(claims).encode())
+    return signing_input + "." + b64(hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest())
+
+
+def test_codec_matches_the_reference_encoding() -> None:
+    codec = TokenCodec("secret", clock=lambda: 1_000)
+    token = codec.sign({"sub": 7, "plan": "trial"}, ttl_seconds=60)
+
+    assert token.split(".")[0] == "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"
+    claims = {"sub": 7, "plan": "trial", "iat": 1_000, "exp": 1_060}
+    assert codec.verify(_reference_token(claims, "secret")) == claims
+    assert codec.verify(token) == claims
+    assert verify(sign({"sub": 1}, "secret"), "secret")["sub"] == 1
+
+
+def test_signature_is_checked_before_the_payload_is_parsed() -> None:
+    codec = TokenCodec("secret")
+    header, _, signature = codec.sign({"sub": 1}).split(".")
+
+    with pytest.raises(ValueError, match="invalid signature"):
+        codec.verify(f"{header}.not-base64-json!.{signature}")
+    with pytest.raises(ValueError, match="invalid signature"):
+        TokenCodec("other").verify(codec.sign({"sub": 1}))
+    with pytest.raises(ValueError, match="invalid token format"):
+        codec.verify("a.b")
+
+
+def test_expired_tokens_are_rejected() -> None:
+    now = [1_000.0]
+    codec = TokenCodec("secret", clock=lambda: now[0])
+    token = codec.sign({"sub": 1}, ttl_seconds=10)
+    now[0] += 11
+
+    with pytest.raises(ValueError, match="token expired"):
+        codec.verify(token)